@@ -0,0 +1,164 @@
+# File: ai_client.py
+import os
+import asyncio
+import random
+import logging
+import anthropic
+from dotenv import load_dotenv
+import db_async
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+MODEL = "claude-3-haiku-20240307"
+# Jumlah panggilan AI yang boleh berjalan bersamaan (sisanya antre di semaphore)
+MAX_CONCURRENT_CALLS = int(os.getenv("AI_MAX_CONCURRENT_CALLS", "5"))
+# Batas waktu total per panggilan (antre + semua percobaan), dalam detik
+DEFAULT_DEADLINE = float(os.getenv("AI_DEADLINE_SECONDS", "15"))
+MAX_RETRIES = 3
+# Status yang layak dicoba lagi: rate limit, server error, overloaded
+RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+# Prefix terpendek (token) yang mau di-cache API untuk model ini; cache_control pada prefix yang lebih pendek diabaikan tanpa error
+MIN_CACHEABLE_TOKENS = 2048 if "haiku" in MODEL else 1024
+CHARS_PER_TOKEN = 4
+
+_client = None
+_semaphore = None
+_stats = {"calls": 0, "failed": 0, "timed_out": 0, "retried": 0,
+          "input_tokens": 0, "output_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+USAGE_FIELDS = ["input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"]
+
+def get_client():
+    """Client AsyncAnthropic bersama (dibuat saat pertama kali dipakai). None jika tidak bisa dibuat."""
+    global _client
+    if _client is None and ANTHROPIC_API_KEY:
+        try:
+            # Retry ditangani sendiri di sini agar tetap di dalam deadline
+            _client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
+            print("Berhasil terhubung ke Anthropic API.")
+        except Exception as e:
+            print(f"Error saat inisialisasi client Anthropic: {e}")
+    return _client
+
+def is_available() -> bool:
+    return get_client() is not None
+
+def system_blocks(text: str) -> list:
+    """System prompt sebagai blok teks; ditandai untuk prompt caching hanya bila cukup panjang untuk benar-benar di-cache."""
+    block = {"type": "text", "text": text}
+    if len(text) // CHARS_PER_TOKEN >= MIN_CACHEABLE_TOKENS: block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+    return _semaphore
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Jeda sebelum percobaan berikutnya: ikuti retry-after dari server bila ada, selain itu backoff eksponensial + jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after: return float(retry_after)
+    except ValueError:
+        pass
+    return min(8.0, 0.5 * 2 ** attempt) + random.uniform(0, 0.5)
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, anthropic.APIConnectionError): return True  # Termasuk APITimeoutError
+    return isinstance(error, anthropic.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+async def _record_usage(purpose: str, usage):
+    """Menambah total token di _stats dan mencatat satu baris ai_usage. Kegagalan pencatatan tidak mengganggu jawaban."""
+    if usage is None: return
+    counts = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+    for field, value in counts.items(): _stats[field] += value
+    try:
+        await db_async.add_ai_usage(purpose or "lainnya", MODEL, counts)
+    except Exception as e:
+        logger.error(f"Gagal mencatat pemakaian AI: {e}")
+
+async def _create_with_retry(kwargs: dict):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                return await get_client().messages.create(**kwargs)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e): raise
+            _stats["retried"] += 1
+            delay = _retry_delay(e, attempt)
+            logger.info(f"Panggilan AI gagal ({e.__class__.__name__}), coba lagi dalam {delay:.1f} detik")
+            await asyncio.sleep(delay)
+
+async def complete(messages: list, max_tokens: int, deadline: float = None, fallback: str = None, purpose: str = None, **kwargs):
+    """
+    Mengirim messages ke model dan mengembalikan teks jawaban.
+    Jika client tidak tersedia, gagal, atau melewati deadline (detik), mengembalikan fallback.
+    purpose hanya label untuk pencatatan pemakaian token (tabel ai_usage).
+    """
+    if not is_available(): return fallback
+    _stats["calls"] += 1
+    try:
+        async with asyncio.timeout(deadline or DEFAULT_DEADLINE):
+            message = await _create_with_retry(dict(model=MODEL, max_tokens=max_tokens, messages=messages, **kwargs))
+        await _record_usage(purpose, message.usage)
+        return message.content[0].text.strip()
+    except TimeoutError:
+        _stats["timed_out"] += 1
+        logger.warning(f"Panggilan AI melewati batas {deadline or DEFAULT_DEADLINE:.0f} detik, memakai jawaban cadangan")
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.error(f"Panggilan AI gagal: {e}")
+    return fallback
+
+async def _stream_with_retry(kwargs: dict, on_text, received: list, purpose: str):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                async with get_client().messages.stream(**kwargs) as stream:
+                    async for text in stream.text_stream:
+                        received.append(text)
+                        await on_text("".join(received))
+                    usage = (await stream.get_final_message()).usage
+            await _record_usage(purpose, usage)
+            return
+        except Exception as e:
+            # Setelah sebagian jawaban terkirim, mengulang dari awal hanya akan menggandakan teks
+            if received or attempt == MAX_RETRIES or not _is_retryable(e): raise
+            _stats["retried"] += 1
+            await asyncio.sleep(_retry_delay(e, attempt))
+
+async def stream_complete(messages: list, max_tokens: int, on_text, deadline: float = None, fallback: str = None, purpose: str = None, **kwargs):
+    """
+    Seperti complete(), tetapi jawaban di-stream: on_text(teks_sejauh_ini) di-await setiap potongan baru tiba.
+    Hasil: (teks, terpotong). Bila gagal/melewati deadline di tengah jalan, teks yang sudah diterima dikembalikan dengan
+    terpotong=True; bila belum ada teks sama sekali, (fallback, False).
+    """
+    if not is_available(): return fallback, False
+    _stats["calls"] += 1
+    received, finished = [], False
+    try:
+        async with asyncio.timeout(deadline or DEFAULT_DEADLINE):
+            await _stream_with_retry(dict(model=MODEL, max_tokens=max_tokens, messages=messages, **kwargs), on_text, received, purpose)
+        finished = True
+    except TimeoutError:
+        _stats["timed_out"] += 1
+        logger.warning(f"Stream AI melewati batas {deadline or DEFAULT_DEADLINE:.0f} detik setelah {len(received)} potongan")
+    except Exception as e:
+        _stats["failed"] += 1
+        logger.error(f"Stream AI gagal: {e}")
+    text = "".join(received).strip()
+    if not text: return fallback, False
+    return text, not finished
+
+def get_stats() -> dict:
+    return dict(_stats)
+
+async def close():
+    """Menutup client bersama. Dipanggil saat aplikasi dimatikan."""
+    global _client
+    if _client is not None:
+        await _client.close()
+    _client = None
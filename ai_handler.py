@@ -1,89 +1,77 @@
 # File: ai_handler.py
 
-import os
+import re
 import random
-from dotenv import load_dotenv
-import anthropic
-import db_handler as db
+import asyncio
+import ai_client
+import checklist_cache
+import motivation_cache
+import calendar_handler
 import scripture_handler
+import log_aggregator
 from utils import escape_markdown_v2
-from datetime import datetime, timedelta
-
-# Muat environment variables
-load_dotenv()
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-
-# Inisialisasi client Anthropic
-try:
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    print("Berhasil terhubung ke Anthropic API.")
-except Exception as e:
-    print(f"Error saat inisialisasi client Anthropic: {e}")
-    client = None
-
-def analyze_logs(logs: list) -> str:
-    """Menganalisis log dengan lebih cerdas."""
-    if not logs:
+from datetime import timedelta
+
+# Jawaban cadangan bila AI tidak tersedia, gagal, atau melewati batas waktu
+MOTIVATION_FALLBACK = "Gagal mendapatkan motivasi personal saat ini."
+DISCUSSION_FALLBACK = "Maaf, saya belum bisa menjawab sekarang karena layanan sedang sibuk. Silakan coba lagi sebentar lagi."
+# Batas waktu (detik): pesan pendek harus cepat, jawaban diskusi boleh lebih lama
+SHORT_DEADLINE = 8
+DISCUSSION_DEADLINE = 25
+# Ditambahkan ke jawaban stream yang terhenti di tengah (deadline/gangguan); jawaban seperti ini tidak disimpan ke riwayat
+TRUNCATED_NOTE = "\n\n_(jawaban terpotong)_"
+
+# Persona & aturan diskusi tidak berubah antar giliran: dikirim sebagai system prompt, bagian dinamis (pertanyaan,
+# ringkasan ibadah, dalil) di pesan pengguna. Prompt ini (~460 token) di bawah batas minimum prompt caching Haiku (2048),
+# jadi system_blocks tidak menandainya; tanda cache_control baru dipasang otomatis bila prompt/model memenuhi batas.
+DISCUSSION_SYSTEM_PROMPT = """
+Anda adalah seorang Konsultan Islami AI yang bijaksana, empatik, dan berpegang teguh pada dalil. Anda memberikan jawaban yang personal dan relevan berdasarkan history percakapan dan ringkasan rutinitas ibadah pengguna.
+
+Setiap pesan pengguna berisi 'Pertanyaan Pengguna Saat Ini', 'Ringkasan Rutinitas Ibadah Pengguna', dan 'REFERENSI DALIL YANG DITEMUKAN'.
+Sapa pengguna dengan hormat di awal jawaban Anda dengan singkat, misalnya "Saudaraku yang dirahmati Allah,". Respon berdasarkan konteks request, apabila dia memberikan pujian, balas dengan ucapan terima kasih. Apabila dia mengeluh, berikan empati. Apabila dia bertanya, jawab dengan jelas dan ringkas.
+
+INSTRUKSI FINAL WAJIB DIPATUHI:
+1.  Apabila ada pertanyaan dari pengguna jawab HANYA BERDASARKAN referensi dalil yang diberikan. JANGAN berhalusinasi atau menggunakan pengetahuan eksternal.
+2.  **Personalisasi Jawaban:** Kaitkan jawaban Anda dengan 'Ringkasan Rutinitas Ibadah Pengguna'. Jika pengguna bertanya tentang amalan yang ia sering lewatkan, berikan jawaban yang lebih menyemangati.
+3.  **Struktur Jawaban:**
+    a. Apabila ada pertanyaan mohon berikan jawaban yang to the point dan memparafrasekan dalil dengan bahasa yang mudah dimengerti.
+    b. Sertakan Teks Arab dari ayat Al-Qur'an jika tersedia.
+    c. Sertakan kutipan lengkap terjemahan dalil yang paling relevan (Qur'an atau Hadis).
+    d. Sertakan sumbernya dengan jelas.
+4.  **Aturan Tambahan:**
+    - Jika referensi tidak cukup, WAJIB jawab: "Mohon maaf, saya tidak menemukan dalil yang relevan untuk menjawab pertanyaan Anda secara spesifik. Sebaiknya Anda bertanya kepada ustadz atau ahli fiqih terpercaya."
+5.  **Disclaimer WAJIB:** Akhiri jawaban dengan disclaimer: "_Jawaban ini adalah hasil parafrase dari AI berdasarkan dalil yang ditemukan dan perlu divalidasi oleh ahli. Wallahu a'lam._"
+""".strip()
+DISCUSSION_SYSTEM = ai_client.system_blocks(DISCUSSION_SYSTEM_PROMPT)
+
+def analyze_summary(summary: log_aggregator.LogSummary) -> str:
+    """Menganalisis hasil log_aggregator dengan lebih cerdas (hitungan yang sama dengan laporan, tidak dihitung ulang)."""
+    if not summary.total_days:
         return "Pengguna ini belum memiliki catatan ibadah."
 
-    item_counts = {item: 0 for item in db.CHECKLIST_ITEMS}
-    for day_log in logs:
-        for item in db.CHECKLIST_ITEMS:
-            if day_log.get(item) == "Sudah":
-                item_counts[item] += 1
-    
-    total_wajib_tercatat = sum(item_counts.get(s, 0) for s in db.WAJIB_ITEMS)
-    
-    amalan_terbaik = None
-    for item in db.WAJIB_ITEMS + db.SUNNAH_ITEMS + db.LAINNYA_ITEMS:
-        if item_counts.get(item, 0) > 0:
-            amalan_terbaik = item
-            break
-            
-    amalan_terlewat = None
-    for item in db.WAJIB_ITEMS:
-        if item_counts.get(item, 0) == 0:
-            amalan_terlewat = item
-            break
-            
-    summary = f"Pengguna menyelesaikan {total_wajib_tercatat} dari 5 sholat wajib. "
-    if amalan_terbaik:
-        summary += f"Dia sudah berhasil mengerjakan amalan '{amalan_terbaik}'. "
-    if amalan_terlewat:
-        summary += f"Namun, dia terlewat dalam amalan '{amalan_terlewat}'."
+    summary_text = f"Pengguna menyelesaikan {summary.wajib_done} dari 5 sholat wajib. "
+    if summary.best_item:
+        summary_text += f"Dia sudah berhasil mengerjakan amalan '{summary.best_item}'. "
+    if summary.missed_wajib:
+        summary_text += f"Namun, dia terlewat dalam amalan '{summary.missed_wajib}'."
         
-    return summary
+    return summary_text
 
-def get_theme_from_ai(log_summary: str):
+async def get_theme_from_ai(log_summary: str):
     """Langkah 1: Meminta AI untuk menentukan tema dari ringkasan log."""
-    if not client: return None
     prompt = f"""
     Berdasarkan ringkasan aktivitas ibadah pengguna berikut: "{log_summary}", 
     berikan satu kata kunci atau tema yang paling relevan untuk diberikan motivasi dalam bahasa Indonesia.
     Contoh: 'syukur', 'sabar', 'keutamaan sholat', 'sedekah', 'istiqomah'.
     Jawab HANYA dengan 1-2 kata saja.
     """
-    try:
-        message = client.messages.create(
-            model="claude-3-haiku-20240307", max_tokens=10,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return message.content[0].text.strip()
-    except Exception as e:
-        print(f"Error saat get_theme_from_ai: {e}")
-        return None
+    return await ai_client.complete([{"role": "user", "content": prompt}], max_tokens=10, deadline=SHORT_DEADLINE, purpose="motivasi_tema")
 
-def generate_motivational_message(logs: list):
-    """Menghasilkan motivasi singkat dengan kutipan ayat."""
-    if not client:
-        return f"\n\n> {escape_markdown_v2('Maaf, layanan motivasi AI sedang tidak tersedia.')}"
+def _format_motivation(ai_response: str) -> str:
+    return f"\n\n> {escape_markdown_v2(ai_response)}"
 
-    log_summary = analyze_logs(logs)
-    theme = get_theme_from_ai(log_summary)
-    dalil_data = None
-    if theme:
-        dalil_data = scripture_handler.search_quran(theme)
-        
+async def _generate_motivation_variant(log_summary: str, dalil_data):
+    """Langkah 2: satu variasi kalimat motivasi + kutipan dalil. None jika gagal."""
     prompt_akhir = f"""
     Anda adalah seorang motivator Islami yang memberikan nasihat singkat dan berbobot.
     Ringkasan Ibadah Pengguna: {log_summary}
@@ -99,73 +87,163 @@ def generate_motivational_message(logs: list):
     4. Format WAJIB: [Kalimat Motivasi Anda].\n\n📜 _"[Potongan kutipan ayat di sini]"_ [Referensi Ayat].
     """
     
-    try:
-        message = client.messages.create(
-            model="claude-3-haiku-20240307", max_tokens=100,
-            messages=[{"role": "user", "content": prompt_akhir}]
-        )
-        ai_response = message.content[0].text.strip()
-        safe_response = escape_markdown_v2(ai_response)
-        return f"\n\n> {safe_response}"
-    except Exception as e:
-        print(f"Error saat generate_motivational_message: {e}")
-        return f"\n\n> {escape_markdown_v2('Gagal mendapatkan motivasi personal saat ini.')}"
-
-def generate_discussion_response(user_id: int, user_question: str, history: list):
-    """Menghasilkan jawaban dari Konsultan Islami AI yang personal dan berbasis dalil."""
-    if not client: return escape_markdown_v2("Maaf, layanan diskusi AI sedang tidak tersedia.")
-
-    # --- LANGKAH BARU: Mengambil data ibadah pengguna ---
-    today = datetime.now()
+    return await ai_client.complete([{"role": "user", "content": prompt_akhir}], max_tokens=100, deadline=SHORT_DEADLINE, purpose="motivasi")
+
+async def generate_motivational_message(summary: log_aggregator.LogSummary):
+    """Menghasilkan motivasi singkat dengan kutipan ayat. Ringkasan yang sama dilayani dari pool variasi di motivation_cache."""
+    if not ai_client.is_available():
+        return f"\n\n> {escape_markdown_v2('Maaf, layanan motivasi AI sedang tidak tersedia.')}"
+
+    log_summary = analyze_summary(summary)
+    entry = await motivation_cache.get(log_summary)
+    if motivation_cache.is_pool_full(entry):
+        return _format_motivation(random.choice(entry["variants"]))
+
+    async with motivation_cache.lock(log_summary):
+        # Pemanggil lain mungkin sudah melengkapi pool selama kita menunggu lock
+        entry = await motivation_cache.get(log_summary) or motivation_cache.new_entry()
+        if motivation_cache.is_pool_full(entry):
+            return _format_motivation(random.choice(entry["variants"]))
+        # Tema & dalil cukup dicari sekali per ringkasan, lalu dipakai untuk semua variasi
+        if not entry["theme"]:
+            entry["theme"] = await get_theme_from_ai(log_summary)
+            if entry["theme"]:
+                entry["dalil"] = await scripture_handler.search_quran(entry["theme"])
+        ai_response = await _generate_motivation_variant(log_summary, entry["dalil"])
+        if ai_response:
+            entry["variants"].append(ai_response)
+            await motivation_cache.save(log_summary, entry)
+        elif entry["variants"]:
+            ai_response = random.choice(entry["variants"])
+    if not ai_response:
+        return _format_motivation(MOTIVATION_FALLBACK)
+    return _format_motivation(ai_response)
+
+# --- POOL KONTEN BROADCAST (dzikir, dhuha, Jumat) ---
+# Setiap slot punya beberapa pesan yang dibuat sekali per hari sebelum waktu kirim; semua penerima dilayani dari pool yang sama
+CONTENT_POOL_SIZE = 3
+SLOT_PROMPTS = {
+    "dzikir_pagi": "mengajak umat Islam membaca dzikir pagi",
+    "dzikir_petang": "mengajak umat Islam membaca dzikir petang",
+    "dhuha": "mengajak umat Islam mengerjakan sholat Dhuha",
+    "jumat": "tentang keutamaan hari Jumat, membaca Surah Al-Kahfi, dan memperbanyak shalawat",
+}
+# Dipakai bila AI tidak tersedia atau gagal
+FALLBACK_MESSAGES = {
+    "dzikir_pagi": ["Awali hari dengan dzikir, agar hati tenang dan langkah diberkahi.",
+                    "Dzikir pagi adalah benteng diri sebelum memulai aktivitas."],
+    "dzikir_petang": ["Tutup hari dengan dzikir petang, semoga Allah menjaga kita hingga pagi.",
+                      "Sejenak berdzikir di sore hari menenangkan hati yang lelah."],
+    "dhuha": ["Dua rakaat Dhuha adalah sedekah untuk seluruh persendian kita.",
+              "Luangkan waktu sejenak untuk Dhuha, semoga rezeki hari ini penuh berkah."],
+    "jumat": ["Jumat adalah penghulu hari, perbanyak shalawat dan baca Al-Kahfi.",
+              "Cahaya Al-Kahfi menerangi pembacanya di antara dua Jumat."],
+}
+_content_pools = {}  # slot -> {"date": tanggal, "messages": [...]}
+
+def _parse_pool_lines(text: str) -> list:
+    lines = [re.sub(r"^[\s\-\*\d\.\)]+", "", line).strip().strip('"') for line in text.splitlines()]
+    return [line for line in lines if line][:CONTENT_POOL_SIZE]
+
+async def _generate_slot_messages(slot: str) -> list:
+    """Satu panggilan AI menghasilkan beberapa variasi pesan untuk satu slot. List kosong jika gagal."""
+    prompt = f"""
+    Tuliskan {CONTENT_POOL_SIZE} kalimat motivasi Islami yang berbeda-beda, masing-masing maksimal 20 kata, {SLOT_PROMPTS[slot]}.
+    Tulis satu kalimat per baris, tanpa nomor, tanpa sapaan, tanpa format Markdown.
+    """
+    text = await ai_client.complete([{"role": "user", "content": prompt}], max_tokens=250, deadline=SHORT_DEADLINE, purpose="konten_harian")
+    return _parse_pool_lines(text) if text else []
+
+async def prepare_content_pool(slot: str, day=None) -> int:
+    """Mengisi pool satu slot untuk tanggal tertentu (default hari ini WIB). Mengembalikan jumlah pesan."""
+    day = day or calendar_handler.today_wib()
+    messages = await _generate_slot_messages(slot) or FALLBACK_MESSAGES[slot]
+    _content_pools[slot] = {"date": day, "messages": messages}
+    return len(messages)
+
+async def prepare_content_pools(slots: list = None, day=None) -> dict:
+    """Mengisi pool beberapa slot sekaligus (paralel). Dipanggil oleh job pagi sebelum slot pertama."""
+    slots = slots or list(SLOT_PROMPTS)
+    counts = await asyncio.gather(*(prepare_content_pool(slot, day) for slot in slots))
+    return dict(zip(slots, counts))
+
+async def _get_pool_message(slot: str) -> str:
+    """Satu pesan acak dari pool hari ini, sudah di-escape untuk MarkdownV2. Pool dibuat saat itu juga bila belum ada."""
+    pool = _content_pools.get(slot)
+    if not pool or pool["date"] != calendar_handler.today_wib():
+        await prepare_content_pool(slot)
+        pool = _content_pools[slot]
+    return escape_markdown_v2(random.choice(pool["messages"]))
+
+async def generate_dzikir_motivation(time_of_day: str) -> str:
+    return await _get_pool_message(f"dzikir_{time_of_day.lower()}")
+
+async def generate_dhuha_motivation() -> str:
+    return await _get_pool_message("dhuha")
+
+async def generate_jumat_motivation() -> str:
+    return await _get_pool_message("jumat")
+
+async def summarize_discussion(previous_summary: str, messages: list):
+    """Memadatkan ringkasan lama + pesan-pesan lama menjadi satu ringkasan berjalan. None jika AI gagal."""
+    transcript = "\n".join(f"{'Pengguna' if m['role'] == 'user' else 'Konsultan'}: {m['content']}" for m in messages)
+    prompt = f"""
+    Ringkas percakapan konsultasi Islami berikut untuk dipakai sebagai konteks percakapan lanjutan.
+    Ringkasan sebelumnya: {previous_summary or "(belum ada)"}
+    Percakapan baru:
+    {transcript}
+    Tulis SATU paragraf (maksimal 120 kata) dalam Bahasa Indonesia yang memuat topik yang ditanyakan, keadaan pengguna yang ia ceritakan, dan inti jawaban beserta dalilnya. Jangan tambahkan hal yang tidak ada di percakapan.
+    """
+    return await ai_client.complete([{"role": "user", "content": prompt}], max_tokens=250, deadline=SHORT_DEADLINE, purpose="ringkasan_diskusi")
+
+async def generate_discussion_response(user_id: int, user_question: str, history: list, on_text=None):
+    """
+    Menghasilkan jawaban dari Konsultan Islami AI yang personal dan berbasis dalil.
+    Jika on_text diberikan, jawaban di-stream dan on_text(teks_sejauh_ini) dipanggil setiap potongan baru tiba.
+    Hasil: (jawaban, terpotong); jawaban yang terpotong sudah diberi TRUNCATED_NOTE.
+    """
+    if not ai_client.is_available(): return escape_markdown_v2("Maaf, layanan diskusi AI sedang tidak tersedia."), False
+
+    # --- LANGKAH BARU: Mengambil data ibadah pengguna (tanggal WIB, sama dengan checklist) ---
+    today = calendar_handler.today_wib()
     start_date = (today - timedelta(days=6)).strftime("%Y-%m-%d")
     end_date = today.strftime("%Y-%m-%d")
-    logs = db.get_user_logs_for_period(user_id, start_date, end_date)
-    ibadah_summary = analyze_logs(logs) # Menganalisis rutinitas ibadah pengguna
 
-    # --- Mencari referensi dalil (tidak berubah) ---
-    keywords = user_question.split()
-    quran_ref = scripture_handler.search_quran(user_question)
-    hadith_ref = scripture_handler.search_hadith(random.choice(keywords)) if len(keywords) > 1 else None
+    async def get_period_summary():
+        await checklist_cache.flush(user_id)
+        return await log_aggregator.counts_for_period(user_id, start_date, end_date)
+
+    async def no_reference():
+        return None
+
+    # --- Data ibadah & referensi dalil diambil bersamaan ---
+    # Pertanyaan utuh dicari di indeks lokal (stopword dibuang, diurutkan bm25); API hanya menerima satu kata kunci
+    period_summary, quran_ref, hadith_ref = await asyncio.gather(
+        get_period_summary(),
+        scripture_handler.search_quran(user_question),
+        scripture_handler.search_hadith(user_question) if len(user_question.split()) > 1 else no_reference())
+    ibadah_summary = analyze_summary(period_summary) # Menganalisis rutinitas ibadah pengguna
 
-    # --- PROMPT MASTER BARU ---
+    # --- Bagian dinamis saja; persona & instruksi tetap ada di DISCUSSION_SYSTEM_PROMPT ---
     prompt = f"""
-    Anda adalah seorang Konsultan Islami AI yang bijaksana, empatik, dan berpegang teguh pada dalil. Anda memberikan jawaban yang personal dan relevan berdasarkan history percakapan dan ringkasan rutinitas ibadah pengguna.
-    
-    KONTEKS PENGGUNA:
-    1.  Pertanyaan Pengguna Saat Ini: "{user_question}"
-    2.  Sapa pengguna dengan hormat di awal jawaban Anda dengan singkat, misalnya "Saudaraku yang dirahmati Allah,". Respon berdasarkan konteks request, apabila dia memberikan pujian, balas dengan ucapan terima kasih. Apabila dia mengeluh, berikan empati. Apabila dia bertanya, jawab dengan jelas dan ringkas.
+    Pertanyaan Pengguna Saat Ini: "{user_question}"
+    Ringkasan Rutinitas Ibadah Pengguna (7 hari terakhir): {ibadah_summary}
     REFERENSI DALIL YANG DITEMUKAN:
     """
-    
     if quran_ref:
         prompt += f"\n- Al-Qur'an: {quran_ref['arabic']} | {quran_ref['text']} {quran_ref['reference']}\n"
     if hadith_ref:
         prompt += f"\n- Hadis: {hadith_ref['text']} {hadith_ref['reference']}\n"
-        
-    prompt += """
-    INSTRUKSI FINAL WAJIB DIPATUHI:
-    1.  Apabila ada pertanyaan dari pengguna jawab HANYA BERDASARKAN referensi dalil yang diberikan. JANGAN berhalusinasi atau menggunakan pengetahuan eksternal.
-    2.  **Personalisasi Jawaban:** Kaitkan jawaban Anda dengan 'Ringkasan Rutinitas Ibadah Pengguna'. Jika pengguna bertanya tentang amalan yang ia sering lewatkan, berikan jawaban yang lebih menyemangati.
-    3.  **Struktur Jawaban:**
-        a. Apabila ada pertanyaan mohon berikan jawaban yang to the point dan memparafrasekan dalil dengan bahasa yang mudah dimengerti.
-        b. Sertakan Teks Arab dari ayat Al-Qur'an jika tersedia.
-        c. Sertakan kutipan lengkap terjemahan dalil yang paling relevan (Qur'an atau Hadis).
-        d. Sertakan sumbernya dengan jelas.
-    4.  **Aturan Tambahan:**
-        - Jika referensi tidak cukup, WAJIB jawab: "Mohon maaf, saya tidak menemukan dalil yang relevan untuk menjawab pertanyaan Anda secara spesifik. Sebaiknya Anda bertanya kepada ustadz atau ahli fiqih terpercaya."
-    5.  **Disclaimer WAJIB:** Akhiri jawaban dengan disclaimer: "_Jawaban ini adalah hasil parafrase dari AI berdasarkan dalil yang ditemukan dan perlu divalidasi oleh ahli. Wallahu a'lam._"
-    """
+    if not quran_ref and not hadith_ref:
+        prompt += "\n- (tidak ada)\n"
 
     messages_to_send = history + [{'role': 'user', 'content': prompt}]
 
-    try:
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=600, # Tambah sedikit ruang untuk jawaban yang lebih kaya
-            messages=messages_to_send
-        )
-        ai_response = message.content[0].text.strip()
-        return ai_response
-    except Exception as e:
-        print(f"Error saat generate_discussion_response: {e}")
-        return escape_markdown_v2("Maaf, terjadi kesalahan saat menyusun jawaban.")
+    # Tambah sedikit ruang untuk jawaban yang lebih kaya; lewat batas waktu -> jawaban cadangan
+    if on_text:
+        answer, truncated = await ai_client.stream_complete(messages_to_send, max_tokens=600, on_text=on_text, deadline=DISCUSSION_DEADLINE,
+                                                            fallback=DISCUSSION_FALLBACK, system=DISCUSSION_SYSTEM, purpose="diskusi")
+        return (answer + TRUNCATED_NOTE if truncated else answer), truncated
+    answer = await ai_client.complete(messages_to_send, max_tokens=600, deadline=DISCUSSION_DEADLINE, fallback=DISCUSSION_FALLBACK,
+                                      system=DISCUSSION_SYSTEM, purpose="diskusi")
+    return answer, False
@@ -0,0 +1,66 @@
+# File: bench/bench_db_handler.py
+"""
+Micro-benchmark db_handler: koneksi bersama (WAL + pragma) vs. perilaku lama buka-tutup koneksi per panggilan.
+
+    python bench/bench_db_handler.py [--ops 3000] [--dir /tmp]
+
+Mode "per-call" meniru kode lama: setiap panggilan membuka koneksi baru dengan journal bawaan (DELETE)
+lalu menutupnya; isi transaksi tetap memakai satu koneksi. Kedua mode memakai file database baru masing-masing.
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_handler as db
+
+USERS = 200
+_shared_get_connection = db.get_connection
+
+def _per_call_connection() -> sqlite3.Connection:
+    """Pengganti db.get_connection: koneksi baru di setiap panggilan di luar transaksi (koneksi lama tertutup saat tak lagi dipakai)."""
+    local = db._local
+    if getattr(local, "conn", None) is not None and local.depth > 0:
+        return local.conn
+    conn = sqlite3.connect(db.DB_NAME, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    local.conn, local.db_name, local.depth = conn, db.DB_NAME, 0
+    return conn
+
+def _timed(ops: int, call) -> float:
+    started = time.perf_counter()
+    for index in range(ops): call(index)
+    return ops / (time.perf_counter() - started)
+
+def run(mode: str, path: str, ops: int) -> dict:
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+    db.close_connection()
+    db.DB_NAME = path
+    db.get_connection = _per_call_connection if mode == "per-call" else _shared_get_connection
+    db.init_db()
+    for user_id in range(USERS): db.add_new_user_for_verification(user_id, f"u{user_id}", f"User {user_id}")
+    results = {
+        "find_user_by_id": _timed(ops, lambda i: db.find_user_by_id(i % USERS)),
+        "get_or_create_daily_log": _timed(ops, lambda i: db.get_or_create_daily_log(i % USERS, f"2026-10-{1 + i // USERS % 28:02d}")),
+        "update_daily_log_item": _timed(ops, lambda i: db.update_daily_log_item(i % USERS, "2026-10-01", "Subuh", db.STATUS_DONE if i % 2 else db.STATUS_NOT_DONE)),
+        "add_discussion_message": _timed(ops, lambda i: db.add_discussion_message(i % USERS, "user", "assalamualaikum")),
+    }
+    assert db.find_user_by_id(5)["username"] == "u5"
+    db.close_connection()
+    db.get_connection = _shared_get_connection
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membandingkan ops/detik db_handler: koneksi bersama vs. per panggilan.")
+    parser.add_argument("--ops", type=int, default=3000)
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="folder untuk file database sementara (pakai disk lokal)")
+    args = parser.parse_args()
+    per_call = run("per-call", os.path.join(args.dir, "bench_per_call.db"), args.ops)
+    shared = run("shared", os.path.join(args.dir, "bench_shared.db"), args.ops)
+    print(f"{'operasi':26s} {'per-call':>10s} {'shared':>10s}  ops/detik")
+    for name in per_call:
+        print(f"{name:26s} {per_call[name]:10.0f} {shared[name]:10.0f}  ({shared[name] / per_call[name]:.1f}x)")
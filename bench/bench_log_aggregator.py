@@ -0,0 +1,75 @@
+# File: bench/bench_log_aggregator.py
+"""
+Micro-benchmark log_aggregator: agregasi satu periode (jumlah per item + runtun) dalam mikrodetik per laporan.
+
+    python bench/bench_log_aggregator.py [--days 1 7 30 365 3650] [--check 300]
+
+Kolom "python" meniru cara lama: jumlah per item dihitung dari mask lalu runtun dicari dengan loop terpisah per item.
+"loop" dan "numpy" memaksa satu jalur log_aggregator, "dipilih" memakai ambang VECTORIZE_MIN_DAYS apa adanya.
+Sebelum mengukur, kedua jalur dicocokkan pada periode acak (dengan tanggal bolong).
+"""
+import os
+import sys
+import random
+import timeit
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_handler as db
+import log_aggregator
+
+def make_period(days: int, gap_rate: float = 0.02, seed: int = 1) -> list:
+    """(tanggal, done_mask) acak urut tanggal; sebagian hari dilewati, 60% hari kelima sholat wajib lengkap."""
+    rng, day, rows = random.Random(seed), date(2020, 1, 1), []
+    while len(rows) < days:
+        if rng.random() >= gap_rate: rows.append((day.isoformat(), rng.getrandbits(len(db.CHECKLIST_ITEMS)) | (0x1f if rng.random() < 0.6 else 0)))
+        day += timedelta(days=1)
+    return rows
+
+def python_baseline(rows: list):
+    """Cara lama: hitung per item dari mask, lalu satu loop runtun per item."""
+    counts = {item: sum(1 for _, mask in rows if mask & bit) for item, bit in db.CHECKLIST_BITS.items()}
+    longest = {}
+    for item, bit in db.CHECKLIST_BITS.items():
+        current = best = 0; previous = None
+        for date_text, mask in rows:
+            ordinal = date.fromisoformat(date_text).toordinal()
+            current = (current + 1 if previous is not None and ordinal - previous == 1 else 1) if mask & bit else 0
+            best = max(best, current); previous = ordinal
+        longest[item] = best
+    return counts, longest
+
+def aggregate(rows: list, min_days: int):
+    default, log_aggregator.VECTORIZE_MIN_DAYS = log_aggregator.VECTORIZE_MIN_DAYS, min_days
+    try:
+        return log_aggregator.from_masks(rows)
+    finally:
+        log_aggregator.VECTORIZE_MIN_DAYS = default
+
+def check(periods: int):
+    for seed in range(periods):
+        rng = random.Random(seed)
+        rows = make_period(rng.randint(1, 120), rng.choice([0, 0.1, 0.5]), seed)
+        ordinals, masks = [date.fromisoformat(row[0]).toordinal() for row in rows], [row[1] for row in rows]
+        assert log_aggregator._aggregate_loop(ordinals, masks) == log_aggregator._aggregate_numpy(ordinals, masks), seed
+        summary, (counts, longest) = aggregate(rows, log_aggregator.VECTORIZE_MIN_DAYS), python_baseline(rows)
+        assert summary.item_counts == counts and all(summary.longest_streaks[item] == longest[item] for item in counts), seed
+    print(f"loop == numpy == python pada {periods} periode acak")
+
+def _micros(call, days: int) -> float:
+    number = max(20, 20000 // days)
+    return min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membandingkan jalur agregasi log_aggregator dengan loop Python lama.")
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 90, 365, 3650])
+    parser.add_argument("--check", type=int, default=300, help="jumlah periode acak untuk uji kesamaan hasil")
+    args = parser.parse_args()
+    check(args.check)
+    print(f"{'hari':>6s} {'python':>9s} {'loop':>9s} {'numpy':>9s} {'dipilih':>9s}  mikrodetik/laporan")
+    for days in args.days:
+        rows = make_period(days)
+        timings = [_micros(lambda: python_baseline(rows), days), _micros(lambda: aggregate(rows, 10**9), days),
+                   _micros(lambda: aggregate(rows, 0), days), _micros(lambda: aggregate(rows, log_aggregator.VECTORIZE_MIN_DAYS), days)]
+        print(f"{days:>6d} " + " ".join(f"{timing:9.1f}" for timing in timings))
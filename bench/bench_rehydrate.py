@@ -0,0 +1,89 @@
+# File: bench/bench_rehydrate.py
+"""
+Benchmark startup: post_init (rehydrate_notification_jobs) untuk ~100 ribu pengguna terhadap JobQueue sungguhan.
+
+    python bench/bench_rehydrate.py [--users 100000] [--myquran-cities 200] [--latency 0.05] [--dir /tmp]
+
+Pengguna disebar ke semua kota KOORDINAT_KOTA (dihitung lokal) dan ke kota tambahan di fake_myquran (diambil lewat
+API tiruan dengan jeda --latency). Diukur dua kali: start dingin (store jadwal kosong) dan rerun langsung sesudahnya,
+yang tidak boleh membuat job baru maupun nama job ganda. Jumlah job sholat bergantung jam saat dijalankan (waktu yang
+sudah lewat tidak dijadwalkan). JobQueue butuh python-telegram-bot[job-queue] (APScheduler).
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fake_myquran
+import db_handler as db
+import prayer_calculator
+import prayer_handler
+import broadcast_handler
+import main
+from telegram.ext import Application, JobQueue
+
+def seed_users(path: str, users: int, myquran_cities: int) -> list:
+    """Mengisi database baru dengan pengguna aktif; mengembalikan daftar kota yang dipakai."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+    db.close_connection()
+    db.DB_NAME = path
+    db.init_db()
+    for index in range(myquran_cities): fake_myquran.CITIES[f"{9000 + index}"] = f"KAB. CONTOH {index:03d}"
+    cities = list(prayer_calculator.KOORDINAT_KOTA) + [f"Contoh {index:03d}" for index in range(myquran_cities)]
+    rng = random.Random(1)
+    rows = [(user_id, f"User {user_id}", f"u{user_id}", "Approved", 1, rng.choice(cities), *(int(rng.random() < 0.7) for _ in db.NOTIFICATION_TYPES))
+            for user_id in range(1, users + 1)]
+    columns = ["user_id", "full_name", "username", "status", "agreed_terms", "location"] + db.NOTIFICATION_TYPES
+    with db.transaction() as cursor:
+        cursor.executemany(f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+    return cities
+
+async def run(users: int, myquran_cities: int, latency: float, path: str) -> dict:
+    started = time.perf_counter()
+    cities = seed_users(path, users, myquran_cities)
+    seed_seconds = time.perf_counter() - started
+    server, prayer_handler.BASE_URL = fake_myquran.start(latency=latency)
+    job_queue = JobQueue()
+    application = Application.builder().token("123:uji").job_queue(job_queue).build()
+    job_queue.set_application(application)
+    await job_queue.start()
+    results = {"seed": seed_seconds, "cities": len(cities)}
+    try:
+        for label in ("cold", "rerun"):
+            before = len(job_queue.jobs())
+            started = time.perf_counter()
+            await main.post_init(application)
+            results[label] = time.perf_counter() - started
+            results[f"{label}_jobs"] = len(job_queue.jobs()) - before
+        names = Counter(job.name for job in job_queue.jobs())
+        results["total_jobs"], results["duplicates"] = sum(names.values()), sum(count - 1 for count in names.values() if count > 1)
+        results["requests"] = fake_myquran.get_stats()
+    finally:
+        await broadcast_handler.stop(timeout=1)
+        await job_queue.stop(wait=False)
+        await main.http_client.close()
+        await main.db_async.close()
+        server.shutdown()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mengukur post_init/rehydrate_notification_jobs dengan banyak pengguna.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--myquran-cities", type=int, default=200, help="kota tambahan yang jadwalnya diambil dari fake_myquran")
+    parser.add_argument("--latency", type=float, default=0.05, help="jeda per request fake_myquran (detik)")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="folder untuk file database sementara (pakai disk lokal)")
+    args = parser.parse_args()
+    for name in ("main", "apscheduler", "httpx"): logging.getLogger(name).setLevel(logging.WARNING)
+    results = asyncio.run(run(args.users, args.myquran_cities, args.latency, os.path.join(args.dir, "bench_rehydrate.db")))
+    print(f"{args.users} pengguna di {results['cities']} kota (seed {results['seed']:.2f} detik)")
+    print(f"post_init dingin : {results['cold']:.2f} detik, {results['cold_jobs']} job baru")
+    print(f"post_init rerun  : {results['rerun']:.2f} detik, {results['rerun_jobs']} job baru")
+    print(f"total job {results['total_jobs']}, nama ganda {results['duplicates']}, request fake_myquran {results['requests']}")
+    assert results["rerun_jobs"] == 0 and results["duplicates"] == 0
@@ -0,0 +1,114 @@
+# File: bench/bench_sholat_latency.py
+"""
+Benchmark menu "Waktu Sholat" ujung ke ujung: kapan jadwal terlihat, kapan motivasi terlihat, kapan handler selesai.
+
+    python bench/bench_sholat_latency.py [--runs 3] [--myquran-latency 0.2] [--ai-latency 1.5] [--telegram-latency 0.08]
+
+MyQuran dan Anthropic dilayani fake_myquran dan fake_anthropic dengan jeda yang diatur; Telegram ditiru dengan jeda per
+kirim/edit pesan. Setiap run memakai database baru dan cache kosong. Mode "berurutan" meniru handler lama (jadwal lalu
+motivasi, satu pesan gabungan); mode "paralel" memanggil main.menu_sholat_handler_text apa adanya.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fake_anthropic
+import fake_myquran
+import ai_client
+import checklist_cache
+import db_handler as db
+import motivation_cache
+import prayer_handler
+import scripture_handler
+import main
+
+USER_ID = 1
+CITY = "Garut"  # Di luar KOORDINAT_KOTA: jadwal diambil dari fake_myquran
+
+class FakeMessage:
+    """Pengganti telegram.Message: setiap kirim/edit menunggu telegram_latency lalu mencatat waktunya."""
+    def __init__(self, clock: dict, latency: float):
+        self.clock, self.latency = clock, latency
+
+    async def _deliver(self, text: str):
+        await asyncio.sleep(self.latency)
+        elapsed = time.perf_counter() - self.clock["started"]
+        if "Jadwal Sholat" in text:
+            self.clock.setdefault("schedule", elapsed)
+            if main.MOTIVATION_PLACEHOLDER not in text: self.clock.setdefault("motivation", elapsed)
+
+    async def reply_text(self, text, parse_mode=None, reply_markup=None):
+        await self._deliver(text)
+        return FakeMessage(self.clock, self.latency)
+
+    async def edit_text(self, text, parse_mode=None):
+        await self._deliver(text)
+
+async def sequential_handler(update, context):
+    """Alur lama: semua langkah berurutan, jadwal dan motivasi dikirim dalam satu pesan."""
+    await update.message.reply_text(f"Lokasi Anda: **{CITY}**\\.", parse_mode='MarkdownV2')
+    await update.message.reply_text("Mengambil jadwal & motivasi personal...")
+    schedule_message = await prayer_handler.get_prayer_times(city=CITY)
+    motivational_message = await main.get_weekly_motivation(USER_ID)
+    await update.message.reply_text(schedule_message + motivational_message, parse_mode='MarkdownV2')
+    await update.message.reply_text("Ganti lokasi?")
+
+def _fresh_state(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix): os.remove(path + suffix)
+    db.close_connection()
+    db.DB_NAME = path
+    db.init_db()
+    db.add_new_user_for_verification(USER_ID, "uji", "Pengguna Uji")
+    db.update_user_status(USER_ID, "Approved"); db.update_user_terms_agreement(USER_ID); db.update_user_location(USER_ID, CITY)
+    for cache in (prayer_handler._city_id_cache, scripture_handler._results, scripture_handler._last_good, motivation_cache._cache, checklist_cache._cache):
+        cache.clear()
+
+async def measure(mode: str, path: str, telegram_latency: float) -> dict:
+    await main.db_async.run(_fresh_state, path)
+    clock, tasks = {}, []
+    context = SimpleNamespace(application=SimpleNamespace(create_task=lambda coro, update=None: tasks.append(asyncio.create_task(coro)) or tasks[-1]))
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=USER_ID), message=FakeMessage(clock, telegram_latency))
+    clock["started"] = time.perf_counter()
+    await (sequential_handler if mode == "berurutan" else main.menu_sholat_handler_text)(update, context)
+    clock["handler"] = time.perf_counter() - clock["started"]
+    await asyncio.gather(*tasks)
+    return clock
+
+async def run(runs: int, myquran_latency: float, ai_latency: float, telegram_latency: float, path: str) -> dict:
+    myquran_server, base_url = fake_myquran.start(latency=myquran_latency)
+    prayer_handler.BASE_URL = scripture_handler.BASE_URL = base_url
+    anthropic_server, os.environ["ANTHROPIC_BASE_URL"] = fake_anthropic.start(latency=ai_latency, text="Tetap istiqamah menjaga sholat.")
+    ai_client.ANTHROPIC_API_KEY, ai_client._client = "uji", None
+    results = {}
+    try:
+        for mode in ("berurutan", "paralel"):
+            results[mode] = [await measure(mode, path, telegram_latency) for _ in range(runs)]
+        results["ai_requests"] = fake_anthropic.get_stats()["requests"]
+    finally:
+        await main.http_client.close(); await ai_client.close(); await main.db_async.close()
+        myquran_server.shutdown(); anthropic_server.shutdown()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mengukur latensi menu Waktu Sholat: handler lama (berurutan) vs. sekarang (paralel).")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--myquran-latency", type=float, default=0.2, help="jeda per request fake_myquran (detik)")
+    parser.add_argument("--ai-latency", type=float, default=1.5, help="jeda per panggilan fake_anthropic (detik)")
+    parser.add_argument("--telegram-latency", type=float, default=0.08, help="jeda per kirim/edit pesan Telegram (detik)")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="folder untuk file database sementara")
+    args = parser.parse_args()
+    for name in ("main", "httpx"): logging.getLogger(name).setLevel(logging.WARNING)
+    results = asyncio.run(run(args.runs, args.myquran_latency, args.ai_latency, args.telegram_latency, os.path.join(args.dir, "bench_sholat.db")))
+    ai_requests = results.pop("ai_requests")
+    print(f"{'mode':10s} {'jadwal':>8s} {'motivasi':>9s} {'handler':>8s}  detik (median {args.runs} run)")
+    for mode, clocks in results.items():
+        median = lambda key: sorted(clock.get(key, float("nan")) for clock in clocks)[len(clocks) // 2]
+        print(f"{mode:10s} {median('schedule'):8.2f} {median('motivation'):9.2f} {median('handler'):8.2f}")
+    print(f"{ai_requests} panggilan AI ke fake_anthropic (cache motivasi dikosongkan setiap run)")
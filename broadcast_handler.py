@@ -0,0 +1,129 @@
+# File: broadcast_handler.py
+import os
+import asyncio
+import logging
+import random
+from datetime import timedelta
+from telegram.error import RetryAfter, Forbidden, BadRequest, TimedOut, NetworkError
+
+logger = logging.getLogger(__name__)
+
+# Batas kirim Telegram: ~30 pesan/detik global dan ~1 pesan/detik per chat
+MESSAGES_PER_SECOND = float(os.getenv("BROADCAST_MESSAGES_PER_SECOND", "25"))
+PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.0"))
+MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "5"))
+WORKER_COUNT = int(os.getenv("BROADCAST_WORKERS", "8"))
+STATS_INTERVAL = 60  # detik antar laporan throughput & backlog
+
+_bot = None
+_queue = None
+_tasks = []
+_next_global_slot = 0.0
+_paused_until = 0.0
+_chat_next_slot = {}
+_stats = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+_last_report = {"time": 0.0, "sent": 0}
+
+def _now() -> float:
+    return asyncio.get_running_loop().time()
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+async def _wait_for_slot(chat_id: int):
+    """Menunggu giliran kirim sesuai batas global dan batas per chat (slot dipesan lebih dulu, lalu tidur)."""
+    global _next_global_slot
+    while True:
+        now = _now()
+        global_slot = max(now, _next_global_slot, _paused_until)
+        _next_global_slot = global_slot + 1.0 / MESSAGES_PER_SECOND
+        chat_slot = max(global_slot, _chat_next_slot.get(chat_id, 0.0))
+        _chat_next_slot[chat_id] = chat_slot + PER_CHAT_INTERVAL
+        if chat_slot > now:
+            await asyncio.sleep(chat_slot - now)
+        # Jika selama menunggu ada RetryAfter dari worker lain, pesan ulang slot setelah jeda
+        if _now() >= _paused_until:
+            return
+
+async def _deliver(chat_id: int, text: str, kwargs: dict):
+    global _paused_until
+    for attempt in range(MAX_RETRIES + 1):
+        await _wait_for_slot(chat_id)
+        try:
+            await _bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            _stats["sent"] += 1
+            return
+        except RetryAfter as e:
+            # Flood control berlaku untuk seluruh bot: jeda semua worker
+            _stats["rate_limited"] += 1
+            _paused_until = max(_paused_until, _now() + _retry_after_seconds(e))
+        except (Forbidden, BadRequest) as e:
+            # Pengguna memblokir bot / chat tidak valid: tidak ada gunanya diulang
+            logger.warning(f"Broadcast ke {chat_id} ditolak: {e}")
+            break
+        except (TimedOut, NetworkError) as e:
+            backoff = min(60, 2 ** attempt) + random.uniform(0, 1)
+            logger.info(f"Broadcast ke {chat_id} gagal ({e}), coba lagi dalam {backoff:.1f} detik")
+            await asyncio.sleep(backoff)
+        except Exception as e:
+            logger.error(f"Broadcast ke {chat_id} gagal: {e}")
+            break
+        _stats["retried"] += 1
+    _stats["failed"] += 1
+
+async def _worker():
+    while True:
+        chat_id, text, kwargs = await _queue.get()
+        try:
+            await _deliver(chat_id, text, kwargs)
+        finally:
+            _queue.task_done()
+
+async def _reporter():
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        stats = get_stats()
+        if stats["backlog"] or stats["throughput"]:
+            logger.info(f"Broadcast: {stats['throughput']:.1f} pesan/detik, backlog {stats['backlog']}, "
+                        f"terkirim {stats['sent']}, gagal {stats['failed']}, diulang {stats['retried']}, flood {stats['rate_limited']}")
+        _last_report.update(time=_now(), sent=stats["sent"])
+        # Buang jadwal per chat yang sudah lewat agar memori tidak terus tumbuh
+        now = _now()
+        for chat_id in [c for c, slot in _chat_next_slot.items() if slot < now]:
+            del _chat_next_slot[chat_id]
+
+def start(bot):
+    """Menyalakan antrean dan worker. Dipanggil sekali saat aplikasi mulai."""
+    global _bot, _queue
+    if _tasks: return
+    _bot, _queue = bot, asyncio.Queue()
+    _last_report.update(time=_now(), sent=_stats["sent"])
+    _tasks.extend(asyncio.create_task(_worker()) for _ in range(WORKER_COUNT))
+    _tasks.append(asyncio.create_task(_reporter()))
+
+def enqueue(chat_id: int, text: str, **kwargs):
+    """Memasukkan satu pesan ke antrean kirim. Argumen tambahan diteruskan ke bot.send_message."""
+    if _queue is None:
+        raise RuntimeError("broadcast_handler.start() belum dipanggil")
+    _stats["enqueued"] += 1
+    _queue.put_nowait((chat_id, text, kwargs))
+
+def get_stats() -> dict:
+    """Statistik dispatcher: total terkirim/gagal/diulang, backlog dan throughput sejak laporan berkala terakhir."""
+    now = _now() if _queue is not None else 0.0
+    elapsed = now - _last_report["time"]
+    throughput = (_stats["sent"] - _last_report["sent"]) / elapsed if elapsed > 0 else 0.0
+    return dict(_stats, backlog=_queue.qsize() if _queue is not None else 0, throughput=throughput)
+
+async def stop(timeout: float = 30.0):
+    """Menunggu antrean habis (maksimal timeout detik), lalu menghentikan worker."""
+    global _queue
+    if _queue is None: return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Broadcast dihentikan dengan {_queue.qsize()} pesan belum terkirim")
+    for task in _tasks: task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear(); _queue = None
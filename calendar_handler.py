@@ -1,13 +1,75 @@
 # File: calendar_handler.py
-from datetime import datetime
+import time
+from datetime import datetime, date, timedelta
+import pytz
 from hijri_converter import Gregorian
 
-def get_todays_sunnah_fasts():
-    today = datetime.now(); sunnah_fasts = []
-    if today.weekday() == 0: sunnah_fasts.append("Puasa Senin")
-    elif today.weekday() == 3: sunnah_fasts.append("Puasa Kamis")
-    hijri_date = Gregorian(today.year, today.month, today.day).to_hijri()
+WIB = pytz.timezone('Asia/Jakarta')
+# Rentang tabel yang dihitung sekali di awal: tahun lalu s.d. beberapa tahun ke depan
+TABLE_YEARS_BEFORE = 1
+TABLE_YEARS_AFTER = 3
+
+# tanggal Masehi -> (tanggal Hijriah (tahun, bulan, hari), tuple puasa sunnah yang berlaku)
+_calendar_table = {}
+# Hasil untuk hari ini berlaku sampai tengah malam WIB berikutnya (epoch), agar tidak perlu menghitung tanggal WIB tiap panggilan
+_today = {"date": None, "fasts": (), "expires_at": 0.0}
+
+def _compute_day(day: date):
+    """Konversi Hijriah dan daftar puasa sunnah untuk satu tanggal (aturan sama seperti sebelumnya)."""
+    sunnah_fasts = []
+    if day.weekday() == 0: sunnah_fasts.append("Puasa Senin")
+    elif day.weekday() == 3: sunnah_fasts.append("Puasa Kamis")
+    try:
+        hijri_date = Gregorian(day.year, day.month, day.day).to_hijri()
+    except OverflowError:
+        return None, tuple(sunnah_fasts)  # Di luar rentang yang didukung hijri_converter
     if hijri_date.day in [13, 14, 15]: sunnah_fasts.append("Puasa Ayyamul Bidh")
     if hijri_date.month == 12 and hijri_date.day == 9: sunnah_fasts.append("Puasa Arafah")
     if hijri_date.month == 1 and hijri_date.day in [9, 10]: sunnah_fasts.append("Puasa Tasu'a/Asyura")
-    return sunnah_fasts
\ No newline at end of file
+    return (hijri_date.year, hijri_date.month, hijri_date.day), tuple(sunnah_fasts)
+
+def build_calendar_table(start_year: int = None, end_year: int = None) -> int:
+    """Menghitung tabel Hijriah & puasa sunnah untuk seluruh hari dalam rentang tahun. Mengembalikan jumlah hari."""
+    this_year = datetime.now(WIB).year
+    start = date(start_year or this_year - TABLE_YEARS_BEFORE, 1, 1)
+    end = date((end_year or this_year + TABLE_YEARS_AFTER) + 1, 1, 1)
+    for offset in range((end - start).days):
+        day = start + timedelta(days=offset)
+        if day not in _calendar_table:
+            _calendar_table[day] = _compute_day(day)
+    return (end - start).days
+
+def _lookup(day: date):
+    if not _calendar_table:
+        build_calendar_table()
+    entry = _calendar_table.get(day)
+    if entry is None:
+        entry = _calendar_table[day] = _compute_day(day)  # Di luar tabel: hitung sekali lalu simpan
+    return entry
+
+def today_wib() -> date:
+    return datetime.now(WIB).date()
+
+def get_hijri_date(day: date):
+    """Tanggal Hijriah (tahun, bulan, hari) untuk tanggal Masehi, atau None bila di luar jangkauan konverter."""
+    return _lookup(day)[0]
+
+def get_sunnah_fasts(day: date) -> list:
+    return list(_lookup(day)[1])
+
+def get_todays_sunnah_fasts():
+    """Puasa sunnah hari ini menurut tanggal WIB. Hasil disimpan dan otomatis berganti saat lewat tengah malam WIB."""
+    if time.time() >= _today["expires_at"]:
+        today = today_wib()
+        next_midnight = WIB.localize(datetime.combine(today + timedelta(days=1), datetime.min.time()))
+        _today.update(date=today, fasts=_lookup(today)[1], expires_at=next_midnight.timestamp())
+    return list(_today["fasts"])
+
+def get_sunnah_fasts_in_range(start: date, end: date) -> dict:
+    """Puasa sunnah yang mungkin dikerjakan dalam rentang (inklusif): nama puasa -> daftar tanggal."""
+    possible_fasts = {}
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        for fast in _lookup(day)[1]:
+            possible_fasts.setdefault(fast, []).append(day)
+    return possible_fasts
@@ -0,0 +1,66 @@
+# File: checklist_cache.py
+import os
+import logging
+from cachetools import LRUCache
+import db_handler as db
+import db_async
+
+logger = logging.getLogger(__name__)
+
+# Jumlah maksimal log (user, tanggal) yang disimpan di memori dan jeda antar flush ke database (detik)
+MAX_ENTRIES = int(os.getenv("CHECKLIST_CACHE_SIZE", "10000"))
+FLUSH_INTERVAL = float(os.getenv("CHECKLIST_FLUSH_INTERVAL", "5"))
+
+# (user_id, tanggal) -> {"mask": done_mask}. Entri yang tergusur LRU cukup dibaca ulang dari database...
+_cache = LRUCache(maxsize=MAX_ENTRIES)
+# ...kecuali yang belum di-flush: tetap dipegang di sini sampai ditulis (ukurannya dibatasi oleh jeda flush)
+_dirty = {}
+
+def _to_log(user_id: int, log_date: str, mask: int) -> dict:
+    return db.expand_log({"user_id": user_id, "date": log_date, "done_mask": mask})
+
+async def _get_entry(user_id: int, log_date: str) -> dict:
+    key = (user_id, log_date)
+    entry = _cache.get(key) or _dirty.get(key)
+    if entry is None:
+        log = await db_async.get_or_create_daily_log(user_id, log_date)
+        # Pemanggil lain bisa saja sudah memuat/mengubah entri ini selama menunggu database
+        entry = _cache.get(key) or _dirty.get(key) or {"mask": log["done_mask"]}
+    _cache[key] = entry
+    return entry
+
+async def get_log(user_id: int, log_date: str) -> dict:
+    """Log checklist (bentuk sama dengan db.get_or_create_daily_log) dari memori; database hanya dibaca saat cache miss."""
+    entry = await _get_entry(user_id, log_date)
+    return _to_log(user_id, log_date, entry["mask"])
+
+async def set_item(user_id: int, log_date: str, item_name: str, new_status: str):
+    """Mengubah status satu item di memori (ditulis saat flush berikutnya). None jika item tidak dikenal."""
+    if item_name not in db.CHECKLIST_BITS: return None
+    entry = await _get_entry(user_id, log_date)
+    bit = db.CHECKLIST_BITS[item_name]
+    new_mask = entry["mask"] | bit if new_status == db.STATUS_DONE else entry["mask"] & ~bit
+    if new_mask != entry["mask"]:
+        entry["mask"] = new_mask; _dirty[(user_id, log_date)] = entry
+    return _to_log(user_id, log_date, new_mask)
+
+async def flush(user_id: int = None) -> int:
+    """Menulis semua perubahan yang tertunda (atau hanya milik satu pengguna) dalam satu transaksi."""
+    pending = {key: entry for key, entry in _dirty.items() if user_id is None or key[0] == user_id}
+    if not pending: return 0
+    for key in pending: del _dirty[key]
+    try:
+        await db_async.save_daily_log_masks([(key[0], key[1], entry["mask"]) for key, entry in pending.items()])
+    except Exception as e:
+        # Dicoba lagi pada flush berikutnya; entri yang sama berarti perubahan terbaru ikut tertulis
+        logger.error(f"Gagal flush {len(pending)} checklist: {e}")
+        for key, entry in pending.items(): _dirty.setdefault(key, entry)
+        return 0
+    return len(pending)
+
+async def flush_job(context):
+    """Job berkala dari JobQueue."""
+    await flush()
+
+def get_stats() -> dict:
+    return {"entries": len(_cache), "dirty": len(_dirty)}
@@ -0,0 +1,81 @@
+# File: db_async.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import db_handler as db
+
+# Semua akses SQLite dijalankan di satu thread khusus agar event loop tidak pernah menunggu disk/lock.
+# Satu thread = satu koneksi thread-local db_handler yang dipakai ulang, dan penulisan tidak saling berebut lock.
+_executor = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+    return _executor
+
+async def run(func, *args):
+    """Menjalankan fungsi db_handler apa pun di thread DB dan menunggu hasilnya."""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+def _run_calls(calls):
+    with db.transaction():
+        return [func(*args) for func, *args in calls]
+
+async def run_batch(*calls):
+    """
+    Menjalankan beberapa fungsi db_handler dalam SATU transaksi dan satu kali lompatan ke thread DB.
+    Setiap call berbentuk (fungsi, argumen...). Hasil: list nilai kembalian sesuai urutan.
+    """
+    return await run(_run_calls, calls)
+
+def _wrap(func):
+    async def wrapper(*args):
+        return await run(func, *args)
+    wrapper.__name__, wrapper.__qualname__, wrapper.__doc__ = func.__name__, func.__name__, func.__doc__
+    return wrapper
+
+# Versi async dari fungsi-fungsi db_handler (argumen dan nilai kembalian sama persis)
+set_user_notification = _wrap(db.set_user_notification)
+find_user_by_id = _wrap(db.find_user_by_id)
+add_new_user_for_verification = _wrap(db.add_new_user_for_verification)
+update_user_status = _wrap(db.update_user_status)
+update_user_terms_agreement = _wrap(db.update_user_terms_agreement)
+update_user_location = _wrap(db.update_user_location)
+get_or_create_daily_log = _wrap(db.get_or_create_daily_log)
+update_daily_log_item = _wrap(db.update_daily_log_item)
+save_daily_log_masks = _wrap(db.save_daily_log_masks)
+get_distinct_user_locations = _wrap(db.get_distinct_user_locations)
+get_subscribed_user_ids = _wrap(db.get_subscribed_user_ids)
+get_notification_subscriptions = _wrap(db.get_notification_subscriptions)
+get_prayer_notification_cities = _wrap(db.get_prayer_notification_cities)
+get_prayer_subscribers = _wrap(db.get_prayer_subscribers)
+get_daily_logs_for_users = _wrap(db.get_daily_logs_for_users)
+get_user_logs_for_period = _wrap(db.get_user_logs_for_period)
+get_log_masks_for_period = _wrap(db.get_log_masks_for_period)
+get_item_counts_for_period = _wrap(db.get_item_counts_for_period)
+rebuild_log_counters = _wrap(db.rebuild_log_counters)
+add_feedback = _wrap(db.add_feedback)
+get_discussion_history = _wrap(db.get_discussion_history)
+add_discussion_message = _wrap(db.add_discussion_message)
+clear_discussion_history = _wrap(db.clear_discussion_history)
+get_discussion_summary = _wrap(db.get_discussion_summary)
+get_discussion_backlog = _wrap(db.get_discussion_backlog)
+save_discussion_summary = _wrap(db.save_discussion_summary)
+add_ai_usage = _wrap(db.add_ai_usage)
+get_ai_usage_summary = _wrap(db.get_ai_usage_summary)
+get_cached_city_id = _wrap(db.get_cached_city_id)
+save_cached_city_id = _wrap(db.save_cached_city_id)
+get_prayer_schedule = _wrap(db.get_prayer_schedule)
+get_latest_prayer_schedule = _wrap(db.get_latest_prayer_schedule)
+count_prayer_schedule_days = _wrap(db.count_prayer_schedule_days)
+save_prayer_schedules = _wrap(db.save_prayer_schedules)
+get_motivation_cache = _wrap(db.get_motivation_cache)
+save_motivation_cache = _wrap(db.save_motivation_cache)
+delete_expired_motivation_cache = _wrap(db.delete_expired_motivation_cache)
+
+async def close():
+    """Menutup koneksi milik thread DB lalu menghentikan thread-nya. Dipanggil saat aplikasi dimatikan."""
+    global _executor
+    if _executor is None: return
+    await run(db.close_connection)
+    _executor.shutdown(wait=True); _executor = None
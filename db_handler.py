@@ -1,25 +1,80 @@
 # File: db_handler.py
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
 DB_NAME = "ibadah_bot.db"
+BUSY_TIMEOUT_MS = 5000
+# Pragma per koneksi: WAL agar pembaca tidak memblokir penulis, fsync lebih jarang (aman dengan WAL)
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 67108864",
+]
 CHECKLIST_ITEMS = ["Subuh", "Dzuhur", "Ashar", "Maghrib", "Isya", "Tahajud", "Dhuha", "Rawatib", "Tilawah", "Dzikir", "Sedekah", "Puasa Senin", "Puasa Kamis", "Puasa Ayyamul Bidh", "Puasa Arafah", "Puasa Tasu'a/Asyura"]
 WAJIB_ITEMS = ["Subuh", "Dzuhur", "Ashar", "Maghrib", "Isya"]
 SUNNAH_ITEMS = ["Tahajud", "Dhuha", "Rawatib"]
 LAINNYA_ITEMS = ["Tilawah", "Dzikir", "Sedekah"]
+# Status checklist disimpan sebagai satu bitmask per (user, tanggal): bit ke-i = CHECKLIST_ITEMS[i].
+# Urutan bit harus stabil, jadi item baru HANYA boleh ditambahkan di akhir CHECKLIST_ITEMS.
+CHECKLIST_BITS = {item: 1 << index for index, item in enumerate(CHECKLIST_ITEMS)}
+STATUS_DONE, STATUS_NOT_DONE = "Sudah", "Belum"
+# Kolom prefix sum per item di tabel log_counters: n<i> = jumlah hari item ke-i dikerjakan s.d. tanggal baris tsb
+COUNTER_COLUMNS = [f"n{index}" for index in range(len(CHECKLIST_ITEMS))]
+# Tambahkan tipe notifikasi baru ke daftar aman
+NOTIFICATION_TYPES = ['notif_sholat', 'notif_rangkuman', 'notif_dzikir', 'notif_dhuha', 'notif_jumat', 'notif_motivasi']
+# Syarat pengguna aktif yang boleh menerima notifikasi
+ACTIVE_USER_CONDITION = "status = 'Approved' AND agreed_terms = 1"
+
+_local = threading.local()
+
+def get_connection() -> sqlite3.Connection:
+    """Koneksi SQLite milik thread ini, dibuat sekali lalu dipakai ulang (mode autocommit)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.db_name != DB_NAME:
+        conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        for pragma in CONNECTION_PRAGMAS: conn.execute(pragma)
+        _local.conn, _local.db_name, _local.depth = conn, DB_NAME, 0
+    return conn
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None: conn.close(); _local.conn = None
+
+@contextmanager
+def transaction():
+    """Menjalankan beberapa statement dalam satu transaksi (BEGIN IMMEDIATE ... COMMIT/ROLLBACK). Boleh bersarang."""
+    conn = get_connection()
+    if _local.depth == 0: conn.execute("BEGIN IMMEDIATE")
+    _local.depth += 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0: conn.execute("ROLLBACK")
+        raise
+    _local.depth -= 1
+    if _local.depth == 0: conn.execute("COMMIT")
+
+def _cursor(dict_rows: bool = False) -> sqlite3.Cursor:
+    cursor = get_connection().cursor()
+    if dict_rows: cursor.row_factory = dict_factory
+    return cursor
 
 def set_user_notification(user_id: int, notif_type: str, status: int):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    # Tambahkan tipe notifikasi baru ke daftar aman
-    if notif_type in ['notif_sholat', 'notif_rangkuman', 'notif_dzikir', 'notif_dhuha', 'notif_jumat', 'notif_motivasi']:
-        query = f"UPDATE users SET {notif_type} = ? WHERE user_id = ?"
-        cursor.execute(query, (status, user_id))
-        conn.commit()
-    conn.close()
+    if notif_type in NOTIFICATION_TYPES:
+        _cursor().execute(f"UPDATE users SET {notif_type} = ? WHERE user_id = ?", (status, user_id))
     
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with transaction() as cursor:
+        _create_tables(cursor)
+    print("Database SQLite berhasil diinisialisasi dengan notifikasi default.")
+
+def _create_tables(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS users (
         user_id INTEGER PRIMARY KEY, full_name TEXT, username TEXT, status TEXT DEFAULT 'Pending',
@@ -32,81 +87,319 @@ def init_db():
         notif_motivasi INTEGER DEFAULT 1
     )""")
     
-    checklist_columns = ", ".join([f'"{item}" TEXT DEFAULT "Belum"' for item in CHECKLIST_ITEMS])
-    cursor.execute(f"CREATE TABLE IF NOT EXISTS daily_logs (log_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, {checklist_columns}, UNIQUE(user_id, date))")
+    _migrate_daily_logs_to_mask(cursor)
+    cursor.execute("CREATE TABLE IF NOT EXISTS daily_logs (log_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, done_mask INTEGER NOT NULL DEFAULT 0, UNIQUE(user_id, date))")
+    # Prefix sum per pengguna: satu baris per log harian, total kumulatif s.d. tanggal itu (laporan periode = 2 baris)
+    _create_log_counters(cursor)
     cursor.execute("""CREATE TABLE IF NOT EXISTS feedback (feedback_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, timestamp TEXT, feedback_text TEXT)""")
     cursor.execute("""CREATE TABLE IF NOT EXISTS discussions (message_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, role TEXT, content TEXT, timestamp TEXT)""")
-    conn.commit()
-    conn.close()
-    print("Database SQLite berhasil diinisialisasi dengan notifikasi default.")
+    # Indeks seek + urutan (bukan covering): riwayat per pengguna dibaca dari yang terbaru tanpa scan tabel dan tanpa sort;
+    # role/content tetap diambil dari tabel, tapi hanya untuk baris dalam LIMIT
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_discussions_user_time ON discussions (user_id, timestamp, message_id)")
+    # Ringkasan berjalan untuk pesan lama; pesan s.d. summarized_until sudah terwakili oleh ringkasan
+    cursor.execute("""CREATE TABLE IF NOT EXISTS discussion_summaries (user_id INTEGER PRIMARY KEY, summary TEXT, summarized_until INTEGER, updated_at TEXT)""")
+    # Notifikasi sholat dikelompokkan per kota, dicari dengan lower(trim(location))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_location_key ON users (lower(trim(location)))")
+    # city_id NULL berarti kota tidak ditemukan (cache negatif)
+    cursor.execute("""CREATE TABLE IF NOT EXISTS city_cache (city_key TEXT PRIMARY KEY, city_id TEXT, updated_at TEXT)""")
+    cursor.execute("""CREATE TABLE IF NOT EXISTS prayer_schedules (
+        city_id TEXT, date TEXT, lokasi TEXT, daerah TEXT, tanggal TEXT,
+        imsak TEXT, subuh TEXT, terbit TEXT, dhuha TEXT, dzuhur TEXT, ashar TEXT, maghrib TEXT, isya TEXT,
+        PRIMARY KEY (city_id, date)
+    )""")
+    # Pemakaian token per panggilan AI (termasuk cache prompt) untuk memantau biaya
+    cursor.execute("""CREATE TABLE IF NOT EXISTS ai_usage (usage_id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, purpose TEXT, model TEXT,
+        input_tokens INTEGER, output_tokens INTEGER, cache_creation_input_tokens INTEGER, cache_read_input_tokens INTEGER)""")
+    # Cache motivasi AI per ringkasan log (dalil & variants disimpan sebagai JSON)
+    cursor.execute("""CREATE TABLE IF NOT EXISTS motivation_cache (summary_key TEXT PRIMARY KEY, theme TEXT, dalil TEXT, variants TEXT, created_at REAL)""")
+
+def _migrate_daily_logs_to_mask(cursor):
+    """Mengubah daily_logs lama (satu kolom TEXT 'Sudah'/'Belum' per item) menjadi kolom done_mask. Aman dipanggil berulang."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(daily_logs)").fetchall()]
+    if not columns or "done_mask" in columns: return
+    mask_expr = " | ".join(f"(CASE WHEN \"{item}\" = '{STATUS_DONE}' THEN {bit} ELSE 0 END)" for item, bit in CHECKLIST_BITS.items() if item in columns) or "0"
+    cursor.execute("ALTER TABLE daily_logs RENAME TO daily_logs_text")
+    cursor.execute("CREATE TABLE daily_logs (log_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, date TEXT, done_mask INTEGER NOT NULL DEFAULT 0, UNIQUE(user_id, date))")
+    cursor.execute(f"INSERT INTO daily_logs (log_id, user_id, date, done_mask) SELECT log_id, user_id, date, {mask_expr} FROM daily_logs_text")
+    cursor.execute("DROP TABLE daily_logs_text")
+    print(f"Migrasi daily_logs ke bitmask selesai ({cursor.execute('SELECT COUNT(*) FROM daily_logs').fetchone()[0]} baris).")
+
+def _create_log_counters(cursor):
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(log_counters)").fetchall()]
+    if columns and columns[3:] != COUNTER_COLUMNS:
+        cursor.execute("DROP TABLE log_counters")  # Item checklist bertambah: bangun ulang dengan kolom baru
+    counter_columns = ", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in COUNTER_COLUMNS)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS log_counters (user_id INTEGER, date TEXT, days INTEGER NOT NULL DEFAULT 0, {counter_columns}, PRIMARY KEY (user_id, date)) WITHOUT ROWID")
+    log_count = cursor.execute("SELECT COUNT(*) FROM daily_logs").fetchone()[0]
+    if cursor.execute("SELECT COUNT(*) FROM log_counters").fetchone()[0] != log_count:
+        _rebuild_log_counters(cursor)
+
+def _rebuild_log_counters(cursor, user_id: int = None):
+    """Menghitung ulang seluruh prefix sum dari daily_logs dengan window function (satu pengguna atau semua)."""
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    sums = ", ".join(f"SUM((done_mask >> {index}) & 1) OVER w" for index in range(len(CHECKLIST_ITEMS)))
+    cursor.execute(f"DELETE FROM log_counters {where}", params)
+    cursor.execute(f"""INSERT INTO log_counters (user_id, date, days, {', '.join(COUNTER_COLUMNS)})
+        SELECT user_id, date, COUNT(*) OVER w, {sums} FROM daily_logs {where}
+        WINDOW w AS (PARTITION BY user_id ORDER BY date ROWS UNBOUNDED PRECEDING)""", params)
+
+def rebuild_log_counters(user_id: int = None):
+    """Jalur perbaikan: membangun ulang log_counters dari daily_logs (semua pengguna jika user_id None)."""
+    with transaction() as cursor:
+        _rebuild_log_counters(cursor, user_id)
+
+def _mask_deltas(old_mask: int, new_mask: int):
+    """Selisih per item (-1, 0, +1) saat done_mask berubah dari old_mask ke new_mask."""
+    return [bool(new_mask & bit) - bool(old_mask & bit) for bit in CHECKLIST_BITS.values()]
+
+def _shift_log_counters(cursor, user_id: int, from_date: str, days_delta: int, item_deltas: list, inclusive: bool = True):
+    """Menambahkan selisih ke semua baris prefix sum pengguna mulai from_date (biasanya hanya baris hari ini)."""
+    changes = [(column, delta) for column, delta in zip(COUNTER_COLUMNS, item_deltas) if delta]
+    if days_delta: changes.insert(0, ("days", days_delta))
+    if not changes: return
+    assignments = ", ".join(f"{column} = {column} + ?" for column, _ in changes)
+    cursor.execute(f"UPDATE log_counters SET {assignments} WHERE user_id = ? AND date {'>=' if inclusive else '>'} ?",
+                   (*[delta for _, delta in changes], user_id, from_date))
+
+def _add_log_counter_row(cursor, user_id: int, date: str, mask: int):
+    """Menyisipkan baris prefix sum untuk log baru = baris sebelumnya + isi log ini, lalu menggeser baris setelahnya."""
+    cursor.execute(f"SELECT days, {', '.join(COUNTER_COLUMNS)} FROM log_counters WHERE user_id = ? AND date < ? ORDER BY date DESC LIMIT 1", (user_id, date))
+    previous = cursor.fetchone() or (0,) * (len(COUNTER_COLUMNS) + 1)
+    deltas = _mask_deltas(0, mask)
+    values = [previous[0] + 1] + [total + delta for total, delta in zip(previous[1:], deltas)]
+    cursor.execute(f"INSERT INTO log_counters (user_id, date, days, {', '.join(COUNTER_COLUMNS)}) VALUES ({', '.join('?' * (len(values) + 2))})", (user_id, date, *values))
+    _shift_log_counters(cursor, user_id, date, 1, deltas, inclusive=False)
+
+def _get_log_counter_row(cursor, user_id: int, date: str, inclusive: bool = True):
+    cursor.execute(f"SELECT days, {', '.join(COUNTER_COLUMNS)} FROM log_counters WHERE user_id = ? AND date {'<=' if inclusive else '<'} ? ORDER BY date DESC LIMIT 1", (user_id, date))
+    return cursor.fetchone() or (0,) * (len(COUNTER_COLUMNS) + 1)
+
+def expand_log(log: dict):
+    """Menambahkan status 'Sudah'/'Belum' per item dari done_mask, sehingga bentuk log sama dengan skema lama."""
+    if log is None: return None
+    mask = log['done_mask']
+    log.update({item: STATUS_DONE if mask & bit else STATUS_NOT_DONE for item, bit in CHECKLIST_BITS.items()})
+    return log
 
 def dict_factory(cursor, row):
     fields = [column[0] for column in cursor.description]
     return {key: value for key, value in zip(fields, row)}
 
 def find_user_by_id(user_id: int):
-    conn = sqlite3.connect(DB_NAME); conn.row_factory = dict_factory; cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)); user = cursor.fetchone(); conn.close(); return user
+    cursor = _cursor(dict_rows=True)
+    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)); return cursor.fetchone()
 
 def add_new_user_for_verification(user_id: int, username: str, full_name: str):
-    user = find_user_by_id(user_id); conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    if user:
-        cursor.execute("UPDATE users SET status = 'Pending', agreed_terms = 0, full_name = ?, username = ? WHERE user_id = ?", (full_name, username, user_id))
-        result = "already_exists"
-    else:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO users (user_id, full_name, username, registration_date) VALUES (?, ?, ?, ?)", (user_id, full_name, username, timestamp))
-        result = "success"
-    conn.commit(); conn.close(); return result
+    with transaction() as cursor:
+        user = find_user_by_id(user_id)
+        if user:
+            cursor.execute("UPDATE users SET status = 'Pending', agreed_terms = 0, full_name = ?, username = ? WHERE user_id = ?", (full_name, username, user_id))
+            result = "already_exists"
+        else:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            cursor.execute("INSERT INTO users (user_id, full_name, username, registration_date) VALUES (?, ?, ?, ?)", (user_id, full_name, username, timestamp))
+            result = "success"
+    return result
 
 def update_user_status(user_id: int, new_status: str):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute("UPDATE users SET status = ? WHERE user_id = ?", (new_status, user_id)); conn.commit(); conn.close(); return True
+    _cursor().execute("UPDATE users SET status = ? WHERE user_id = ?", (new_status, user_id)); return True
 
 def update_user_terms_agreement(user_id: int):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute("UPDATE users SET agreed_terms = 1 WHERE user_id = ?", (user_id,)); conn.commit(); conn.close(); return True
+    _cursor().execute("UPDATE users SET agreed_terms = 1 WHERE user_id = ?", (user_id,)); return True
 
 def update_user_location(user_id: int, new_location: str):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute("UPDATE users SET location = ? WHERE user_id = ?", (new_location, user_id)); conn.commit(); conn.close(); return True
+    _cursor().execute("UPDATE users SET location = ? WHERE user_id = ?", (new_location, user_id)); return True
 
 def get_or_create_daily_log(user_id: int, today_date: str):
-    conn = sqlite3.connect(DB_NAME); conn.row_factory = dict_factory; cursor = conn.cursor()
+    cursor = _cursor(dict_rows=True)
     cursor.execute("SELECT * FROM daily_logs WHERE user_id = ? AND date = ?", (user_id, today_date)); log = cursor.fetchone()
     if not log:
-        cursor.execute("INSERT INTO daily_logs (user_id, date) VALUES (?, ?)", (user_id, today_date)); conn.commit()
+        with transaction() as write_cursor:
+            write_cursor.execute("INSERT OR IGNORE INTO daily_logs (user_id, date) VALUES (?, ?)", (user_id, today_date))
+            if write_cursor.rowcount: _add_log_counter_row(write_cursor, user_id, today_date, 0)
         cursor.execute("SELECT * FROM daily_logs WHERE user_id = ? AND date = ?", (user_id, today_date)); log = cursor.fetchone()
-    conn.close(); return log
+    return expand_log(log)
 
 def update_daily_log_item(user_id: int, today_date: str, item_name: str, new_status: str):
     if item_name not in CHECKLIST_ITEMS: return False
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute(f'UPDATE daily_logs SET "{item_name}" = ? WHERE user_id = ? AND date = ?', (new_status, user_id, today_date))
-    conn.commit(); conn.close(); return True
+    bit = CHECKLIST_BITS[item_name]
+    with transaction() as cursor:
+        _write_daily_log_mask(cursor, user_id, today_date, lambda mask: mask | bit if new_status == STATUS_DONE else mask & ~bit)
+    return True
+
+def save_daily_log_masks(entries: list):
+    """Menulis banyak done_mask sekaligus dalam satu transaksi. entries: list (user_id, tanggal, done_mask)."""
+    with transaction() as cursor:
+        for user_id, log_date, mask in entries:
+            _write_daily_log_mask(cursor, user_id, log_date, lambda _: mask)
+    return True
+
+def _write_daily_log_mask(cursor, user_id: int, log_date: str, mask_fn):
+    """Mengganti done_mask satu log (mask_fn: mask lama -> mask baru) sambil menjaga log_counters tetap sinkron."""
+    cursor.execute("SELECT done_mask FROM daily_logs WHERE user_id = ? AND date = ?", (user_id, log_date)); row = cursor.fetchone()
+    old_mask = row[0] if row else 0
+    new_mask = mask_fn(old_mask)
+    # Log yang belum ada langsung dibuat; prefix sum hanya disentuh bila ada bit yang benar-benar berubah
+    if not row:
+        cursor.execute("INSERT INTO daily_logs (user_id, date, done_mask) VALUES (?, ?, ?)", (user_id, log_date, new_mask))
+        _add_log_counter_row(cursor, user_id, log_date, new_mask)
+    elif new_mask != old_mask:
+        cursor.execute("UPDATE daily_logs SET done_mask = ? WHERE user_id = ? AND date = ?", (new_mask, user_id, log_date))
+        _shift_log_counters(cursor, user_id, log_date, 0, _mask_deltas(old_mask, new_mask))
+
+def get_distinct_user_locations():
+    cursor = _cursor()
+    cursor.execute("SELECT DISTINCT location FROM users WHERE status = 'Approved' AND location IS NOT NULL AND location != '-'")
+    return [row[0] for row in cursor.fetchall()]
+
+def get_subscribed_user_ids(notif_type: str):
+    """Mengambil ID semua pengguna aktif yang menghidupkan tipe notifikasi tertentu."""
+    if notif_type not in NOTIFICATION_TYPES: return []
+    cursor = _cursor()
+    cursor.execute(f"SELECT user_id FROM users WHERE {ACTIVE_USER_CONDITION} AND {notif_type} = 1")
+    return [row[0] for row in cursor.fetchall()]
+
+def get_notification_subscriptions():
+    """Satu query untuk semua pengguna aktif beserta lokasi dan status notif_* mereka (untuk membangun ulang job saat startup)."""
+    cursor = _cursor(dict_rows=True)
+    cursor.execute(f"SELECT user_id, location, {', '.join(NOTIFICATION_TYPES)} FROM users WHERE {ACTIVE_USER_CONDITION}")
+    return cursor.fetchall()
+
+def get_prayer_notification_cities():
+    """Mengambil kunci kota (lower(trim(location))) unik dari pengguna yang menghidupkan notifikasi sholat."""
+    cursor = _cursor()
+    cursor.execute(f"SELECT DISTINCT lower(trim(location)) FROM users WHERE {ACTIVE_USER_CONDITION} AND notif_sholat = 1 AND location IS NOT NULL AND trim(location) NOT IN ('', '-')")
+    return [row[0] for row in cursor.fetchall()]
+
+def get_prayer_subscribers(city_key: str):
+    cursor = _cursor()
+    cursor.execute(f"SELECT user_id FROM users WHERE lower(trim(location)) = ? AND {ACTIVE_USER_CONDITION} AND notif_sholat = 1", (city_key,))
+    return [row[0] for row in cursor.fetchall()]
+
+def get_daily_logs_for_users(user_ids: list, date: str):
+    """Mengambil log harian banyak pengguna sekaligus. Hasil: dict user_id -> log (hanya yang sudah ada)."""
+    logs = {}; cursor = _cursor(dict_rows=True)
+    for i in range(0, len(user_ids), 500):
+        chunk = user_ids[i:i + 500]
+        cursor.execute(f"SELECT * FROM daily_logs WHERE date = ? AND user_id IN ({', '.join('?' * len(chunk))})", (date, *chunk))
+        logs.update({log['user_id']: expand_log(log) for log in cursor.fetchall()})
+    return logs
 
 def get_user_logs_for_period(user_id: int, start_date: str, end_date: str):
-    conn = sqlite3.connect(DB_NAME); conn.row_factory = dict_factory; cursor = conn.cursor()
+    cursor = _cursor(dict_rows=True)
     cursor.execute("SELECT * FROM daily_logs WHERE user_id = ? AND date BETWEEN ? AND ?", (user_id, start_date, end_date))
-    logs = cursor.fetchall(); conn.close(); return logs
+    return [expand_log(log) for log in cursor.fetchall()]
+
+def get_log_masks_for_period(user_id: int, start_date: str, end_date: str):
+    """Pasangan (tanggal, done_mask) dalam rentang tanggal, urut tanggal (bahan log_aggregator)."""
+    cursor = _cursor()
+    cursor.execute("SELECT date, done_mask FROM daily_logs WHERE user_id = ? AND date BETWEEN ? AND ? ORDER BY date", (user_id, start_date, end_date))
+    return cursor.fetchall()
+
+def get_item_counts_for_period(user_id: int, start_date: str, end_date: str):
+    """(jumlah hari tercatat, dict item -> jumlah hari dikerjakan) dalam rentang tanggal, dari dua baris prefix sum."""
+    cursor = _cursor()
+    end_row, before_row = _get_log_counter_row(cursor, user_id, end_date), _get_log_counter_row(cursor, user_id, start_date, inclusive=False)
+    totals = [end - before for end, before in zip(end_row, before_row)]
+    return totals[0], dict(zip(CHECKLIST_ITEMS, totals[1:]))
 
 def add_feedback(user_id: int, username: str, text: str):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("INSERT INTO feedback (user_id, timestamp, feedback_text) VALUES (?, ?, ?)", (user_id, timestamp, text))
-    conn.commit(); conn.close(); return True
+    _cursor().execute("INSERT INTO feedback (user_id, timestamp, feedback_text) VALUES (?, ?, ?)", (user_id, timestamp, text)); return True
+
+_UNSUMMARIZED = "user_id = ? AND message_id > COALESCE((SELECT summarized_until FROM discussion_summaries WHERE user_id = ?), 0)"
 
-def get_discussion_history(user_id: int):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute("SELECT role, content FROM discussions WHERE user_id = ? ORDER BY timestamp ASC", (user_id,))
-    history = [{'role': row[0], 'content': row[1]} for row in cursor.fetchall()]; conn.close(); return history
+def get_discussion_history(user_id: int, limit: int = None):
+    """Pesan yang belum diringkas, urut kronologis. Dengan limit: hanya `limit` pesan terakhir."""
+    cursor = _cursor()
+    cursor.execute(f"SELECT role, content FROM discussions WHERE {_UNSUMMARIZED} ORDER BY timestamp DESC, message_id DESC LIMIT ?", (user_id, user_id, -1 if limit is None else limit))
+    return [{'role': row[0], 'content': row[1]} for row in reversed(cursor.fetchall())]
+
+def get_discussion_summary(user_id: int):
+    cursor = _cursor()
+    cursor.execute("SELECT summary FROM discussion_summaries WHERE user_id = ?", (user_id,)); row = cursor.fetchone()
+    return row[0] if row else None
+
+def get_discussion_backlog(user_id: int, keep: int):
+    """Pesan yang belum diringkas selain `keep` pesan terakhir (kandidat untuk diringkas), urut kronologis."""
+    cursor = _cursor()
+    cursor.execute(f"SELECT message_id, role, content FROM discussions WHERE {_UNSUMMARIZED} ORDER BY timestamp DESC, message_id DESC LIMIT -1 OFFSET ?", (user_id, user_id, keep))
+    return [{'message_id': row[0], 'role': row[1], 'content': row[2]} for row in reversed(cursor.fetchall())]
+
+def save_discussion_summary(user_id: int, summary: str, summarized_until: int) -> bool:
+    """
+    Menyimpan ringkasan baru dan membuang pesan yang sudah terwakili olehnya. Jika pesan terakhir yang diringkas sudah tidak ada
+    (riwayat dihapus selama ringkasan dibuat), tidak ada yang disimpan dan hasilnya False. message_id AUTOINCREMENT tidak dipakai ulang.
+    """
+    updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as cursor:
+        cursor.execute("SELECT 1 FROM discussions WHERE user_id = ? AND message_id = ?", (user_id, summarized_until))
+        if cursor.fetchone() is None: return False
+        cursor.execute("""INSERT INTO discussion_summaries (user_id, summary, summarized_until, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET summary = excluded.summary, summarized_until = excluded.summarized_until, updated_at = excluded.updated_at""", (user_id, summary, summarized_until, updated_at))
+        cursor.execute("DELETE FROM discussions WHERE user_id = ? AND message_id <= ?", (user_id, summarized_until))
+    return True
 
 def add_discussion_message(user_id: int, role: str, content: str):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("INSERT INTO discussions (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)", (user_id, role, content, timestamp))
-    conn.commit(); conn.close()
+    _cursor().execute("INSERT INTO discussions (user_id, role, content, timestamp) VALUES (?, ?, ?, ?)", (user_id, role, content, timestamp))
 
 def clear_discussion_history(user_id: int):
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
-    cursor.execute("DELETE FROM discussions WHERE user_id = ?", (user_id,)); conn.commit(); conn.close()
\ No newline at end of file
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM discussions WHERE user_id = ?", (user_id,)); cursor.execute("DELETE FROM discussion_summaries WHERE user_id = ?", (user_id,))
+
+AI_USAGE_FIELDS = ["input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens"]
+
+def add_ai_usage(purpose: str, model: str, usage: dict):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _cursor().execute(f"INSERT INTO ai_usage (timestamp, purpose, model, {', '.join(AI_USAGE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (timestamp, purpose, model, *(usage.get(field) or 0 for field in AI_USAGE_FIELDS)))
+
+def get_ai_usage_summary(since: str = None):
+    """Total token per purpose (sejak timestamp 'YYYY-mm-dd HH:MM:SS' bila diberikan)."""
+    cursor = _cursor(dict_rows=True)
+    cursor.execute(f"SELECT purpose, COUNT(*) AS calls, {', '.join(f'SUM({field}) AS {field}' for field in AI_USAGE_FIELDS)} FROM ai_usage WHERE timestamp >= ? GROUP BY purpose ORDER BY purpose", (since or "",))
+    return cursor.fetchall()
+
+def get_cached_city_id(city_key: str):
+    cursor = _cursor(dict_rows=True)
+    cursor.execute("SELECT city_id, updated_at FROM city_cache WHERE city_key = ?", (city_key,)); return cursor.fetchone()
+
+def save_cached_city_id(city_key: str, city_id, updated_at: str):
+    _cursor().execute("INSERT OR REPLACE INTO city_cache (city_key, city_id, updated_at) VALUES (?, ?, ?)", (city_key, city_id, updated_at))
+
+PRAYER_SCHEDULE_FIELDS = ["lokasi", "daerah", "tanggal", "imsak", "subuh", "terbit", "dhuha", "dzuhur", "ashar", "maghrib", "isya"]
+
+def get_prayer_schedule(city_id: str, date: str):
+    cursor = _cursor(dict_rows=True)
+    cursor.execute("SELECT * FROM prayer_schedules WHERE city_id = ? AND date = ?", (str(city_id), date)); return cursor.fetchone()
+
+def get_latest_prayer_schedule(city_id: str, before_date: str, not_before: str = ""):
+    """Jadwal tersimpan terakhir sebelum before_date (dan tidak lebih lama dari not_before), atau None."""
+    cursor = _cursor(dict_rows=True)
+    cursor.execute("SELECT * FROM prayer_schedules WHERE city_id = ? AND date < ? AND date >= ? ORDER BY date DESC LIMIT 1", (str(city_id), before_date, not_before)); return cursor.fetchone()
+
+def count_prayer_schedule_days(city_id: str, month_prefix: str):
+    """Menghitung jumlah hari yang sudah tersimpan untuk bulan 'YYYY-MM'."""
+    cursor = _cursor()
+    cursor.execute("SELECT COUNT(*) FROM prayer_schedules WHERE city_id = ? AND date LIKE ?", (str(city_id), f"{month_prefix}-%"))
+    return cursor.fetchone()[0]
+
+def save_prayer_schedules(city_id: str, schedules: list):
+    """Menyimpan daftar jadwal harian (dict berisi 'date' dan PRAYER_SCHEDULE_FIELDS)."""
+    columns = ", ".join(["city_id", "date"] + PRAYER_SCHEDULE_FIELDS)
+    placeholders = ", ".join("?" * (len(PRAYER_SCHEDULE_FIELDS) + 2))
+    rows = [(str(city_id), s["date"], *[s.get(field) for field in PRAYER_SCHEDULE_FIELDS]) for s in schedules]
+    with transaction() as cursor:
+        cursor.executemany(f"INSERT OR REPLACE INTO prayer_schedules ({columns}) VALUES ({placeholders})", rows)
+
+def get_motivation_cache(summary_key: str):
+    cursor = _cursor(dict_rows=True)
+    cursor.execute("SELECT * FROM motivation_cache WHERE summary_key = ?", (summary_key,)); return cursor.fetchone()
+
+def save_motivation_cache(summary_key: str, theme: str, dalil: str, variants: str, created_at: float):
+    _cursor().execute("INSERT OR REPLACE INTO motivation_cache (summary_key, theme, dalil, variants, created_at) VALUES (?, ?, ?, ?, ?)", (summary_key, theme, dalil, variants, created_at))
+
+def delete_expired_motivation_cache(oldest_created_at: float):
+    _cursor().execute("DELETE FROM motivation_cache WHERE created_at < ?", (oldest_created_at,))
@@ -0,0 +1,83 @@
+# File: discussion_history.py
+import os
+import asyncio
+import logging
+import db_handler as db
+import db_async
+import ai_handler
+
+logger = logging.getLogger(__name__)
+
+# Jumlah giliran (tanya + jawab) terakhir yang dikirim apa adanya; yang lebih lama dipadatkan ke ringkasan berjalan
+RECENT_TURNS = int(os.getenv("DISCUSSION_RECENT_TURNS", "4"))
+# Batas perkiraan token untuk ringkasan + riwayat yang dikirim ke model per giliran
+TOKEN_BUDGET = int(os.getenv("DISCUSSION_HISTORY_TOKENS", "1500"))
+# Ringkasan baru dibuat setelah sekian pesan lama menumpuk, agar tidak ada panggilan AI di setiap giliran
+COMPACT_AFTER_MESSAGES = 4
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+RECENT_MESSAGES = RECENT_TURNS * 2
+_locks = {}
+_tasks = set()  # Referensi task latar belakang agar tidak dibersihkan GC sebelum selesai
+
+def estimate_tokens(text: str) -> int:
+    """Perkiraan kasar jumlah token (tanpa tokenizer); cukup untuk menjaga anggaran."""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+def _summary_messages(summary: str) -> list:
+    return [{'role': 'user', 'content': f"Ringkasan percakapan kita sebelumnya:\n{summary}"},
+            {'role': 'assistant', 'content': "Baik, saya akan memperhatikan ringkasan tersebut."}]
+
+def fit_budget(summary: str, history: list, budget: int = TOKEN_BUDGET) -> list:
+    """
+    Menyusun riwayat yang dikirim ke model: ringkasan (jika ada) lalu pesan terbaru,
+    membuang pesan tertua sampai perkiraan token muat dalam anggaran.
+    """
+    prefix = []
+    if summary:
+        summary = summary[:budget * CHARS_PER_TOKEN // 2]  # Ringkasan paling banyak separuh anggaran
+        prefix = _summary_messages(summary)
+    remaining = budget - sum(estimate_tokens(m['content']) for m in prefix)
+    kept = []
+    for message in reversed(history):
+        remaining -= estimate_tokens(message['content'])
+        if remaining < 0: break
+        kept.append(message)
+    kept.reverse()
+    # Riwayat harus dimulai dengan pesan pengguna dan bergantian peran
+    while kept and kept[0]['role'] != 'user': kept.pop(0)
+    return prefix + kept
+
+async def start_turn(user_id: int, user_question: str) -> list:
+    """Mengambil konteks percakapan dalam anggaran dan mencatat pertanyaan baru (satu transaksi)."""
+    summary, history, _ = await db_async.run_batch((db.get_discussion_summary, user_id), (db.get_discussion_history, user_id, RECENT_MESSAGES),
+                                                   (db.add_discussion_message, user_id, 'user', user_question))
+    return fit_budget(summary, history)
+
+async def finish_turn(user_id: int, answer: str):
+    """Mencatat jawaban, lalu memadatkan pesan lama di latar belakang bila sudah cukup banyak."""
+    await db_async.add_discussion_message(user_id, 'assistant', answer)
+    task = asyncio.get_running_loop().create_task(compact(user_id))
+    _tasks.add(task); task.add_done_callback(_tasks.discard)
+
+async def compact(user_id: int) -> bool:
+    """Melipat pesan di luar RECENT_TURNS ke ringkasan berjalan. Jika AI gagal, pesan tetap disimpan dan dicoba lagi nanti."""
+    lock = _locks.setdefault(user_id, asyncio.Lock())
+    if lock.locked(): return False
+    try:
+        async with lock:
+            backlog = await db_async.get_discussion_backlog(user_id, RECENT_MESSAGES)
+            if len(backlog) < COMPACT_AFTER_MESSAGES: return False
+            previous = await db_async.get_discussion_summary(user_id)
+            summary = await ai_handler.summarize_discussion(previous, backlog)
+            if not summary: return False
+            # Riwayat bisa dihapus pengguna selama ringkasan dibuat; save menolak bila pesan yang diringkas sudah tidak ada
+            saved = await db_async.save_discussion_summary(user_id, summary, backlog[-1]['message_id'])
+            if not saved: logger.info(f"Ringkasan diskusi {user_id} dibuang: riwayat dihapus selama ringkasan dibuat")
+            return saved
+    except Exception as e:
+        logger.error(f"Gagal meringkas diskusi {user_id}: {e}")
+        return False
+    finally:
+        if not lock.locked(): _locks.pop(user_id, None)
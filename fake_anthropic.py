@@ -0,0 +1,145 @@
+# File: fake_anthropic.py
+"""
+Server tiruan Anthropic Messages API (POST /v1/messages, biasa maupun stream SSE) untuk mencoba bot tanpa API asli.
+
+    python fake_anthropic.py --port 8766 --chunk-delay 0.3
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8766 ANTHROPIC_API_KEY=uji python main.py
+
+Dari Python/skrip uji: server, base_url = start(chunks=["Sabar ", "itu ..."], chunk_delay=0.1)
+configure(fail=[503]) membuat request berikutnya dijawab 503 sekali; get_stats() berisi jumlah request dan body-nya.
+Prompt caching ditiru seperti API: system yang ditandai cache_control baru di-cache bila prefixnya mencapai batas minimum model.
+"""
+import json
+import time
+import threading
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {"text": "Jawaban uji dari server tiruan.", "chunks": None, "chunk_delay": 0.05, "latency": 0.0, "fail": []}
+CHARS_PER_TOKEN = 4
+# Batas minimum prefix yang bisa di-cache (token), sama seperti API asli
+HAIKU_MIN_CACHEABLE_TOKENS = 2048
+MIN_CACHEABLE_TOKENS = 1024
+
+_config = dict(DEFAULT_CONFIG, fail=[])
+_stats = {"requests": 0, "streams": 0, "bodies": []}
+_cached_prefixes = set()
+_lock = threading.Lock()
+
+def configure(**options):
+    """text/chunks: isi jawaban (chunks = potongan stream); chunk_delay & latency dalam detik; fail: status HTTP untuk request-request berikutnya."""
+    with _lock:
+        _config.update(options)
+
+def reset():
+    with _lock:
+        _config.clear(); _config.update(DEFAULT_CONFIG, fail=[])
+        _stats.update(requests=0, streams=0, bodies=[])
+        _cached_prefixes.clear()
+
+def get_stats() -> dict:
+    with _lock:
+        return dict(_stats, bodies=list(_stats["bodies"]))
+
+def _count_tokens(value) -> int:
+    return len(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)) // CHARS_PER_TOKEN
+
+def usage_for(body: dict, output_tokens: int) -> dict:
+    """Perkiraan pemakaian token seperti field usage API asli, termasuk cache_creation/cache_read untuk system yang di-cache."""
+    message_tokens, system = _count_tokens(body.get("messages", [])), body.get("system") or ""
+    blocks = [{"text": system}] if isinstance(system, str) else system
+    prefix_tokens = sum(_count_tokens(block.get("text", "")) for block in blocks)
+    usage = {"input_tokens": message_tokens + prefix_tokens, "output_tokens": output_tokens,
+             "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+    minimum = HAIKU_MIN_CACHEABLE_TOKENS if "haiku" in (body.get("model") or "") else MIN_CACHEABLE_TOKENS
+    if not any("cache_control" in block for block in blocks) or prefix_tokens < minimum: return usage
+    key = (body.get("model"), json.dumps(blocks, sort_keys=True))
+    with _lock:
+        hit = key in _cached_prefixes; _cached_prefixes.add(key)
+    usage.update(input_tokens=message_tokens, **{"cache_read_input_tokens" if hit else "cache_creation_input_tokens": prefix_tokens})
+    return usage
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items(): self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_event(self, name: str, data: dict):
+        payload = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with _lock:
+            _stats["requests"] += 1; _stats["bodies"].append(body)
+            failure = _config["fail"].pop(0) if _config["fail"] else None
+            config = dict(_config)
+        time.sleep(config["latency"])
+        if failure:
+            error_type = "rate_limit_error" if failure == 429 else "overloaded_error" if failure == 529 else "api_error"
+            return self._send_json(failure, {"type": "error", "error": {"type": error_type, "message": "gangguan tiruan"}},
+                                   {"retry-after": "0.1"} if failure == 429 else None)
+        chunks = config["chunks"] or [config["text"]]
+        if body.get("stream"):
+            return self._stream(body, chunks, config["chunk_delay"])
+        text = "".join(chunks)
+        self._send_json(200, {"id": "msg_tiruan", "type": "message", "role": "assistant", "model": body.get("model"),
+                              "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                              "usage": usage_for(body, _count_tokens(text))})
+
+    def _stream(self, body: dict, chunks: list, chunk_delay: float):
+        with _lock:
+            _stats["streams"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            self._send_event("message_start", {"type": "message_start", "message": {
+                "id": "msg_tiruan", "type": "message", "role": "assistant", "model": body.get("model"), "content": [],
+                "stop_reason": None, "stop_sequence": None, "usage": usage_for(body, 1)}})
+            self._send_event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for chunk in chunks:
+                time.sleep(chunk_delay)
+                self._send_event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            self._send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self._send_event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                               "usage": {"output_tokens": _count_tokens("".join(chunks))}})
+            self._send_event("message_stop", {"type": "message_stop"})
+            self.wfile.write(b"0\r\n\r\n"); self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client berhenti membaca (mis. deadline habis)
+
+def start(port: int = 0, **options):
+    """Menjalankan server di thread latar belakang. Mengembalikan (server, base_url untuk ANTHROPIC_BASE_URL)."""
+    reset(); configure(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeAnthropicHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server tiruan Anthropic Messages API (biasa & stream).")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--text", default=DEFAULT_CONFIG["text"], help="jawaban; di-stream per kata")
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULT_CONFIG["chunk_delay"], help="jeda antar potongan stream (detik)")
+    parser.add_argument("--latency", type=float, default=0.0, help="jeda sebelum jawaban mulai (detik)")
+    args = parser.parse_args()
+    configure(chunks=[word + " " for word in args.text.split()], chunk_delay=args.chunk_delay, latency=args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeAnthropicHandler)
+    print(f"Fake Anthropic berjalan di http://127.0.0.1:{args.port} (Ctrl+C untuk berhenti)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
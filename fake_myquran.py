@@ -0,0 +1,125 @@
+# File: fake_myquran.py
+"""
+Server tiruan API MyQuran untuk mencoba bot tanpa jaringan, termasuk saat API lambat atau mati.
+
+    python fake_myquran.py --port 8765 --latency 0.5 --error-rate 0.3
+    MYQURAN_BASE_URL=http://127.0.0.1:8765/v2 python main.py
+
+Gangguan bisa diubah saat berjalan:
+    GET /_faults?latency=3&error_rate=1&status=503   (tanpa parameter: kembali normal)
+    GET /_stats                                      (jumlah request per jenis endpoint)
+Dari Python/skrip uji: server, base_url = start(latency=2.0); set_faults(error_rate=1.0)
+"""
+import json
+import time
+import random
+import calendar
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+# Kota di luar daftar koordinat prayer_calculator, agar jadwalnya benar-benar diambil lewat API
+CITIES = {"1204": "KAB. GARUT", "1206": "KAB. CIANJUR", "1211": "KAB. SUMEDANG", "1504": "KAB. SLEMAN", "1227": "KOTA TASIKMALAYA"}
+SURAH_NAMES = ["Al-Baqarah", "Ali 'Imran", "An-Nisa'", "Al-Ma'idah", "Yusuf", "Ar-Ra'd", "Al-Insyirah"]
+
+_faults = {"latency": 0.0, "error_rate": 0.0, "status": 503}
+_stats = Counter()
+_lock = threading.Lock()
+
+def set_faults(latency: float = 0.0, error_rate: float = 0.0, status: int = 503):
+    """latency: jeda per request (detik); error_rate: peluang 0..1 request dijawab dengan status error."""
+    with _lock:
+        _faults.update(latency=float(latency), error_rate=float(error_rate), status=int(status))
+
+def get_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+def _month_schedule(city_id: str, year: int, month: int) -> dict:
+    jadwal = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        shift = day % 3  # Waktu bergeser sedikit tiap hari seperti jadwal asli
+        jadwal.append({"tanggal": f"{day:02d}/{month:02d}/{year}", "date": f"{year:04d}-{month:02d}-{day:02d}",
+                       "imsak": f"04:{10 + shift:02d}", "subuh": f"04:{20 + shift:02d}", "terbit": f"05:{40 + shift:02d}",
+                       "dhuha": f"06:{8 + shift:02d}", "dzuhur": f"11:{55 + shift:02d}", "ashar": f"15:{15 + shift:02d}",
+                       "maghrib": f"17:{55 + shift:02d}", "isya": f"19:{5 + shift:02d}"})
+    return {"id": city_id, "lokasi": CITIES.get(city_id, "KOTA CONTOH"), "daerah": "INDONESIA", "jadwal": jadwal}
+
+def _route(path: str, query: dict):
+    """(kategori, body) untuk path API; body None berarti 404."""
+    parts = [unquote(part) for part in path.strip("/").split("/")]
+    if parts[:1] == ["v2"]: parts = parts[1:]
+    if parts[:3] == ["sholat", "kota", "cari"] and len(parts) == 4:
+        name = parts[3].lower()
+        found = [{"id": city_id, "lokasi": lokasi} for city_id, lokasi in CITIES.items() if name in lokasi.lower()]
+        return "kota", {"status": bool(found), "data": found}
+    if parts[:2] == ["sholat", "jadwal"] and len(parts) == 5:
+        return "jadwal", {"status": True, "data": _month_schedule(parts[2], int(parts[3]), int(parts[4]))}
+    if parts[:3] == ["quran", "ayat", "keyword"] and len(parts) >= 4:
+        keyword = parts[3].lower()
+        if keyword.startswith("kosong"): return "quran", {"status": False, "data": []}
+        ayat = [{"nomor": index + 1, "surat": {"nama": {"id": random.Random(keyword + str(index)).choice(SURAH_NAMES)}},
+                 "teks": {"arab": "إِنَّ مَعَ الْعُسْرِ يُسْرًا"}, "terjemah": {"teks": f"Ayat contoh ke-{index + 1} tentang {keyword}."}}
+                for index in range(10)]
+        return "quran", {"status": True, "data": ayat}
+    if parts[:1] == ["hadits"] and len(parts) == 3 and parts[2] == "cari":
+        keyword, limit = query.get("q", [""])[0].lower(), int(query.get("limit", ["5"])[0])
+        hadits = [] if keyword.startswith("kosong") else [{"nomor": index + 1, "terjemah": f"Hadis contoh {parts[1]} ke-{index + 1} tentang {keyword}."} for index in range(limit)]
+        return "hadits", {"status": True, "data": {"hadits": hadits}}
+    return "lainnya", None
+
+class FakeMyQuranHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/_faults":
+            set_faults(query.get("latency", ["0"])[0], query.get("error_rate", ["0"])[0], query.get("status", ["503"])[0])
+            return self._send(200, dict(_faults))
+        if url.path == "/_stats":
+            return self._send(200, get_stats())
+        category, body = _route(url.path, query)
+        with _lock:
+            _stats[category] += 1
+            latency, failing, status = _faults["latency"], random.random() < _faults["error_rate"], _faults["status"]
+        time.sleep(latency)
+        if failing:
+            return self._send(status, {"status": False, "message": "gangguan tiruan"})
+        self._send(200 if body is not None else 404, body or {"status": False, "message": "not found"})
+
+def start(port: int = 0, **faults):
+    """Menjalankan server di thread latar belakang. Mengembalikan (server, base_url untuk MYQURAN_BASE_URL)."""
+    set_faults(**faults)
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeMyQuranHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v2"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server tiruan API MyQuran dengan gangguan yang bisa diatur.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="jeda per request (detik)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="peluang 0..1 request gagal")
+    parser.add_argument("--status", type=int, default=503, help="status HTTP untuk request yang gagal")
+    args = parser.parse_args()
+    set_faults(args.latency, args.error_rate, args.status)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeMyQuranHandler)
+    print(f"Fake MyQuran berjalan di http://127.0.0.1:{args.port}/v2 (Ctrl+C untuk berhenti)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
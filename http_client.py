@@ -0,0 +1,110 @@
+# File: http_client.py
+import os
+import time
+import asyncio
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Batas waktu default untuk setiap panggilan keluar (detik)
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# Ukuran pool koneksi keep-alive yang dipakai bersama
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+# Jumlah maksimal request yang boleh berjalan bersamaan
+MAX_CONCURRENT_REQUESTS = 10
+# Circuit breaker per endpoint: setelah sekian kegagalan beruntun, request ke endpoint itu langsung ditolak
+# selama BREAKER_OPEN_SECONDS, lalu satu request percobaan (half-open) menentukan apakah endpoint sudah pulih
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("HTTP_BREAKER_OPEN_SECONDS", "30"))
+
+_client = None
+_semaphore = None
+_breakers = {}
+
+class CircuitOpenError(Exception):
+    """Endpoint sedang dianggap mati oleh circuit breaker; request tidak dikirim."""
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = None, open_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.open_seconds = open_seconds or BREAKER_OPEN_SECONDS
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None: return "closed"
+        return "open" if self.probing or time.monotonic() - self.opened_at < self.open_seconds else "half_open"
+
+    def before_request(self):
+        """Menolak request saat terbuka; setelah jeda, hanya satu request percobaan yang dilewatkan."""
+        if self.opened_at is None: return
+        if self.state == "open":
+            raise CircuitOpenError(f"Endpoint {self.name} sedang tidak tersedia (circuit breaker terbuka)")
+        self.probing = True
+
+    def record(self, failed):
+        """failed: True/False hasil request, None bila request dibatalkan (tidak dihitung)."""
+        if failed is None:
+            self.probing = False
+        elif not failed:
+            if self.opened_at is not None: logger.info(f"Endpoint {self.name} pulih, circuit breaker ditutup")
+            self.failures, self.opened_at, self.probing = 0, None, False
+        else:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None: logger.warning(f"Endpoint {self.name} gagal {self.failures}x beruntun, circuit breaker dibuka")
+                self.opened_at, self.probing = time.monotonic(), False
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+def get_breaker_states() -> dict:
+    return {name: breaker.state for name, breaker in _breakers.items()}
+
+def get_client() -> httpx.AsyncClient:
+    """Mengembalikan client HTTP async bersama (dibuat saat pertama kali dipakai)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=POOL_LIMITS, follow_redirects=True)
+    return _client
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return _semaphore
+
+async def get_json(url: str, params: dict = None, timeout: float = None, endpoint: str = None):
+    """
+    Melakukan GET dan mengembalikan body JSON. Error HTTP/jaringan diteruskan ke pemanggil.
+    endpoint menentukan circuit breaker yang dipakai (default: host); saat terbuka, CircuitOpenError langsung dilempar.
+    """
+    breaker = get_breaker(endpoint or httpx.URL(url).host)
+    breaker.before_request()
+    failed = None
+    try:
+        async with _get_semaphore():
+            response = await get_client().get(url, params=params, timeout=timeout if timeout is not None else DEFAULT_TIMEOUT)
+        # Error 4xx berarti server hidup; hanya 5xx/429 dan error jaringan yang dihitung gagal
+        failed = response.status_code >= 500 or response.status_code == 429
+        response.raise_for_status()
+        return response.json()
+    except httpx.TransportError:
+        failed = True
+        raise
+    finally:
+        breaker.record(failed)
+
+async def close():
+    """Menutup client bersama. Dipanggil saat aplikasi dimatikan."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
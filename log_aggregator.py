@@ -0,0 +1,139 @@
+# File: log_aggregator.py
+"""
+Agregasi log ibadah satu periode dalam satu kali jalan, dipakai bersama oleh report_handler dan ai_handler.
+
+Setiap done_mask dipecah sekali menjadi matriks hari x item; dari situ dihitung jumlah per item, jumlah sholat wajib
+per hari, runtun (streak) per item dan amalan terbaik/terlewat. Periode panjang dihitung dengan NumPy (tanpa loop per hari).
+
+Dua sumber data:
+- for_period: done_mask per hari. Dipakai laporan karena runtun dan wajib per hari tidak bisa diturunkan dari prefix sum;
+  laporan paling panjang 30 hari, jadi paling banyak 30 baris lewat indeks UNIQUE(user_id, date) dan jumlah per item
+  ikut terhitung di jalan yang sama tanpa query tambahan.
+- counts_for_period: dua baris prefix sum log_counters, O(1) berapa pun panjang periodenya. Dipakai pemanggil yang hanya
+  butuh jumlah (motivasi "Waktu Sholat", konteks diskusi). Kedua sumber selalu menghasilkan jumlah yang sama.
+"""
+import numpy as np
+from datetime import date
+import db_handler as db
+import db_async
+
+# Di bawah jumlah hari ini loop Python biasa lebih cepat daripada overhead membuat array NumPy
+VECTORIZE_MIN_DAYS = 16
+# Kolom tambahan di matriks runtun: hari dengan kelima sholat wajib tercatat
+FULL_WAJIB = "5 Waktu Lengkap"
+
+_ITEM_INDEX = {item: index for index, item in enumerate(db.CHECKLIST_ITEMS)}
+_WAJIB_INDEX = [_ITEM_INDEX[item] for item in db.WAJIB_ITEMS]
+_SHIFTS = np.arange(len(db.CHECKLIST_ITEMS), dtype=np.int64)
+_WAJIB_MASK = sum(db.CHECKLIST_BITS[item] for item in db.WAJIB_ITEMS)
+_STREAK_ITEMS = db.CHECKLIST_ITEMS + [FULL_WAJIB]
+_STREAK_BITS = [db.CHECKLIST_BITS[item] for item in db.CHECKLIST_ITEMS] + [0]  # 0: kolom FULL_WAJIB
+# Amalan harian yang dinilai terbaik/terlewat; puasa sunnah hanya jatuh di hari tertentu sehingga tidak dihitung terlewat
+_TRACKED_ITEMS = db.WAJIB_ITEMS + db.SUNNAH_ITEMS + db.LAINNYA_ITEMS
+
+class LogSummary:
+    """
+    Hasil agregasi satu periode. Kolom per hari (dates, wajib_per_day) dan runtun hanya terisi bila dibangun dari done_mask;
+    dari prefix sum (from_counts) hanya jumlah per item yang tersedia.
+    """
+    def __init__(self, total_days: int, item_counts: dict, dates: list = None, wajib_per_day: list = None,
+                 current_streaks: dict = None, longest_streaks: dict = None):
+        self.total_days = total_days
+        self.item_counts = item_counts
+        self.dates = dates or []
+        self.wajib_per_day = wajib_per_day or []
+        self.current_streaks = current_streaks or {}
+        self.longest_streaks = longest_streaks or {}
+        # Diurutkan sekali di sini: terbanyak dulu, seri mengikuti urutan checklist
+        self.best_items = sorted((item for item in _TRACKED_ITEMS if item_counts.get(item, 0) > 0), key=lambda item: -item_counts[item])
+        self.missed_items = [item for item in _TRACKED_ITEMS if item_counts.get(item, 0) == 0]
+
+    @property
+    def has_daily_data(self) -> bool:
+        return bool(self.dates)
+
+    @property
+    def wajib_done(self) -> int:
+        return sum(self.item_counts.get(item, 0) for item in db.WAJIB_ITEMS)
+
+    @property
+    def wajib_expected(self) -> int:
+        return self.total_days * len(db.WAJIB_ITEMS)
+
+    @property
+    def wajib_percent(self) -> float:
+        return self.wajib_done / self.wajib_expected * 100 if self.wajib_expected else 0
+
+    @property
+    def full_wajib_days(self) -> int:
+        return sum(1 for done in self.wajib_per_day if done == len(db.WAJIB_ITEMS))
+
+    @property
+    def best_item(self):
+        return self.best_items[0] if self.best_items else None
+
+    @property
+    def missed_wajib(self):
+        return next((item for item in self.missed_items if item in db.WAJIB_ITEMS), None)
+
+def _aggregate_loop(ordinals: list, masks: list):
+    """Jalur periode pendek: satu loop per hari, runtun dihitung berjalan."""
+    counts, wajib_per_day = [0] * len(db.CHECKLIST_ITEMS), []
+    current, longest = [0] * len(_STREAK_ITEMS), [0] * len(_STREAK_ITEMS)
+    previous = None
+    for ordinal, mask in zip(ordinals, masks):
+        wajib = (mask & _WAJIB_MASK).bit_count()
+        wajib_per_day.append(wajib)
+        if previous is None or ordinal - previous != 1: current = [0] * len(_STREAK_ITEMS)  # Tanggal bolong memutus semua runtun
+        previous = ordinal
+        for index, bit in enumerate(_STREAK_BITS):
+            if mask & bit if bit else wajib == len(db.WAJIB_ITEMS):
+                if index < len(counts): counts[index] += 1
+                current[index] += 1
+                if current[index] > longest[index]: longest[index] = current[index]
+            else:
+                current[index] = 0
+    return counts, wajib_per_day, current, longest
+
+def _aggregate_numpy(ordinals: list, masks: list):
+    """Jalur periode panjang: semua hari dan item sekaligus sebagai matriks boolean."""
+    masks = np.asarray(masks, dtype=np.int64)
+    done = ((masks[:, None] >> _SHIFTS) & 1).astype(bool)
+    wajib_per_day = done[:, _WAJIB_INDEX].sum(axis=1)
+    matrix = np.column_stack((done, wajib_per_day == len(db.WAJIB_ITEMS)))
+    # Runtun: panjang = posisi hari ini - posisi reset terakhir. Reset terjadi setelah hari kosong, atau di hari pertama setelah tanggal yang bolong
+    position = np.arange(len(masks))[:, None]
+    gap = np.ones(len(masks), dtype=bool); gap[1:] = np.diff(np.asarray(ordinals)) != 1
+    resets = np.where(matrix, np.where(gap[:, None], position, 0), position + 1)
+    runs = np.where(matrix, position + 1 - np.maximum.accumulate(resets, axis=0), 0)
+    return done.sum(axis=0).tolist(), wajib_per_day.tolist(), runs[-1].tolist(), runs.max(axis=0).tolist()
+
+def from_masks(rows: list) -> LogSummary:
+    """rows: (tanggal 'YYYY-MM-DD', done_mask) urut tanggal, seperti hasil db.get_log_masks_for_period."""
+    if not rows: return from_counts((0, dict.fromkeys(db.CHECKLIST_ITEMS, 0)))
+    dates, masks = [row[0] for row in rows], [row[1] for row in rows]
+    if len(rows) >= VECTORIZE_MIN_DAYS:
+        ordinals = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+        counts, wajib_per_day, current, longest = _aggregate_numpy(ordinals, masks)
+    else:
+        ordinals = [date.fromisoformat(date_text).toordinal() for date_text in dates]
+        counts, wajib_per_day, current, longest = _aggregate_loop(ordinals, masks)
+    return LogSummary(len(rows), dict(zip(db.CHECKLIST_ITEMS, counts)), dates, wajib_per_day,
+                      dict(zip(_STREAK_ITEMS, current)), dict(zip(_STREAK_ITEMS, longest)))
+
+def from_logs(logs: list) -> LogSummary:
+    """Untuk log (dict dengan 'date' dan 'done_mask') yang sudah ada di tangan, mis. hasil get_daily_logs_for_users."""
+    return from_masks(sorted((log['date'], log['done_mask']) for log in logs))
+
+def from_counts(period_counts: tuple) -> LogSummary:
+    """Dari (jumlah hari, dict item -> jumlah) hasil prefix sum; tanpa kolom per hari dan runtun."""
+    total_days, item_counts = period_counts
+    return LogSummary(total_days, item_counts)
+
+async def for_period(user_id: int, start_date: str, end_date: str) -> LogSummary:
+    """Agregasi lengkap (termasuk runtun) dari done_mask pengguna dalam rentang tanggal; biaya sebanding jumlah hari di periode."""
+    return from_masks(await db_async.get_log_masks_for_period(user_id, start_date, end_date))
+
+async def counts_for_period(user_id: int, start_date: str, end_date: str) -> LogSummary:
+    """Hanya jumlah per item, dari dua baris prefix sum; cukup untuk ringkasan motivasi/diskusi."""
+    return from_counts(await db_async.get_item_counts_for_period(user_id, start_date, end_date))
@@ -1,7 +1,9 @@
 # File: main.py
 
 import os
+import asyncio
 import logging
+from time import perf_counter
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, time
 import pytz
@@ -19,18 +21,32 @@ from telegram.ext import (
 
 # Impor semua handler kustom kita
 import db_handler as db
+import db_async
 import prayer_handler
 import report_handler
+import log_aggregator
 import ai_handler
 import calendar_handler
+import http_client
+import ai_client
+import broadcast_handler
+import checklist_cache
+import motivation_cache
+import message_streamer
+import discussion_history
+import scripture_index
 
 # --- SETUP DASAR ---
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # Jangan log setiap request HTTP
 logger = logging.getLogger(__name__)
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 ADMIN_USER_ID = os.getenv("ADMIN_USER_ID")
 WIB = pytz.timezone('Asia/Jakarta')
+# Batas waktu (detik) motivasi di pesan "Waktu Sholat"; lewat dari ini jadwal tetap tampil tanpa motivasi
+SHOLAT_MOTIVATION_DEADLINE = float(os.getenv("SHOLAT_MOTIVATION_DEADLINE", "10"))
+MOTIVATION_PLACEHOLDER = "\n\n_Menyiapkan motivasi personal\\.\\.\\._"
 
 # --- DEFINISI STATE ---
 (STATE_REGISTER_NAME, STATE_ASK_LOCATION, STATE_AWAIT_FEEDBACK, STATE_AWAIT_DISCUSSION) = range(4)
@@ -58,15 +74,6 @@ def escape_markdown_v2(text: str) -> str:
     escape_chars = r'_*[]()~`>#+-=|{}.!'
     return ''.join(f'\\{char}' if char in escape_chars else char for char in text)
 
-# --- FUNGSI BARU & MODIFIKASI UNTUK NOTIFIKASI ---
-
-def schedule_default_jobs(user_id: int, job_queue):
-    """Menjadwalkan notifikasi default untuk pengguna baru."""
-    job_queue.run_daily(schedule_prayer_notifications_for_user, time(hour=2, tzinfo=WIB), user_id=user_id, name=f"notif_sholat_{user_id}")
-    job_queue.run_daily(send_daily_summary, time(hour=21, minute=30, tzinfo=WIB), user_id=user_id, name=f"notif_rangkuman_{user_id}")
-    job_queue.run_daily(send_daily_motivation, time(hour=7, tzinfo=WIB), user_id=user_id, name=f"notif_motivasi_{user_id}")
-    logger.info(f"Notifikasi default dijadwalkan untuk pengguna baru: {user_id}")
-
 # --- FUNGSI MENU UTAMA & PEMBATALAN ---
 async def show_main_menu(message, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -85,7 +92,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 # --- ALUR PENDAFTARAN & VERIFIKASI ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user; user_id = user.id
-    user_data = db.find_user_by_id(user_id)
+    user_data = await db_async.find_user_by_id(user_id)
     if user_data:
         status, agreed_terms = user_data.get("status"), user_data.get("agreed_terms") == 1
         if status == "Approved" and agreed_terms:
@@ -107,7 +114,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def received_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user; user_id, username, full_name = user.id, user.username or "", update.message.text
-    if db.add_new_user_for_verification(user_id, username, full_name) in ["success", "already_exists"]:
+    if await db_async.add_new_user_for_verification(user_id, username, full_name) in ["success", "already_exists"]:
         await update.message.reply_text(f"Terima kasih, {full_name}.\nPendaftaran Anda sedang menunggu persetujuan admin.")
         keyboard = [[InlineKeyboardButton("✅ Setujui", callback_data=f"approve_{user_id}"), InlineKeyboardButton("❌ Tolak", callback_data=f"reject_{user_id}")]]
         admin_message = f"🔔 Pendaftaran Baru\n\nNama: {full_name}\nUsername: @{username}\nUser ID: `{user_id}`"
@@ -119,7 +126,7 @@ async def received_name(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
 async def admin_verification_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer(); action, user_id_str = query.data.split('_', 1); user_id = int(user_id_str)
     if action == "approve":
-        if db.update_user_status(user_id, "Approved"):
+        if await db_async.update_user_status(user_id, "Approved"):
             await query.edit_message_text(text=f"{query.message.text}\n\n*✅ DISETUJUI oleh admin\\.*", parse_mode='MarkdownV2')
             keyboard = [[InlineKeyboardButton("Ya, Saya Bersedia", callback_data=f"agree_terms_{user_id}")]]
             combined_text = "Alhamdulillah, akun Anda telah disetujui!\n" + TERMS_AND_CONDITIONS
@@ -128,7 +135,7 @@ async def admin_verification_handler(update: Update, context: ContextTypes.DEFAU
             except Exception as e:
                 logger.error(f"Gagal mengirim pesan S&K ke user {user_id}: {e}")
     elif action == "reject":
-        if db.update_user_status(user_id, "Rejected"):
+        if await db_async.update_user_status(user_id, "Rejected"):
             await query.edit_message_text(text=f"{query.message.text}\n\n*❌ DITOLAK oleh admin\\.*", parse_mode='MarkdownV2')
             try:
                 await context.bot.send_message(chat_id=user_id, text="Maaf, pendaftaran Anda belum dapat kami setujui.")
@@ -142,45 +149,66 @@ async def user_terms_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if query.from_user.id != user_id: await query.answer("Ini bukan tombol untuk Anda.", show_alert=True); return
     
     await query.answer()
-    if db.update_user_terms_agreement(user_id):
+    if await db_async.update_user_terms_agreement(user_id):
         await query.edit_message_text(text="Jazakallah khairan. Selamat menggunakan bot!")
-        
-        # JADWALKAN NOTIFIKASI DEFAULT DI SINI
-        schedule_default_jobs(user_id, context.job_queue)
-        
+        # Notifikasi default (kolom notif_* bernilai 1) otomatis ikut dalam job slot harian
         await show_main_menu(query.message, context)
     else: await query.edit_message_text(text="Terjadi kesalahan.")
 
 # --- HANDLER FITUR UTAMA ---
 async def menu_sholat_handler_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_id = update.effective_user.id; user_data = db.find_user_by_id(user_id)
+    user_id = update.effective_user.id; user_data = await db_async.find_user_by_id(user_id)
     current_location = user_data.get("location")
     if current_location and current_location != "-":
         safe_location = escape_markdown_v2(current_location)
+        # Jadwal & motivasi dikerjakan bersamaan; jadwal dikirim begitu siap, motivasi menyusul lewat edit pesan
+        started = perf_counter()
+        motivation_task = asyncio.create_task(get_weekly_motivation(user_id))
+        schedule_task = asyncio.create_task(prayer_handler.get_prayer_times(city=current_location))
         await update.message.reply_text(f"Lokasi Anda: **{safe_location}**\\.", parse_mode='MarkdownV2')
-        await update.message.reply_text("Mengambil jadwal & motivasi personal...")
-        schedule_message = prayer_handler.get_prayer_times(city=current_location)
-        today = datetime.now()
-        start_date, end_date = (today - timedelta(days=6)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
-        logs = db.get_user_logs_for_period(user_id, start_date, end_date)
-        motivational_message = ai_handler.generate_motivational_message(logs)
-        final_message = schedule_message + motivational_message
-        await update.message.reply_text(final_message, parse_mode='MarkdownV2')
+        schedule_message = await schedule_task
+        schedule_reply = await update.message.reply_text(schedule_message + MOTIVATION_PLACEHOLDER, parse_mode='MarkdownV2')
+        logger.info(f"Waktu Sholat {user_id}: jadwal terkirim dalam {perf_counter() - started:.2f} detik")
+        context.application.create_task(attach_motivation(schedule_reply, schedule_message, motivation_task, started), update=update)
         keyboard = [[InlineKeyboardButton("🔄 Ganti Lokasi", callback_data="change_location")]]
         await update.message.reply_text("Ganti lokasi?", reply_markup=InlineKeyboardMarkup(keyboard)); return ConversationHandler.END
     else:
         await update.message.reply_text("Anda belum mengatur lokasi. Silakan ketik nama kota Anda."); return STATE_ASK_LOCATION
 
+async def get_weekly_motivation(user_id: int) -> str:
+    today = calendar_handler.today_wib()
+    start_date, end_date = (today - timedelta(days=6)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+    await checklist_cache.flush(user_id)
+    return await ai_handler.generate_motivational_message(await log_aggregator.counts_for_period(user_id, start_date, end_date))
+
+async def attach_motivation(message, schedule_message: str, motivation_task, started: float):
+    """Mengganti placeholder di pesan jadwal dengan motivasi, atau membuangnya bila motivasi gagal/melewati batas waktu."""
+    try:
+        motivational_message = await asyncio.wait_for(motivation_task, timeout=SHOLAT_MOTIVATION_DEADLINE)
+    except TimeoutError:
+        logger.warning(f"Motivasi Waktu Sholat melewati {SHOLAT_MOTIVATION_DEADLINE:.0f} detik, jadwal dikirim tanpa motivasi")
+        motivational_message = ""
+    except Exception as e:
+        logger.error(f"Gagal membuat motivasi Waktu Sholat: {e}")
+        motivational_message = ""
+    try:
+        await message.edit_text(schedule_message + motivational_message, parse_mode='MarkdownV2')
+    except Exception as e:
+        logger.error(f"Gagal menambahkan motivasi ke pesan jadwal: {e}")
+    logger.info(f"Waktu Sholat: pesan lengkap dalam {perf_counter() - started:.2f} detik")
+
 async def ask_location_again(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query; await query.answer(); await query.message.reply_text("Baik, silakan ketik nama kota baru Anda."); return STATE_ASK_LOCATION
 
 async def received_location_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    user_id, city_name = update.effective_user.id, update.message.text
+    user_id, city_name = update.effective_user.id, " ".join(update.message.text.split())
     safe_city_name = escape_markdown_v2(city_name)
     await update.message.reply_text(f"Mencari jadwal untuk **{safe_city_name}**\\.\\.\\.", parse_mode='MarkdownV2')
-    schedule_message = prayer_handler.get_prayer_times(city=city_name)
+    schedule_message = await prayer_handler.get_prayer_times(city=city_name)
     if "Maaf, tidak dapat menemukan" not in schedule_message:
-        db.update_user_location(user_id, city_name); await update.message.reply_text("Lokasi Anda berhasil disimpan.")
+        _, user_data = await db_async.run_batch((db.update_user_location, user_id, city_name), (db.find_user_by_id, user_id))
+        await update.message.reply_text("Lokasi Anda berhasil disimpan.")
+        if user_data and user_data.get("notif_sholat") == 1: await schedule_city_prayer_jobs(context.job_queue, city_name)
     await update.message.reply_text(schedule_message, parse_mode='MarkdownV2')
     await show_main_menu(update.message, context); return ConversationHandler.END
 
@@ -191,8 +219,8 @@ async def menu_checklist_handler_text(update: Update, context: ContextTypes.DEFA
 
 async def show_checklist_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer(); category = query.data.split('_')[-1]
-    user_id, today_date = query.from_user.id, datetime.now().strftime("%Y-%m-%d")
-    daily_log = db.get_or_create_daily_log(user_id, today_date)
+    user_id, today_date = query.from_user.id, calendar_handler.today_wib().strftime("%Y-%m-%d")
+    daily_log = await checklist_cache.get_log(user_id, today_date)
     if not daily_log: await query.message.reply_text("Gagal ambil data."); return
     if category == "wajib": items, title = WAJIB_ITEMS, "Ibadah Wajib"
     elif category == "sunnah": items, title = SUNNAH_ITEMS, "Ibadah Sunnah"
@@ -219,17 +247,17 @@ def build_checklist_keyboard(daily_log: dict, items_to_show: list, back_callback
 
 async def checklist_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; _, item_name, current_status = query.data.split('_', 2)
-    user_id, today_date = query.from_user.id, datetime.now().strftime("%Y-%m-%d")
+    user_id, today_date = query.from_user.id, calendar_handler.today_wib().strftime("%Y-%m-%d")
     new_status = "Sudah" if current_status == "Belum" else "Belum"
-    if db.update_daily_log_item(user_id, today_date, item_name, new_status):
+    # Diubah di memori; database ditulis secara berkala oleh checklist_cache.flush_job
+    updated_log = await checklist_cache.set_item(user_id, today_date, item_name, new_status)
+    if updated_log:
         await query.answer(f"{item_name} dicatat '{new_status}'.")
-        updated_log = db.get_or_create_daily_log(user_id, today_date)
-        if updated_log:
-            if item_name in WAJIB_ITEMS: items = WAJIB_ITEMS
-            elif item_name in SUNNAH_ITEMS: items = SUNNAH_ITEMS
-            else: items = LAINNYA_ITEMS + calendar_handler.get_todays_sunnah_fasts()
-            try: await query.edit_message_reply_markup(reply_markup=build_checklist_keyboard(updated_log, items, "back_to_checklist_cat"))
-            except Exception as e: logger.info(f"Markup tidak berubah: {e}")
+        if item_name in WAJIB_ITEMS: items = WAJIB_ITEMS
+        elif item_name in SUNNAH_ITEMS: items = SUNNAH_ITEMS
+        else: items = LAINNYA_ITEMS + calendar_handler.get_todays_sunnah_fasts()
+        try: await query.edit_message_reply_markup(reply_markup=build_checklist_keyboard(updated_log, items, "back_to_checklist_cat"))
+        except Exception as e: logger.info(f"Markup tidak berubah: {e}")
     else: await query.answer("Gagal update.", show_alert=True)
 
 async def back_to_main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -242,13 +270,16 @@ async def menu_laporan_handler_text(update: Update, context: ContextTypes.DEFAUL
 
 async def report_period_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer("Memproses laporan...")
-    _, period = query.data.split('_', 1); user_id, today = query.from_user.id, datetime.now()
+    _, period = query.data.split('_', 1); user_id, today = query.from_user.id, calendar_handler.today_wib()
     end_date = today.strftime("%Y-%m-%d")
     if period == "harian": start_date = today.strftime("%Y-%m-%d")
     elif period == "mingguan": start_date = (today - timedelta(days=6)).strftime("%Y-%m-%d")
     else: start_date = (today - timedelta(days=29)).strftime("%Y-%m-%d")
-    logs = db.get_user_logs_for_period(user_id, start_date, end_date)
-    report_message = report_handler.generate_report(logs, period.capitalize())
+    # Satu agregasi (jumlah, runtun, wajib per hari) dipakai bersama oleh teks laporan dan motivasi AI. Runtun butuh
+    # done_mask per hari (maks. 30 baris), bukan prefix sum log_counters; jumlah per item ikut dihitung di jalan yang sama
+    await checklist_cache.flush(user_id)
+    period_summary = await log_aggregator.for_period(user_id, start_date, end_date)
+    report_message = await report_handler.generate_report(period_summary, period.capitalize())
     await query.message.reply_text(report_message, parse_mode='MarkdownV2')
 
 async def menu_feedback_handler_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -256,7 +287,7 @@ async def menu_feedback_handler_text(update: Update, context: ContextTypes.DEFAU
 
 async def received_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user, feedback_text = update.effective_user, update.message.text
-    if db.add_feedback(user.id, user.username or "", feedback_text):
+    if await db_async.add_feedback(user.id, user.username or "", feedback_text):
         await update.message.reply_text("Jazakallah khairan. Masukan Anda telah kami terima.")
         safe_feedback, safe_username = escape_markdown_v2(feedback_text), escape_markdown_v2(user.username or "")
         admin_message = f"📬 Masukan Baru\n\n*Dari:* @{safe_username}\n*Pesan:* {safe_feedback}"
@@ -265,28 +296,25 @@ async def received_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await show_main_menu(update.message, context); return ConversationHandler.END
 
 async def menu_discussion_handler_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    db.clear_discussion_history(update.effective_user.id)
+    await db_async.clear_discussion_history(update.effective_user.id)
     text = "Anda memasuki mode *Diskusi Islami*.\n\nSilakan ajukan pertanyaan pertama Anda terkait ibadah dan hal-hal yang berkaitan dengan Islam.\n\nKirim /selesai untuk keluar."
     await update.message.reply_text(text, parse_mode='Markdown'); return STATE_AWAIT_DISCUSSION
 
 async def received_discussion_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id, user_question = update.effective_user.id, update.message.text
-    await update.message.reply_text("_Sedang berpikir..._", parse_mode='Markdown')
-    history = db.get_discussion_history(user_id)
-    db.add_discussion_message(user_id, 'user', user_question)
-    history.append({'role': 'user', 'content': user_question})
-    ai_answer = ai_handler.generate_discussion_response(user_id, user_question, history)
-    try:
-        # Kita coba kirim dengan Markdown, jika gagal (karena format AI), kirim teks biasa
-        await update.message.reply_text(ai_answer, parse_mode='Markdown')
-        db.add_discussion_message(user_id, 'assistant', ai_answer)
-    except Exception:
-        await update.message.reply_text(ai_answer)
-        db.add_discussion_message(user_id, 'assistant', ai_answer)
+    placeholder = await update.message.reply_text("_Sedang berpikir..._", parse_mode='Markdown')
+    # Ringkasan + beberapa giliran terakhir dalam anggaran token; pertanyaan ini ikut dicatat
+    history = await discussion_history.start_turn(user_id, user_question)
+    # Jawaban tampil bertahap dengan mengedit pesan "Sedang berpikir..."; edit terakhir dicoba dengan Markdown
+    streamer = message_streamer.StreamingReply(placeholder)
+    ai_answer, truncated = await ai_handler.generate_discussion_response(user_id, user_question, history, on_text=streamer.update)
+    await streamer.finish(ai_answer)
+    # Jawaban setengah jadi tidak masuk riwayat, agar giliran berikutnya tidak meneruskan jawaban yang terpotong
+    if not truncated: await discussion_history.finish_turn(user_id, ai_answer)
     return STATE_AWAIT_DISCUSSION
 
 async def exit_discussion(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    db.clear_discussion_history(update.effective_user.id)
+    await db_async.clear_discussion_history(update.effective_user.id)
     await update.message.reply_text("Anda telah keluar dari mode Diskusi Islami.")
     await show_main_menu(update.message, context); return ConversationHandler.END
 
@@ -294,7 +322,7 @@ async def exit_discussion(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def notifikasi_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan menu pengaturan notifikasi."""
     user_id = update.effective_user.id
-    user_data = db.find_user_by_id(user_id)
+    user_data = await db_async.find_user_by_id(user_id)
     if not user_data: return
 
     statuses = {
@@ -323,154 +351,223 @@ async def toggle_notification_handler(update: Update, context: ContextTypes.DEFA
     query = update.callback_query; await query.answer(); user_id = query.from_user.id
     notif_key = query.data.split('_')[-1]; notif_type = f"notif_{notif_key}"
     
-    user_data = db.find_user_by_id(user_id)
+    user_data = await db_async.find_user_by_id(user_id)
     new_status = 1 - user_data.get(notif_type, 0)
-    db.set_user_notification(user_id, notif_type, new_status)
-    
-    base_job_name = f"{notif_type}_{user_id}"
-    for job in context.job_queue.get_jobs_by_name(base_job_name): job.schedule_removal()
-
-    if new_status == 1:
-        if notif_type == "notif_sholat": 
-            context.job_queue.run_daily(schedule_prayer_notifications_for_user, time(hour=2, tzinfo=WIB), user_id=user_id, name=base_job_name)
-            # Jalankan sekali sekarang juga untuk hari ini
-            context.job_queue.run_once(schedule_prayer_notifications_for_user, 1, user_id=user_id, name=f"immediate_{base_job_name}")
-        elif notif_type == "notif_rangkuman": context.job_queue.run_daily(send_daily_summary, time(hour=21, minute=30, tzinfo=WIB), user_id=user_id, name=base_job_name)
-        elif notif_type == "notif_dzikir":
-            context.job_queue.run_daily(send_dzikir_notification, time(hour=6, minute=30, tzinfo=WIB), user_id=user_id, name=base_job_name, data="Pagi")
-            context.job_queue.run_daily(send_dzikir_notification, time(hour=16, minute=30, tzinfo=WIB), user_id=user_id, name=base_job_name, data="Petang")
-        elif notif_type == "notif_dhuha": context.job_queue.run_daily(send_dhuha_notification, time(hour=9, tzinfo=WIB), user_id=user_id, name=base_job_name)
-        elif notif_type == "notif_jumat": context.job_queue.run_daily(send_jumat_reminder, time(hour=7, tzinfo=WIB), user_id=user_id, name=base_job_name)
-        elif notif_type == "notif_motivasi": context.job_queue.run_daily(send_daily_motivation, time(hour=7, tzinfo=WIB), user_id=user_id, name=base_job_name)
+    await db_async.set_user_notification(user_id, notif_type, new_status)
+
+    # Job notifikasi dibagi per slot/kota, jadi cukup pastikan jadwal kota pengguna hari ini sudah ada
+    if new_status == 1 and notif_type == "notif_sholat":
+        location = user_data.get("location")
+        if location and location != "-": await schedule_city_prayer_jobs(context.job_queue, location)
+        else: await query.message.reply_text("Atur lokasi Anda lewat menu Waktu Sholat agar notifikasi sholat bisa dikirim.")
     
     class FakeUpdate:
         def __init__(self, message): self.effective_user = message.chat; self.message = message
     await notifikasi_menu(FakeUpdate(query.message), context)
     await query.answer(f"Notifikasi '{notif_key.replace('_', ' ').capitalize()}' {'dihidupkan' if new_status else 'dimatikan'}.")
 
-async def schedule_prayer_notifications_for_user(context: ContextTypes.DEFAULT_TYPE):
-    user_id = context.job.user_id
-    user_data = db.find_user_by_id(user_id)
-    location = user_data.get("location")
+PRAYER_ORDER = {"subuh": "Subuh", "dzuhur": "Dzuhur", "ashar": "Ashar", "maghrib": "Maghrib", "isya": "Isya"}
+REMINDER_MINUTES = 15
 
-    if not location or location == "-":
-        await context.bot.send_message(chat_id=user_id, text="Notifikasi sholat gagal dijadwalkan karena lokasi Anda belum diatur."); return
-        
-    prayer_data = prayer_handler.get_prayer_times_raw(city=location)
+async def schedule_city_prayer_jobs(job_queue, location: str, existing_job_names: set = None) -> int:
+    """Menjadwalkan job waktu sholat & pengingat hari ini untuk satu kota (idempoten per nama job)."""
+    if existing_job_names is None: existing_job_names = {job.name for job in job_queue.jobs()}
+    city_key = location.strip().lower()
+    prayer_data = await prayer_handler.get_prayer_times_raw(city=location)
     if not prayer_data:
-        await context.bot.send_message(chat_id=user_id, text=f"Gagal mengambil jadwal sholat untuk '{location}' hari ini."); return
-    
-    prayer_times = prayer_data['timings']
-    prayer_order = {"Fajr":"Subuh", "Dhuhr":"Dzuhur", "Asr":"Ashar", "Maghrib":"Maghrib", "Isha":"Isya"}
+        logger.error(f"Gagal mengambil jadwal sholat untuk '{location}' hari ini."); return 0
 
-    for prayer_api_name, prayer_display_name in prayer_order.items():
-        prayer_time_str = prayer_times.get(prayer_api_name)
-        if not prayer_time_str: continue
-        
+    # Jam di jadwal adalah waktu setempat kota (WIB/WITA/WIT); datetime ber-zona diubah JobQueue ke waktu absolut
+    now = datetime.now(WIB); local_now = now.astimezone(prayer_handler.get_local_timezone(prayer_data)); created = 0
+    for prayer_key, prayer_display_name in PRAYER_ORDER.items():
+        prayer_time_str = prayer_data['jadwal'].get(prayer_key)
+        if not prayer_time_str or ':' not in prayer_time_str: continue
         hour, minute = map(int, prayer_time_str.split(':'))
-        prayer_time_obj = time(hour=hour, minute=minute, tzinfo=WIB)
-        
-        # Hanya jadwalkan jika waktunya belum lewat untuk hari ini
-        if prayer_time_obj > datetime.now(WIB).time():
-            # 1. Jadwalkan notifikasi tepat waktu
-            context.job_queue.run_once(send_prayer_notification, prayer_time_obj, user_id=user_id, data={"prayer_name": prayer_display_name})
-            
-            # 2. Jadwalkan pengingat 15 menit sebelumnya
-            reminder_dt = datetime.now(WIB).replace(hour=hour, minute=minute, second=0, microsecond=0) - timedelta(minutes=15)
-            if reminder_dt > datetime.now(WIB):
-                context.job_queue.run_once(send_reminder_notification, reminder_dt.time(), user_id=user_id, data={"prayer_name": prayer_display_name})
-    logger.info(f"Berhasil menjadwalkan notifikasi sholat untuk user {user_id} di {location}")
+        prayer_dt = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        data = {"city_key": city_key, "prayer_name": prayer_display_name}
+        # 1. Notifikasi tepat waktu, 2. pengingat 15 menit sebelumnya. Hanya jika belum lewat.
+        for job_name, callback, run_at in [
+            (f"sholat_{city_key}_{prayer_key}", send_prayer_notification, prayer_dt),
+            (f"pengingat_{city_key}_{prayer_key}", send_reminder_notification, prayer_dt - timedelta(minutes=REMINDER_MINUTES)),
+        ]:
+            if run_at > now and job_name not in existing_job_names:
+                job_queue.run_once(callback, run_at, data=data, name=job_name); existing_job_names.add(job_name); created += 1
+    return created
+
+async def schedule_prayer_jobs_for_cities(job_queue, cities: list) -> int:
+    """Menjadwalkan job sholat hari ini untuk banyak kota sekaligus; jadwal kota diambil secara paralel."""
+    existing_job_names = {job.name for job in job_queue.jobs()}
+    results = await asyncio.gather(*(schedule_city_prayer_jobs(job_queue, city, existing_job_names) for city in cities))
+    return sum(results)
+
+async def schedule_daily_prayer_jobs(context: ContextTypes.DEFAULT_TYPE):
+    """Job harian 00:05 WIB (02:05 WIT, sebelum Subuh di semua zona): satu set job per kota, bukan per pengguna."""
+    cities = await db_async.get_prayer_notification_cities()
+    created = await schedule_prayer_jobs_for_cities(context.job_queue, cities)
+    logger.info(f"Berhasil menjadwalkan {created} job notifikasi sholat untuk {len(cities)} kota")
+
+async def prefetch_prayer_schedules(context: ContextTypes.DEFAULT_TYPE):
+    """Mengisi store jadwal sholat sebulan penuh untuk setiap kota pengguna (dan bulan depan menjelang akhir bulan)."""
+    locations = await db_async.get_distinct_user_locations()
+    if not locations: return
+    today = calendar_handler.today_wib()
+    months = [(today.year, today.month)]
+    if today.day >= 25:
+        next_month = (today.replace(day=1) + timedelta(days=32))
+        months.append((next_month.year, next_month.month))
+    for year, month in months:
+        filled, total = await prayer_handler.prefetch_schedules(locations, year, month)
+        logger.info(f"Prefetch jadwal {year}-{month:02d}: {filled}/{total} kota tersedia")
+
+def get_previous_prayer(prayer_name: str):
+    """Sholat wajib sebelumnya, atau None untuk Subuh / bukan sholat wajib."""
+    prayer_order = list(PRAYER_ORDER.values())
+    if prayer_name not in prayer_order or prayer_order.index(prayer_name) == 0: return None
+    return prayer_order[prayer_order.index(prayer_name) - 1]
+
+async def get_users_missing_prayer(user_ids: list, prayer_name: str):
+    """Pengguna yang belum menandai sholat tertentu hari ini (log yang belum ada dihitung 'Belum')."""
+    today_date = calendar_handler.today_wib().strftime("%Y-%m-%d")
+    await checklist_cache.flush()
+    logs = await db_async.get_daily_logs_for_users(user_ids, today_date)
+    return [user_id for user_id in user_ids if logs.get(user_id, {}).get(prayer_name, "Belum") == "Belum"]
 
 async def send_prayer_notification(context: ContextTypes.DEFAULT_TYPE):
-    """Mengirim notifikasi saat waktu sholat tiba DAN melakukan pengecekan terakhir."""
-    user_id = context.job.user_id
-    prayer_name = context.job.data["prayer_name"]
+    """Mengirim notifikasi saat waktu sholat tiba ke semua pelanggan di kota ini DAN melakukan pengecekan terakhir."""
+    city_key, prayer_name = context.job.data["city_key"], context.job.data["prayer_name"]
+    user_ids = await db_async.get_prayer_subscribers(city_key)
     
     # Kirim notifikasi utama
-    await context.bot.send_message(
-        chat_id=user_id, 
-        text=f"🔔 Waktu sholat *{escape_markdown_v2(prayer_name)}* telah tiba!", 
-        parse_mode='MarkdownV2'
-    )
+    text = f"🔔 Waktu sholat *{escape_markdown_v2(prayer_name)}* telah tiba!"
+    for user_id in user_ids: broadcast_handler.enqueue(user_id, text, parse_mode='MarkdownV2')
+
     # --- PENAMBAHAN LOGIKA PENGINGAT CADANGAN ---
-    prayer_order = ["Subuh", "Dzuhur", "Ashar", "Maghrib", "Isya"]
-    try:
-        current_index = prayer_order.index(prayer_name)
-        if current_index == 0:  # Tidak ada pengecekan sebelum Subuh
-            return
-        previous_prayer = prayer_order[current_index - 1]
-    except ValueError:
-        return  # Bukan sholat wajib
-
-    today_date = datetime.now(WIB).strftime("%Y-%m-%d")
-    daily_log = db.get_or_create_daily_log(user_id, today_date)
-
-    if daily_log and daily_log.get(previous_prayer) == "Belum":
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"❗️ Sekadar mengingatkan, sepertinya sholat *{escape_markdown_v2(previous_prayer)}* Anda belum ditandai selesai di checklist.",
-            parse_mode='MarkdownV2'
-        )
+    previous_prayer = get_previous_prayer(prayer_name)
+    if not previous_prayer: return  # Tidak ada pengecekan sebelum Subuh
+    text = f"❗️ Sekadar mengingatkan, sepertinya sholat *{escape_markdown_v2(previous_prayer)}* Anda belum ditandai selesai di checklist."
+    for user_id in await get_users_missing_prayer(user_ids, previous_prayer):
+        broadcast_handler.enqueue(user_id, text, parse_mode='MarkdownV2')
 
 async def send_reminder_notification(context: ContextTypes.DEFAULT_TYPE):
-    user_id = context.job.user_id
-    current_prayer = context.job.data["prayer_name"]
-    prayer_order = ["Subuh", "Dzuhur", "Ashar", "Maghrib", "Isya"]
-    try:
-        current_index = prayer_order.index(current_prayer)
-        if current_index == 0: return
-        previous_prayer = prayer_order[current_index - 1]
-    except ValueError: return
-
-    today_date = datetime.now(WIB).strftime("%Y-%m-%d")
-    daily_log = db.get_or_create_daily_log(user_id, today_date)
-    
-    if daily_log and daily_log.get(previous_prayer) == "Belum":
-        await context.bot.send_message(chat_id=user_id, text=f"❗️ Pengingat: 15 menit lagi masuk waktu *{escape_markdown_v2(current_prayer)}*. Sepertinya sholat *{escape_markdown_v2(previous_prayer)}* Anda belum ditandai selesai.")
+    city_key, current_prayer = context.job.data["city_key"], context.job.data["prayer_name"]
+    previous_prayer = get_previous_prayer(current_prayer)
+    if not previous_prayer: return
+    text = f"❗️ Pengingat: 15 menit lagi masuk waktu *{escape_markdown_v2(current_prayer)}*. Sepertinya sholat *{escape_markdown_v2(previous_prayer)}* Anda belum ditandai selesai."
+    for user_id in await get_users_missing_prayer(await db_async.get_prayer_subscribers(city_key), previous_prayer):
+        broadcast_handler.enqueue(user_id, text)
 
 async def send_daily_summary(context: ContextTypes.DEFAULT_TYPE):
-    user_id = context.job.user_id
-    today_date = datetime.now(WIB).strftime("%Y-%m-%d")
-    logs = db.get_user_logs_for_period(user_id, today_date, today_date)
-    summary_message = report_handler.generate_report(logs, "Harian")
-    await context.bot.send_message(chat_id=user_id, text=summary_message, parse_mode='MarkdownV2')
+    today_date = calendar_handler.today_wib().strftime("%Y-%m-%d")
+    user_ids = await db_async.get_subscribed_user_ids("notif_rangkuman")
+    await checklist_cache.flush()
+    daily_logs = await db_async.get_daily_logs_for_users(user_ids, today_date)
+    for user_id in user_ids:
+        logs = [daily_logs[user_id]] if user_id in daily_logs else []
+        summary_message = await report_handler.generate_report(log_aggregator.from_logs(logs), "Harian")
+        broadcast_handler.enqueue(user_id, summary_message, parse_mode='MarkdownV2')
+
+async def prepare_broadcast_content(context: ContextTypes.DEFAULT_TYPE):
+    """Job 05:00: pool pesan dzikir & dhuha (dan Jumat pada Kamis/Jumat) dibuat sekali untuk semua pelanggan."""
+    slots = ["dzikir_pagi", "dzikir_petang", "dhuha"] + (["jumat"] if calendar_handler.today_wib().weekday() in [3, 4] else [])
+    counts = await ai_handler.prepare_content_pools(slots)
+    logger.info(f"Pool konten broadcast siap: {counts}")
 
 async def send_dzikir_notification(context: ContextTypes.DEFAULT_TYPE):
-    user_id, time_of_day = context.job.user_id, context.job.data
-    motivation = ai_handler.generate_dzikir_motivation(time_of_day)
-    await context.bot.send_message(chat_id=user_id, text=f"🌤️ Waktunya Dzikir *{escape_markdown_v2(time_of_day)}*!\n\n_{motivation}_", parse_mode='MarkdownV2')
+    time_of_day = context.job.data
+    motivation = await ai_handler.generate_dzikir_motivation(time_of_day)
+    text = f"🌤️ Waktunya Dzikir *{escape_markdown_v2(time_of_day)}*!\n\n_{motivation}_"
+    for user_id in await db_async.get_subscribed_user_ids("notif_dzikir"): broadcast_handler.enqueue(user_id, text, parse_mode='MarkdownV2')
 
 async def send_dhuha_notification(context: ContextTypes.DEFAULT_TYPE):
-    user_id = context.job.user_id
-    motivation = ai_handler.generate_dhuha_motivation()
-    await context.bot.send_message(chat_id=user_id, text=f"✨ Jangan lupa sholat *Dhuha* ya!\n\n_{motivation}_", parse_mode='MarkdownV2')
+    motivation = await ai_handler.generate_dhuha_motivation()
+    text = f"✨ Jangan lupa sholat *Dhuha* ya!\n\n_{motivation}_"
+    for user_id in await db_async.get_subscribed_user_ids("notif_dhuha"): broadcast_handler.enqueue(user_id, text, parse_mode='MarkdownV2')
 
 async def send_jumat_reminder(context: ContextTypes.DEFAULT_TYPE):
-    if datetime.now(WIB).weekday() in [3, 4]: # Kamis atau Jumat
-        user_id = context.job.user_id
-        motivation = ai_handler.generate_jumat_motivation()
-        await context.bot.send_message(chat_id=user_id, text=f"🕋 *Jumat Berkah*! Jangan lupa perbanyak shalawat dan baca Surah Al-Kahfi.\n\n_{motivation}_", parse_mode='MarkdownV2')
+    if calendar_handler.today_wib().weekday() in [3, 4]: # Kamis atau Jumat
+        motivation = await ai_handler.generate_jumat_motivation()
+        text = f"🕋 *Jumat Berkah*! Jangan lupa perbanyak shalawat dan baca Surah Al-Kahfi.\n\n_{motivation}_"
+        for user_id in await db_async.get_subscribed_user_ids("notif_jumat"): broadcast_handler.enqueue(user_id, text, parse_mode='MarkdownV2')
 
 async def send_daily_motivation(context: ContextTypes.DEFAULT_TYPE):
-    user_id = context.job.user_id
-    yesterday_date = (datetime.now(WIB) - timedelta(days=1)).strftime("%Y-%m-%d")
-    logs = db.get_user_logs_for_period(user_id, yesterday_date, yesterday_date)
-    motivation = ai_handler.generate_motivational_message(logs)
-    await context.bot.send_message(chat_id=user_id, text=f"☀️ *Semangat Pagi*!\n{motivation}", parse_mode='MarkdownV2')
+    yesterday_date = (calendar_handler.today_wib() - timedelta(days=1)).strftime("%Y-%m-%d")
+    user_ids = await db_async.get_subscribed_user_ids("notif_motivasi")
+    await checklist_cache.flush()
+    daily_logs = await db_async.get_daily_logs_for_users(user_ids, yesterday_date)
+    for user_id in user_ids:
+        logs = [daily_logs[user_id]] if user_id in daily_logs else []
+        motivation = await ai_handler.generate_motivational_message(log_aggregator.from_logs(logs))
+        broadcast_handler.enqueue(user_id, f"☀️ *Semangat Pagi*!\n{motivation}", parse_mode='MarkdownV2')
+
+# Satu job harian per slot waktu: (nama job, fungsi, waktu WIB, data)
+NOTIFICATION_SLOTS = [
+    ("slot_notif_sholat", schedule_daily_prayer_jobs, time(hour=0, minute=5, tzinfo=WIB), None),
+    ("slot_siapkan_konten", prepare_broadcast_content, time(hour=5, tzinfo=WIB), None),
+    ("slot_notif_dzikir_pagi", send_dzikir_notification, time(hour=6, minute=30, tzinfo=WIB), "Pagi"),
+    ("slot_notif_motivasi", send_daily_motivation, time(hour=7, tzinfo=WIB), None),
+    ("slot_notif_jumat", send_jumat_reminder, time(hour=7, tzinfo=WIB), None),
+    ("slot_notif_dhuha", send_dhuha_notification, time(hour=9, tzinfo=WIB), None),
+    ("slot_notif_dzikir_petang", send_dzikir_notification, time(hour=16, minute=30, tzinfo=WIB), "Petang"),
+    ("slot_notif_rangkuman", send_daily_summary, time(hour=21, minute=30, tzinfo=WIB), None),
+]
+
+def register_notification_jobs(job_queue):
+    """Mendaftarkan job slot notifikasi. Jumlah job tidak bergantung pada jumlah pengguna."""
+    for job_name, callback, slot_time, data in NOTIFICATION_SLOTS:
+        if not job_queue.get_jobs_by_name(job_name):
+            job_queue.run_daily(callback, slot_time, data=data, name=job_name)
+
+async def rehydrate_notification_jobs(job_queue):
+    """
+    Membangun ulang semua job notifikasi setelah restart dari satu query ke tabel users.
+    Aman dipanggil berulang kali: job yang namanya sudah ada tidak dibuat lagi.
+    """
+    started = perf_counter()
+    register_notification_jobs(job_queue)
+    subscriptions = await db_async.get_notification_subscriptions()
+    cities = {row['location'].strip().lower() for row in subscriptions
+              if row['notif_sholat'] == 1 and row['location'] and row['location'].strip() not in ("", "-")}
+    created = await schedule_prayer_jobs_for_cities(job_queue, sorted(cities))
+    subscriber_counts = {notif_type: sum(1 for row in subscriptions if row[notif_type] == 1) for notif_type in db.NOTIFICATION_TYPES}
+    logger.info(f"Rehidrasi notifikasi: {len(subscriptions)} pengguna, {len(cities)} kota, {created} job sholat baru, "
+                f"{len(job_queue.jobs())} job total dalam {perf_counter() - started:.2f} detik. Pelanggan: {subscriber_counts}")
 
 # --- FUNGSI MAIN ---
 # Di dalam file main.py
 
+async def post_init(application: Application) -> None:
+    """Menyalakan antrean broadcast dan memulihkan job notifikasi sebelum bot mulai menerima update."""
+    broadcast_handler.start(application.bot)
+    await rehydrate_notification_jobs(application.job_queue)
+
+async def post_stop(application: Application) -> None:
+    """Mengirim sisa antrean broadcast selagi bot masih aktif."""
+    await broadcast_handler.stop()
+
+async def post_shutdown(application: Application) -> None:
+    """Menutup koneksi HTTP, AI, dan database bersama saat bot berhenti."""
+    await http_client.close()
+    await ai_client.close()
+    await checklist_cache.flush()  # Perubahan checklist yang masih di memori wajib tertulis sebelum DB ditutup
+    await db_async.run(scripture_index.close)  # Koneksi indeks milik thread DB, ditutup di thread itu juga
+    await db_async.close()
+
 def main() -> None:
     """Jalankan bot secara keseluruhan."""
     db.init_db()
+    calendar_handler.build_calendar_table()
     from telegram.ext import JobQueue
     job_queue = JobQueue()
 
     # Kembali ke cara inisialisasi yang paling dasar dan standar
-    application = Application.builder().token(TELEGRAM_TOKEN).job_queue(job_queue).build()
+    application = Application.builder().token(TELEGRAM_TOKEN).job_queue(job_queue).post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown).build()
     job_queue.set_application(application)
     job_queue.start()
+    # Isi store jadwal sholat sebelum job notifikasi jam 00:05 dan sekali saat bot baru menyala
+    job_queue.run_repeating(checklist_cache.flush_job, interval=checklist_cache.FLUSH_INTERVAL, name="flush_checklist")
+    job_queue.run_daily(motivation_cache.purge_expired, time(hour=3, tzinfo=WIB), name="purge_motivation_cache")
+    job_queue.run_daily(prefetch_prayer_schedules, time(hour=23, minute=30, tzinfo=WIB), name="prefetch_jadwal_sholat")
+    job_queue.run_once(prefetch_prayer_schedules, 5, name="prefetch_jadwal_sholat_awal")
     # --- Conversation Handlers ---
     registration_conv = ConversationHandler(
         entry_points=[CommandHandler('start', start)],
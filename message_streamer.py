@@ -0,0 +1,74 @@
+# File: message_streamer.py
+import os
+import asyncio
+import logging
+from datetime import timedelta
+from telegram.error import BadRequest, RetryAfter, TimedOut, NetworkError
+
+logger = logging.getLogger(__name__)
+
+# Jeda minimal antar edit pesan yang sama (batas edit Telegram kira-kira 1x/detik per chat)
+EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.2"))
+MAX_MESSAGE_LENGTH = 4096
+CURSOR = " ▌"
+
+class StreamingReply:
+    """
+    Menampilkan jawaban yang sedang di-stream dengan mengedit satu pesan Telegram.
+    Edit sementara dikirim sebagai teks biasa (Markdown yang belum lengkap bisa ditolak Telegram),
+    lalu finish() melakukan edit terakhir dengan Markdown, atau teks biasa jika Markdown gagal.
+    """
+
+    def __init__(self, message, edit_interval: float = EDIT_INTERVAL):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.shown_text = None
+        self.next_edit_at = 0.0
+        self.flood_until = 0.0
+        self.edit_count = 0
+
+    async def _edit(self, text: str, parse_mode: str = None) -> bool:
+        try:
+            await self.message.edit_text(text, parse_mode=parse_mode)
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+            self.flood_until = self.next_edit_at = asyncio.get_running_loop().time() + delay
+            return False
+        except BadRequest as e:
+            if "not modified" in str(e).lower(): return True
+            if parse_mode: raise
+            logger.info(f"Edit stream ditolak: {e}")
+            return False
+        except (TimedOut, NetworkError) as e:
+            logger.info(f"Edit stream gagal: {e}")
+            return False
+        self.shown_text = text; self.edit_count += 1
+        return True
+
+    async def update(self, text: str):
+        """Dipanggil setiap potongan baru tiba; hanya mengedit bila jeda minimal sudah lewat."""
+        now = asyncio.get_running_loop().time()
+        if now < self.next_edit_at or not text.strip(): return
+        self.next_edit_at = now + self.edit_interval
+        await self._edit(text[:MAX_MESSAGE_LENGTH - len(CURSOR)] + CURSOR)
+
+    async def finish(self, text: str):
+        """Edit terakhir dengan Markdown. Sisa teks yang melebihi batas panjang Telegram dikirim sebagai pesan lanjutan."""
+        parts = [text[i:i + MAX_MESSAGE_LENGTH] for i in range(0, len(text), MAX_MESSAGE_LENGTH)] or [text]
+        for index, part in enumerate(parts):
+            if index == 0:
+                sent = False
+                for _ in range(2):
+                    # Edit terakhir tidak boleh hilang: tunggu dulu bila sedang kena flood control
+                    await asyncio.sleep(max(0.0, self.flood_until - asyncio.get_running_loop().time()))
+                    try:
+                        sent = await self._edit(part, parse_mode='Markdown')
+                    except BadRequest:
+                        sent = await self._edit(part)
+                    if sent: break
+                if not sent: await self.message.reply_text(part)  # Edit tidak memungkinkan: kirim sebagai pesan baru
+            else:
+                try:
+                    await self.message.reply_text(part, parse_mode='Markdown')
+                except BadRequest:
+                    await self.message.reply_text(part)
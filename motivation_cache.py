@@ -0,0 +1,58 @@
+# File: motivation_cache.py
+import os
+import json
+import time
+import asyncio
+from cachetools import TTLCache
+import db_async
+
+# Motivasi untuk ringkasan log yang sama dipakai ulang selama TTL; tiap ringkasan punya beberapa variasi
+TTL_SECONDS = int(os.getenv("MOTIVATION_CACHE_TTL", str(7 * 24 * 3600)))
+POOL_SIZE = int(os.getenv("MOTIVATION_POOL_SIZE", "3"))
+MAX_ENTRIES = 512
+
+# summary_key -> {"theme", "dalil", "variants", "created_at"}
+_cache = TTLCache(maxsize=MAX_ENTRIES, ttl=TTL_SECONDS)
+_locks = {}
+
+def normalize_summary(summary: str) -> str:
+    return " ".join(summary.split()).lower()
+
+def _is_fresh(entry: dict) -> bool:
+    return time.time() - entry["created_at"] < TTL_SECONDS
+
+def new_entry() -> dict:
+    return {"theme": None, "dalil": None, "variants": [], "created_at": time.time()}
+
+def is_pool_full(entry: dict) -> bool:
+    return entry is not None and len(entry["variants"]) >= POOL_SIZE
+
+async def get(summary: str):
+    """Entri yang masih berlaku untuk ringkasan ini (memori, lalu SQLite), atau None."""
+    key = normalize_summary(summary)
+    entry = _cache.get(key)
+    if entry is None:
+        row = await db_async.get_motivation_cache(key)
+        if not row: return None
+        entry = {"theme": row["theme"], "dalil": json.loads(row["dalil"]) if row["dalil"] else None,
+                 "variants": json.loads(row["variants"] or "[]"), "created_at": row["created_at"]}
+    if not _is_fresh(entry):
+        _cache.pop(key, None); return None
+    _cache[key] = entry
+    return entry
+
+async def save(summary: str, entry: dict):
+    key = normalize_summary(summary)
+    _cache[key] = entry
+    await db_async.save_motivation_cache(key, entry["theme"], json.dumps(entry["dalil"]) if entry["dalil"] else None,
+                                         json.dumps(entry["variants"]), entry["created_at"])
+
+def lock(summary: str) -> asyncio.Lock:
+    """Satu lock per ringkasan agar pengisian pool tidak memicu panggilan AI ganda untuk kunci yang sama."""
+    return _locks.setdefault(normalize_summary(summary), asyncio.Lock())
+
+async def purge_expired(context=None):
+    """Job harian: membuang entri kedaluwarsa dari SQLite (memori sudah diurus TTLCache) dan lock yang menganggur."""
+    if not any(key_lock.locked() for key_lock in _locks.values()):
+        _locks.clear()
+    await db_async.delete_expired_motivation_cache(time.time() - TTL_SECONDS)
@@ -0,0 +1,168 @@
+# File: prayer_calculator.py
+import numpy as np
+from datetime import date, timedelta
+
+# Parameter Kemenag RI
+FAJR_ANGLE = 20.0      # Subuh: matahari 20 derajat di bawah ufuk
+ISHA_ANGLE = 18.0      # Isya: matahari 18 derajat di bawah ufuk
+DHUHA_ALTITUDE = 4.5   # Dhuha: matahari 4,5 derajat di atas ufuk
+SUNRISE_ALTITUDE = -0.833  # Terbit/terbenam dengan koreksi refraksi dan jari-jari matahari
+ASR_SHADOW_FACTOR = 1  # Ashar madzhab Syafi'i
+IHTIYAT_MINUTES = 2    # Ihtiyat (kehati-hatian) untuk semua waktu, terbit dikurangi
+IMSAK_MINUTES = 10     # Imsak 10 menit sebelum Subuh
+
+PRAYER_KEYS = ["imsak", "subuh", "terbit", "dhuha", "dzuhur", "ashar", "maghrib", "isya"]
+NAMA_HARI = ["Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu"]
+
+# nama kota (sudah dinormalisasi) -> (lintang, bujur, zona waktu UTC, provinsi)
+KOORDINAT_KOTA = {
+    "banda aceh": (5.5483, 95.3238, 7, "ACEH"),
+    "medan": (3.5952, 98.6722, 7, "SUMATERA UTARA"),
+    "padang": (-0.9471, 100.4172, 7, "SUMATERA BARAT"),
+    "pekanbaru": (0.5071, 101.4478, 7, "RIAU"),
+    "batam": (1.0456, 104.0305, 7, "KEPULAUAN RIAU"),
+    "tanjung pinang": (0.9186, 104.4554, 7, "KEPULAUAN RIAU"),
+    "jambi": (-1.6101, 103.6131, 7, "JAMBI"),
+    "bengkulu": (-3.8004, 102.2655, 7, "BENGKULU"),
+    "palembang": (-2.9761, 104.7754, 7, "SUMATERA SELATAN"),
+    "pangkal pinang": (-2.1316, 106.1169, 7, "KEPULAUAN BANGKA BELITUNG"),
+    "bandar lampung": (-5.3971, 105.2668, 7, "LAMPUNG"),
+    "serang": (-6.1200, 106.1503, 7, "BANTEN"),
+    "tangerang": (-6.1783, 106.6319, 7, "BANTEN"),
+    "jakarta": (-6.1754, 106.8272, 7, "DKI JAKARTA"),
+    "bekasi": (-6.2383, 106.9756, 7, "JAWA BARAT"),
+    "depok": (-6.4025, 106.7942, 7, "JAWA BARAT"),
+    "bogor": (-6.5971, 106.8060, 7, "JAWA BARAT"),
+    "bandung": (-6.9175, 107.6191, 7, "JAWA BARAT"),
+    "semarang": (-6.9667, 110.4167, 7, "JAWA TENGAH"),
+    "surakarta": (-7.5755, 110.8243, 7, "JAWA TENGAH"),
+    "solo": (-7.5755, 110.8243, 7, "JAWA TENGAH"),
+    "yogyakarta": (-7.7956, 110.3695, 7, "DI YOGYAKARTA"),
+    "jogja": (-7.7956, 110.3695, 7, "DI YOGYAKARTA"),
+    "surabaya": (-7.2575, 112.7521, 7, "JAWA TIMUR"),
+    "malang": (-7.9666, 112.6326, 7, "JAWA TIMUR"),
+    "pontianak": (-0.0263, 109.3425, 7, "KALIMANTAN BARAT"),
+    "palangka raya": (-2.2161, 113.9135, 7, "KALIMANTAN TENGAH"),
+    "banjarmasin": (-3.3186, 114.5944, 8, "KALIMANTAN SELATAN"),
+    "samarinda": (-0.5022, 117.1536, 8, "KALIMANTAN TIMUR"),
+    "balikpapan": (-1.2379, 116.8529, 8, "KALIMANTAN TIMUR"),
+    "tanjung selor": (2.8375, 117.3653, 8, "KALIMANTAN UTARA"),
+    "denpasar": (-8.6705, 115.2126, 8, "BALI"),
+    "mataram": (-8.5833, 116.1167, 8, "NUSA TENGGARA BARAT"),
+    "kupang": (-10.1772, 123.6070, 8, "NUSA TENGGARA TIMUR"),
+    "makassar": (-5.1477, 119.4327, 8, "SULAWESI SELATAN"),
+    "mamuju": (-2.6748, 118.8885, 8, "SULAWESI BARAT"),
+    "palu": (-0.8917, 119.8707, 8, "SULAWESI TENGAH"),
+    "kendari": (-3.9985, 122.5127, 8, "SULAWESI TENGGARA"),
+    "gorontalo": (0.5435, 123.0568, 8, "GORONTALO"),
+    "manado": (1.4748, 124.8421, 8, "SULAWESI UTARA"),
+    "ambon": (-3.6954, 128.1814, 9, "MALUKU"),
+    "ternate": (0.7893, 127.3773, 9, "MALUKU UTARA"),
+    "sorong": (-0.8762, 131.2558, 9, "PAPUA BARAT DAYA"),
+    "manokwari": (-0.8615, 134.0620, 9, "PAPUA BARAT"),
+    "jayapura": (-2.5916, 140.6690, 9, "PAPUA"),
+}
+
+# Jam di jadwal selalu waktu setempat; zona ini dipakai untuk mengubahnya ke waktu absolut (mis. untuk JobQueue)
+DEFAULT_UTC_OFFSET = 7
+ZONE_NAMES = {7: "WIB", 8: "WITA", 9: "WIT"}
+# provinsi (kolom 'daerah' MyQuran) -> zona waktu UTC; satu provinsi selalu berada di satu zona
+PROVINCE_UTC_OFFSETS = {province: timezone for _, _, timezone, province in KOORDINAT_KOTA.values()}
+PROVINCE_UTC_OFFSETS.update({"PAPUA TENGAH": 9, "PAPUA SELATAN": 9, "PAPUA PEGUNUNGAN": 9})
+
+def get_utc_offset(province: str) -> int:
+    """Zona waktu (jam dari UTC) untuk nama provinsi, default WIB jika tidak dikenal."""
+    if not isinstance(province, str):
+        return DEFAULT_UTC_OFFSET
+    return PROVINCE_UTC_OFFSETS.get(" ".join(province.split()).upper(), DEFAULT_UTC_OFFSET)
+
+def get_city_coordinates(city: str):
+    """Mengembalikan (lintang, bujur, zona waktu, provinsi) untuk nama kota, atau None jika tidak dikenal."""
+    if not isinstance(city, str):
+        return None
+    city_key = " ".join(city.split()).lower()
+    if city_key.startswith("kota "):
+        city_key = city_key[len("kota "):]
+    return KOORDINAT_KOTA.get(city_key)
+
+def _hour_angle(altitude, latitude, declination):
+    """Sudut jam (dalam jam) saat matahari mencapai ketinggian tertentu. NaN jika tidak pernah tercapai."""
+    cos_h = (np.sin(altitude) - np.sin(latitude) * np.sin(declination)) / (np.cos(latitude) * np.cos(declination))
+    with np.errstate(invalid="ignore"):
+        return np.degrees(np.arccos(cos_h)) / 15.0
+
+def compute_prayer_times(latitudes, longitudes, timezones, dates) -> dict:
+    """
+    Menghitung waktu sholat untuk banyak kota dan banyak tanggal sekaligus.
+    latitudes/longitudes/timezones berbentuk (n_kota,), dates berisi objek date (n_hari,).
+    Hasil: dict nama waktu -> array (n_kota, n_hari) berisi menit sejak tengah malam waktu lokal.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))[:, None]
+    lon = np.asarray(longitudes, dtype=float)[:, None]
+    tz = np.asarray(timezones, dtype=float)[:, None]
+    # Hari sejak J2000.0 pada pukul 12:00 waktu lokal tiap kota
+    days = np.array([(d - date(2000, 1, 1)).days for d in dates], dtype=float)[None, :]
+    d = days + (12.0 - tz) / 24.0
+
+    # Posisi matahari (algoritma ringkas U.S. Naval Observatory)
+    g = np.radians((357.529 + 0.98560028 * d) % 360)
+    q = (280.459 + 0.98564736 * d) % 360
+    ecliptic_lon = np.radians((q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g)) % 360)
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+    right_ascension = (np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecliptic_lon), np.cos(ecliptic_lon))) / 15.0) % 24
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecliptic_lon))
+    equation_of_time = q / 15.0 - right_ascension
+    equation_of_time = (equation_of_time + 12) % 24 - 12
+
+    dzuhur = 12.0 + tz - lon / 15.0 - equation_of_time
+    sunrise_angle = _hour_angle(np.radians(SUNRISE_ALTITUDE), lat, declination)
+    asr_altitude = np.arctan(1.0 / (ASR_SHADOW_FACTOR + np.tan(np.abs(lat - declination))))
+
+    hours = {
+        "subuh": dzuhur - _hour_angle(np.radians(-FAJR_ANGLE), lat, declination),
+        "terbit": dzuhur - sunrise_angle,
+        "dhuha": dzuhur - _hour_angle(np.radians(DHUHA_ALTITUDE), lat, declination),
+        "dzuhur": dzuhur,
+        "ashar": dzuhur + _hour_angle(asr_altitude, lat, declination),
+        "maghrib": dzuhur + sunrise_angle,
+        "isya": dzuhur + _hour_angle(np.radians(-ISHA_ANGLE), lat, declination),
+    }
+
+    times = {}
+    for key, value in hours.items():
+        minutes = value * 60.0
+        # Ihtiyat: terbit dimajukan dan dibulatkan ke bawah, waktu lainnya dimundurkan dan dibulatkan ke atas
+        if key == "terbit":
+            times[key] = np.floor(minutes - IHTIYAT_MINUTES)
+        else:
+            times[key] = np.ceil(minutes + IHTIYAT_MINUTES)
+    times["imsak"] = times["subuh"] - IMSAK_MINUTES
+    return {key: times[key] for key in PRAYER_KEYS}
+
+def compute_year(cities: list, year: int) -> dict:
+    """Menghitung jadwal setahun penuh untuk daftar kota yang dikenal dalam satu batch."""
+    known = [city for city in cities if get_city_coordinates(city)]
+    coordinates = [get_city_coordinates(city) for city in known]
+    start = date(year, 1, 1)
+    dates = [start + timedelta(days=i) for i in range((date(year + 1, 1, 1) - start).days)]
+    times = compute_prayer_times([c[0] for c in coordinates], [c[1] for c in coordinates], [c[2] for c in coordinates], dates)
+    return {"cities": known, "dates": dates, "times": times}
+
+def format_minutes(minutes) -> str:
+    """Mengubah menit sejak tengah malam menjadi 'HH:MM'."""
+    if minutes is None or np.isnan(minutes):
+        return "-"
+    minutes = int(minutes) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def get_jadwal(city: str, day: date):
+    """Menghitung jadwal satu hari dalam format respons API MyQuran, atau None jika koordinat kota tidak dikenal."""
+    coordinates = get_city_coordinates(city)
+    if not coordinates:
+        return None
+    latitude, longitude, timezone, province = coordinates
+    times = compute_prayer_times([latitude], [longitude], [timezone], [day])
+    jadwal = {key: format_minutes(times[key][0, 0]) for key in PRAYER_KEYS}
+    jadwal['tanggal'] = f"{NAMA_HARI[day.weekday()]}, {day.strftime('%d/%m/%Y')}"
+    jadwal['date'] = day.strftime("%Y-%m-%d")
+    return {"id": None, "lokasi": " ".join(city.split()).upper(), "daerah": province, "utc_offset": timezone, "jadwal": jadwal}
@@ -1,58 +1,196 @@
 # File: prayer_handler.py (Versi Upgrade API MyQuran)
 
-import requests
-from datetime import datetime
+import os
+import asyncio
+import calendar
+from datetime import datetime, timedelta, timezone
 import pytz
+from cachetools import LRUCache
+import http_client
+import db_handler as db
+import db_async
+import prayer_calculator
 from utils import escape_markdown_v2
 
 WIB = pytz.timezone('Asia/Jakarta')
-BASE_URL = "https://api.myquran.com/v2"
+BASE_URL = os.getenv("MYQURAN_BASE_URL", "https://api.myquran.com/v2")
 
-def get_city_id(city: str):
-    """Mencari ID kota di API MyQuran."""
+# Kota yang tidak ditemukan dicoba lagi setelah sekian hari
+NEGATIVE_CACHE_DAYS = 7
+# Cache in-process: city_key -> (city_id atau None, updated_at)
+_city_id_cache = LRUCache(maxsize=1024)
+# Lock pencarian ID kota per city_key dan pengambilan jadwal bulanan per (city_id, 'YYYY-MM')
+_city_lookup_locks = {}
+_month_fetch_locks = {}
+# Bila jadwal hari ini belum ada di store: tunggu API sebentar, lalu pakai jadwal tersimpan terakhir (maks. STALE_MAX_DAYS hari)
+# sementara pengambilan tetap berjalan di latar belakang
+STALE_WAIT_SECONDS = float(os.getenv("PRAYER_STALE_WAIT_SECONDS", "3"))
+STALE_MAX_DAYS = 7
+_background_fetches = set()
+
+def normalize_city_name(city: str) -> str:
+    """Menyeragamkan nama kota agar 'Jakarta ' dan 'jakarta' memakai entri cache yang sama."""
+    return " ".join(city.split()).lower() if isinstance(city, str) else ""
+
+def _is_cache_entry_valid(city_id, updated_at: str) -> bool:
+    if city_id is not None:
+        return True  # ID kota tidak pernah berubah
     try:
-        response = requests.get(f"{BASE_URL}/sholat/kota/cari/{city}")
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] and data['data']:
-            # Ambil ID dari hasil pertama
-            return data['data'][0]['id']
+        cached_at = datetime.strptime(updated_at, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return False
+    return datetime.now() - cached_at < timedelta(days=NEGATIVE_CACHE_DAYS)
+
+async def _get_cached_city_id(city_key: str):
+    """Mengembalikan (True, city_id) bila ada entri cache yang masih berlaku."""
+    cached = _city_id_cache.get(city_key)
+    if cached is None:
+        row = await db_async.get_cached_city_id(city_key)
+        if row:
+            cached = (row['city_id'], row['updated_at'])
+            _city_id_cache[city_key] = cached
+    if cached is not None and _is_cache_entry_valid(*cached):
+        return True, cached[0]
+    return False, None
+
+async def get_city_id(city: str):
+    """Mencari ID kota, memakai cache LRU dan tabel city_cache sebelum API MyQuran."""
+    city_key = normalize_city_name(city)
+    if not city_key:
         return None
+
+    found, city_id = await _get_cached_city_id(city_key)
+    if found:
+        return city_id
+    # Pencarian bersamaan untuk kota yang sama cukup memakai satu request
+    lock = _city_lookup_locks.setdefault(city_key, asyncio.Lock())
+    async with lock:
+        found, city_id = await _get_cached_city_id(city_key)
+        if not found:
+            city_id = await _fetch_city_id(city_key)
+    _city_lookup_locks.pop(city_key, None)
+    return city_id
+
+async def _fetch_city_id(city_key: str):
+    try:
+        data = await http_client.get_json(f"{BASE_URL}/sholat/kota/cari/{city_key}", endpoint="myquran/kota")
     except Exception as e:
+        # Error jaringan tidak disimpan sebagai cache negatif
         print(f"Error saat mencari ID kota: {e}")
         return None
 
-def get_prayer_times_raw(city: str):
-    """Mengambil data jadwal sholat mentah dari API MyQuran."""
-    city_id = get_city_id(city)
-    if not city_id:
-        return None
-    
-    today = datetime.now()
+    # Ambil ID dari hasil pertama, None jika kota tidak ditemukan
+    city_id = data['data'][0]['id'] if data.get('status') and data.get('data') else None
+    updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    await db_async.save_cached_city_id(city_key, city_id, updated_at)
+    _city_id_cache[city_key] = (city_id, updated_at)
+    return city_id
+
+async def fetch_month_schedule(city_id: str, year: int, month: int) -> bool:
+    """Mengambil jadwal satu bulan penuh dari API MyQuran dan menyimpannya ke tabel prayer_schedules."""
     try:
-        url = f"{BASE_URL}/sholat/jadwal/{city_id}/{today.year}/{today.month}/{today.day}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] and data['data']:
-            return data['data']
-        return None
+        data = await http_client.get_json(f"{BASE_URL}/sholat/jadwal/{city_id}/{year}/{month}", endpoint="myquran/jadwal")
     except Exception as e:
-        print(f"Error saat mengambil jadwal sholat: {e}")
+        print(f"Error saat mengambil jadwal sholat bulanan: {e}")
+        return False
+    if not (data.get('status') and data.get('data') and data['data'].get('jadwal')):
+        return False
+    lokasi, daerah = data['data'].get('lokasi'), data['data'].get('daerah')
+    schedules = [dict(jadwal, lokasi=lokasi, daerah=daerah) for jadwal in data['data']['jadwal'] if jadwal.get('date')]
+    await db_async.save_prayer_schedules(city_id, schedules)
+    return bool(schedules)
+
+async def ensure_month_schedule(city_id: str, year: int, month: int) -> bool:
+    """Memastikan jadwal satu bulan sudah ada di store. Jaringan hanya dipakai untuk bulan yang belum lengkap."""
+    month_prefix = f"{year:04d}-{month:02d}"
+    days_in_month = calendar.monthrange(year, month)[1]
+    if await db_async.count_prayer_schedule_days(city_id, month_prefix) >= days_in_month:
+        return True
+    # Satu lock per (kota, bulan) agar ribuan pengguna di kota yang sama hanya memicu satu request
+    lock_key = (str(city_id), month_prefix)
+    lock = _month_fetch_locks.setdefault(lock_key, asyncio.Lock())
+    async with lock:
+        # Pemanggil yang menunggu cukup memakai hasil pengambilan sebelumnya
+        if lock_key not in _month_fetch_locks:
+            return await db_async.count_prayer_schedule_days(city_id, month_prefix) > 0
+        result = await fetch_month_schedule(city_id, year, month)
+    _month_fetch_locks.pop(lock_key, None)
+    return result
+
+async def prefetch_schedules(cities: list, year: int, month: int):
+    """Mengisi store jadwal satu bulan untuk setiap kota unik dalam daftar."""
+    city_ids = set()
+    for city in cities:
+        if prayer_calculator.get_city_coordinates(city):
+            continue  # Dihitung lokal, tidak perlu disimpan
+        city_id = await get_city_id(city)
+        if city_id:
+            city_ids.add(str(city_id))
+    results = await asyncio.gather(*(ensure_month_schedule(city_id, year, month) for city_id in city_ids))
+    return sum(1 for ok in results if ok), len(city_ids)
+
+def _schedule_row_to_data(row: dict) -> dict:
+    """Mengubah baris prayer_schedules ke bentuk respons API MyQuran ('jadwal' berisi waktu sholat)."""
+    jadwal = {field: row[field] for field in db.PRAYER_SCHEDULE_FIELDS if field not in ("lokasi", "daerah")}
+    jadwal['date'] = row['date']
+    return {"id": row['city_id'], "lokasi": row['lokasi'], "daerah": row['daerah'], "utc_offset": prayer_calculator.get_utc_offset(row['daerah']), "jadwal": jadwal}
+
+def get_local_timezone(data: dict):
+    """Zona waktu setempat (WIB/WITA/WIT) dari data jadwal; jam-jam di 'jadwal' berlaku di zona ini."""
+    return timezone(timedelta(hours=data.get('utc_offset', prayer_calculator.DEFAULT_UTC_OFFSET)))
+
+async def get_prayer_times_raw(city: str, date=None):
+    """
+    Mengambil jadwal sholat satu hari. Kota yang koordinatnya dikenal dihitung secara lokal,
+    selebihnya dari store yang diisi sebulan penuh dari API MyQuran bila belum ada.
+    """
+    date = date or datetime.now(WIB).date()
+    local_data = prayer_calculator.get_jadwal(city, date)
+    if local_data:
+        return local_data
+
+    city_id = await get_city_id(city)
+    if not city_id:
         return None
 
+    date_str = date.strftime("%Y-%m-%d")
+    row = await db_async.get_prayer_schedule(city_id, date_str)
+    if row:
+        return _schedule_row_to_data(row)
+
+    fetch = asyncio.create_task(ensure_month_schedule(city_id, date.year, date.month))
+    _background_fetches.add(fetch); fetch.add_done_callback(_background_fetches.discard)
+    stale_from = (date - timedelta(days=STALE_MAX_DAYS)).strftime("%Y-%m-%d")
+    stale_row = await db_async.get_latest_prayer_schedule(city_id, date_str, stale_from)
+    try:
+        # Tanpa cadangan tunggu sampai selesai; dengan cadangan, API yang lambat/mati tidak ditunggu lama
+        fetched = await (asyncio.wait_for(asyncio.shield(fetch), STALE_WAIT_SECONDS) if stale_row else fetch)
+    except TimeoutError:
+        fetched = False  # Pengambilan tetap berjalan, hasilnya dipakai permintaan berikutnya
+    if fetched:
+        row = await db_async.get_prayer_schedule(city_id, date_str)
+    if not row and stale_row:
+        return dict(_schedule_row_to_data(stale_row), stale=True)
+    return _schedule_row_to_data(row) if row else None
+
 def format_prayer_times(city: str, data: dict):
     """Memformat data jadwal sholat menjadi teks yang rapi dan aman."""
     jadwal = data['jadwal']
     safe_city = escape_markdown_v2(city)
     safe_date = escape_markdown_v2(jadwal.get('tanggal'))
-    current_time = datetime.now(WIB).strftime("%H:%M:%S")
+    utc_offset = data.get('utc_offset', prayer_calculator.DEFAULT_UTC_OFFSET)
+    current_time = datetime.now(get_local_timezone(data)).strftime("%H:%M:%S")
+    zone_name = prayer_calculator.ZONE_NAMES.get(utc_offset, f"UTC+{utc_offset}")
+    # Jadwal hari terakhir yang tersimpan (API sedang tidak bisa diakses); selisihnya hanya beberapa menit, tanggalnya tetap disebut
+    stale_date = escape_markdown_v2(jadwal.get('date') or jadwal.get('tanggal') or '-')
+    stale_note = f"⚠️ _Jadwal hari ini belum bisa diambil, menampilkan jadwal tersimpan tanggal {stale_date}_\n" if data.get('stale') else ""
     
     # Sesuaikan nama kunci dengan respons API MyQuran
     return (
         f"🕋 *Jadwal Sholat untuk {safe_city}*\n"
         f"🗓️ Tanggal: {safe_date}\n"
-        f"🕰️ Waktu Sekarang: `{current_time}` WIB\n\n"
+        f"{stale_note}"
+        f"🕰️ Waktu Sekarang: `{current_time}` {escape_markdown_v2(zone_name)}\n\n"
         f"**Imsak:** `{jadwal.get('imsak', '-')}`\n"
         f"**Subuh:** `{jadwal.get('subuh', '-')}`\n"
         f"**Terbit:** `{jadwal.get('terbit', '-')}`\n"
@@ -63,9 +201,9 @@ def format_prayer_times(city: str, data: dict):
         f"**Isya:** `{jadwal.get('isya', '-')}`"
     )
 
-def get_prayer_times(city: str, country: str = "Indonesia"):
+async def get_prayer_times(city: str, country: str = "Indonesia"):
     """Fungsi utama untuk mendapatkan teks jadwal sholat yang sudah diformat."""
-    data = get_prayer_times_raw(city)
+    data = await get_prayer_times_raw(city)
     if data:
         return format_prayer_times(city, data)
     return escape_markdown_v2(f"Maaf, tidak dapat menemukan jadwal sholat untuk kota '{city}'.")
\ No newline at end of file
@@ -1,53 +1,137 @@
 # File: scripture_handler.py (Versi Upgrade API MyQuran)
 
 import os
-import requests
 import random
+import asyncio
+from functools import partial
+from cachetools import TLRUCache, LRUCache
+import http_client
+import db_async
+import scripture_index
 
-BASE_URL = "https://api.myquran.com/v2"
+BASE_URL = os.getenv("MYQURAN_BASE_URL", "https://api.myquran.com/v2")
+NARRATORS = ["bukhari", "muslim", "abu-daud", "tirmidzi", "nasai", "ibnu-majah"]
+HADITH_FETCH_LIMIT = 10
 
-def search_quran(keyword: str):
-    """Mencari ayat Qur'an, mengambil terjemahan DAN teks Arab."""
+# Hasil lengkap API per (sumber, kata kunci) disimpan di memori; pemilihan acak dilakukan lokal dari hasil tersebut.
+# Hasil kosong juga disimpan (lebih singkat) agar kata kunci yang tidak ada hasilnya tidak ditanyakan berulang.
+RESULT_TTL = int(os.getenv("SCRIPTURE_CACHE_TTL", str(24 * 3600)))
+EMPTY_RESULT_TTL = int(os.getenv("SCRIPTURE_EMPTY_CACHE_TTL", str(3600)))
+# Batas memori dalam jumlah ayat/hadis tersimpan (bukan jumlah kata kunci); satu kata kunci paling banyak MAX_RESULTS_PER_KEY
+MAX_CACHED_RESULTS = int(os.getenv("SCRIPTURE_CACHE_SIZE", "5000"))
+MAX_RESULTS_PER_KEY = 50
+
+def _time_to_use(key, results, now):
+    return now + (RESULT_TTL if results else EMPTY_RESULT_TTL)
+
+_results = TLRUCache(maxsize=MAX_CACHED_RESULTS, ttu=_time_to_use, getsizeof=lambda results: max(1, len(results)))
+# Hasil terakhir yang berhasil diambil (tanpa TTL): dipakai saat entri di atas kedaluwarsa sambil diperbarui di latar belakang
+_last_good = LRUCache(maxsize=MAX_CACHED_RESULTS, getsizeof=lambda results: max(1, len(results)))
+_refreshing = {}
+
+def _normalize(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+def _network_keyword(text: str) -> str:
+    """API MyQuran mencocokkan frasa utuh: dari pertanyaan panjang, kirim satu kata penting saja."""
+    words = scripture_index.keywords(text)
+    return random.choice(words) if len(words) > 1 else (words[0] if words else text)
+
+def _store(key, results: list) -> list:
+    if len(results) > MAX_RESULTS_PER_KEY: results = random.sample(results, MAX_RESULTS_PER_KEY)
+    _results[key] = _last_good[key] = results
+    return results
+
+async def _refresh(key, fetch):
     try:
-        response = requests.get(f"{BASE_URL}/quran/ayat/keyword/{keyword}/terjemah/semua")
-        response.raise_for_status()
-        data = response.json()
-        if data['status'] and data['data']:
-            ayat = random.choice(data['data'])
-            teks_indonesia = ayat['terjemah']['teks']
-            teks_arab = ayat['teks']['arab'] # <-- Mengambil teks Arab
-            surat = ayat['surat']['nama']['id']
-            nomor_ayat = ayat['nomor']
-            return {
-                "text": teks_indonesia,
-                "arabic": teks_arab, # <-- Menambahkan teks Arab ke output
-                "reference": f"QS. {surat}: {nomor_ayat}"
-            }
-        return None
+        _store(key, await fetch())
+    except Exception as e:
+        print(f"Gagal memperbarui cache dalil {key}: {e}")
+    finally:
+        _refreshing.pop(key, None)
+
+def _peek(source: str, keyword: str, fetch):
+    """
+    Hasil tersimpan tanpa menunggu jaringan: yang masih segar, atau hasil lama terakhir (stale-while-revalidate)
+    sambil fetch() dijalankan di latar belakang. None jika kata kunci ini belum pernah berhasil diambil.
+    """
+    key = (source, _normalize(keyword))
+    results = _results.get(key)
+    if results is None:
+        results = _last_good.get(key)
+        if results is not None and key not in _refreshing:
+            _refreshing[key] = asyncio.get_running_loop().create_task(_refresh(key, fetch))
+    return results
+
+async def _cached_results(source: str, keyword: str, fetch):
+    """Hasil untuk (sumber, kata kunci) dari cache, atau dari fetch() lalu disimpan. Error jaringan tidak disimpan."""
+    results = _peek(source, keyword, fetch)
+    if results is None:
+        results = _store((source, _normalize(keyword)), await fetch())
+    return results
+
+async def _fetch_quran(keyword: str) -> list:
+    data = await http_client.get_json(f"{BASE_URL}/quran/ayat/keyword/{keyword}/terjemah/semua", endpoint="myquran/quran")
+    if not (data['status'] and data['data']): return []
+    return [{
+        "text": ayat['terjemah']['teks'],
+        "arabic": ayat['teks']['arab'], # <-- Teks Arab ikut disimpan
+        "reference": f"QS. {ayat['surat']['nama']['id']}: {ayat['nomor']}"
+    } for ayat in data['data']]
+
+async def search_quran(keyword: str):
+    """Mencari ayat Qur'an, mengambil terjemahan DAN teks Arab. Indeks lokal dulu, API MyQuran (dengan cache) sebagai cadangan."""
+    hits = await db_async.run(scripture_index.search_quran, keyword)  # Query FTS5 di thread DB, bukan di event loop
+    if hits:
+        ayat = random.choice(hits)
+        return {"text": ayat["text"], "arabic": ayat["arabic"], "reference": f"QS. {ayat['surah']}: {ayat['ayah']}"}
+    keyword = _network_keyword(keyword)
+    try:
+        results = await _cached_results("quran", keyword, partial(_fetch_quran, keyword))
+        return random.choice(results) if results else None
     except Exception as e:
         print(f"Error saat mencari Qur'an (MyQuran): {e}")
         return None
 
-def search_hadith(keyword: str):
-    """Mencari hadis dalam Bahasa Indonesia dari beberapa perawi."""
-    # Daftar perawi prioritas untuk dicari
-    narrators = ["bukhari", "muslim", "abu-daud", "tirmidzi", "nasai", "ibnu-majah"]
-    random.shuffle(narrators) # Acak urutan agar tidak monoton
-
-    for narrator in narrators:
-        try:
-            # Cari 5 hadis dan pilih salah satu secara acak
-            url = f"{BASE_URL}/hadits/{narrator}/cari?q={keyword}&limit=5"
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            if data['status'] and data['data']['hadits']:
-                hadith = random.choice(data['data']['hadits'])
-                teks = hadith['terjemah']
-                nomor = hadith['nomor']
-                return {"text": teks, "reference": f"HR. {narrator.capitalize()} No. {nomor}"}
-        except Exception as e:
-            print(f"Error saat mencari Hadis {narrator}: {e}")
-            continue # Jika gagal, coba perawi selanjutnya
-            
-    return None # Jika tidak ditemukan sama sekali
\ No newline at end of file
+async def _fetch_hadith(narrator: str, keyword: str) -> list:
+    url = f"{BASE_URL}/hadits/{narrator}/cari"
+    data = await http_client.get_json(url, params={"q": keyword, "limit": HADITH_FETCH_LIMIT}, endpoint=f"myquran/hadits/{narrator}")
+    if not (data['status'] and data['data']['hadits']): return []
+    return [{"text": hadith['terjemah'], "reference": f"HR. {narrator.capitalize()} No. {hadith['nomor']}"} for hadith in data['data']['hadits']]
+
+async def _search_hadith_narrator(narrator: str, keyword: str):
+    """Satu perawi (cache, lalu API). None jika tidak ada hasil atau gagal."""
+    try:
+        results = await _cached_results(narrator, keyword, partial(_fetch_hadith, narrator, keyword))
+        return random.choice(results) if results else None
+    except Exception as e:
+        print(f"Error saat mencari Hadis {narrator}: {e}")
+    return None
+
+async def search_hadith(keyword: str):
+    """Mencari hadis dalam Bahasa Indonesia dari beberapa perawi. Indeks lokal dulu, API MyQuran (dengan cache) sebagai cadangan."""
+    hits = await db_async.run(scripture_index.search_hadith, keyword)
+    if hits:
+        hadith = random.choice(hits)
+        return {"text": hadith["text"], "reference": f"HR. {hadith['narrator'].capitalize()} No. {hadith['number']}"}
+    keyword = _network_keyword(keyword)
+
+    # Perawi yang hasilnya sudah tersimpan dilayani tanpa jaringan; hanya yang belum diketahui yang ditanyakan ke API
+    cached = {narrator: _peek(narrator, keyword, partial(_fetch_hadith, narrator, keyword)) for narrator in NARRATORS}
+    known_hits = [narrator for narrator, results in cached.items() if results]
+    if known_hits:
+        return random.choice(cached[random.choice(known_hits)])
+    unknown = [narrator for narrator, results in cached.items() if results is None]
+
+    # Semua perawi ditanya bersamaan; hasil pertama yang ada isinya dipakai, sisanya dibatalkan
+    tasks = [asyncio.create_task(_search_hadith_narrator(narrator, keyword)) for narrator in unknown]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            if result: return result
+    finally:
+        for task in tasks: task.cancel()
+    return None # Jika tidak ditemukan sama sekali
+
+def get_cache_stats() -> dict:
+    return {"keys": len(_results), "results": _results.currsize, "last_good_keys": len(_last_good), "refreshing": len(_refreshing)}
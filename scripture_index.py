@@ -0,0 +1,187 @@
+# File: scripture_index.py
+"""
+Indeks full-text lokal (SQLite FTS5) untuk terjemahan Al-Qur'an dan hadis.
+
+Impor sekali dari file JSON lokal:
+    python scripture_index.py quran data/quran.json
+    python scripture_index.py hadith bukhari data/bukhari.json
+Setelah terisi, scripture_handler mencari di sini dulu dan hanya memakai API MyQuran bila indeks kosong/tidak ada hasil.
+Fungsi pencarian di sini sinkron; scripture_handler menjalankannya di thread DB (db_async), bukan di event loop.
+"""
+import os
+import re
+import json
+import sqlite3
+import argparse
+import threading
+
+INDEX_DB = os.getenv("SCRIPTURE_INDEX_DB", "scripture_index.db")
+# Jumlah hasil teratas (berdasarkan bm25) yang dikembalikan; pemanggil memilih acak di antaranya
+DEFAULT_LIMIT = 5
+MIN_STEM_LENGTH = 3
+# Kata yang muncul di lebih dari porsi dokumen ini (mis. "allah") hampir tidak berbobot di bm25 tapi membuat query lambat
+COMMON_TERM_RATIO = 0.2
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda apa apakah atas atau bagaimana bagi bahwa banyak barang begitu belum beliau berapa bisa boleh
+bukan cara dalam dan dapat dari demikian dengan di dia engkau hal hanya harus ia ialah ingin ini itu jadi jika juga kalau
+kami kamu kan karena ke kenapa kepada kita lagi lah maka mana mau melakukan mengapa mereka mohon nya oleh pada para perlu
+saat saja sama sampai sangat saya se sebagai sebuah sedang sehingga sekali seorang seperti serta sesuatu setelah sudah
+supaya tanya tapi telah tentang tersebut tetapi tidak tolong untuk ustadz ya yaitu yakni yang
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("lah", "pun", "nya", "ku", "mu", "kan", "an")
+# (prefiks, huruf awal kata dasar yang dikembalikan); urutan penting: yang lebih panjang dulu
+_PREFIXES = (("meny", "s"), ("peny", "s"), ("meng", ""), ("peng", ""), ("mem", "p"), ("pem", "p"), ("men", "t"), ("pen", "t"),
+             ("ber", ""), ("ter", ""), ("per", ""), ("me", ""), ("pe", ""), ("di", ""), ("ke", ""))
+
+_local = threading.local()
+
+def _strip_prefix(word: str) -> str:
+    for prefix, restore in _PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM_LENGTH:
+            rest = word[len(prefix):]
+            if prefix in ("mem", "pem") and rest[0] in "bp": return rest  # memberi -> beri
+            if prefix in ("men", "pen") and rest[0] in "cdjz": return rest  # mencari -> cari
+            if restore and rest[0] in "aiueo": return restore + rest  # menyembah -> sembah, menulis -> tulis
+            if restore: continue
+            return rest
+    return word
+
+def stem(word: str) -> str:
+    """Stemmer ringan Bahasa Indonesia (partikel, akhiran, awalan umum). Dipakai sama persis saat impor dan saat mencari."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH + 1:
+            word = word[:-len(suffix)]
+            break
+    return _strip_prefix(word)
+
+def keywords(text: str) -> list:
+    """Kata penting dari teks (huruf kecil, tanpa stopword), urutan asli tanpa duplikat."""
+    return list(dict.fromkeys(token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS and len(token) > 2))
+
+def _terms(text: str) -> str:
+    return " ".join(stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS)
+
+def _match_query(conn, corpus: str, text: str):
+    """
+    Query FTS5: kata dasar yang informatif digabung OR (bm25 yang mengurutkan relevansi).
+    Kata yang tidak ada di korpus dibuang; kata yang terlalu umum dibuang kecuali hanya itu yang tersisa. None jika tidak ada kata.
+    """
+    stems = list(dict.fromkeys(stem(word) for word in keywords(text)))
+    if not stems: return None
+    total = conn.execute("SELECT docs FROM corpus_stats WHERE corpus = ?", (corpus,)).fetchone()
+    docs = dict(conn.execute(f"SELECT term, docs FROM term_stats WHERE corpus = ? AND term IN ({', '.join('?' * len(stems))})", (corpus, *stems)).fetchall())
+    found = sorted((term for term in stems if term in docs), key=docs.get)
+    if not found or not total: return None
+    informative = [term for term in found if docs[term] <= total[0] * COMMON_TERM_RATIO] or found[:1]
+    return " OR ".join(f'"{term}"' for term in informative)
+
+def create_schema(conn):
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS quran_fts USING fts5(terms, surah UNINDEXED, ayah UNINDEXED, arabic UNINDEXED, text UNINDEXED,
+        tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS hadith_fts USING fts5(terms, narrator UNINDEXED, number UNINDEXED, text UNINDEXED,
+        tokenize='unicode61 remove_diacritics 2')""")
+    # Jumlah dokumen per kata dasar (dari fts5vocab), dihitung ulang setiap impor
+    conn.execute("CREATE TABLE IF NOT EXISTS term_stats (corpus TEXT, term TEXT, docs INTEGER, PRIMARY KEY (corpus, term)) WITHOUT ROWID")
+    conn.execute("CREATE TABLE IF NOT EXISTS corpus_stats (corpus TEXT PRIMARY KEY, docs INTEGER)")
+
+def _refresh_stats(conn, corpus: str):
+    table = f"{corpus}_fts"
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS temp.{corpus}_vocab USING fts5vocab(main, {table}, row)")
+    conn.execute("DELETE FROM term_stats WHERE corpus = ?", (corpus,))
+    conn.execute(f"INSERT INTO term_stats (corpus, term, docs) SELECT ?, term, doc FROM temp.{corpus}_vocab", (corpus,))
+    conn.execute(f"INSERT OR REPLACE INTO corpus_stats (corpus, docs) SELECT ?, COUNT(*) FROM {table}", (corpus,))
+
+def get_connection():
+    """Koneksi baca-saja ke indeks milik thread ini (dibuat saat pertama kali dipakai). None jika file indeks belum ada."""
+    conn = getattr(_local, "conn", None)
+    if conn is None and os.path.exists(INDEX_DB):
+        conn = _local.conn = sqlite3.connect(f"file:{INDEX_DB}?mode=ro", uri=True)
+    return conn
+
+def close():
+    """Menutup koneksi milik thread ini; dipanggil di thread yang sama dengan pencarian."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None: conn.close(); _local.conn = None
+
+def _search(corpus: str, columns: str, text: str, limit: int, where: str = "", params: tuple = ()):
+    conn = get_connection()
+    if conn is None: return []
+    table = f"{corpus}_fts"
+    try:
+        query = _match_query(conn, corpus, text)
+        if query is None: return []
+        return conn.execute(f"SELECT {columns} FROM {table} WHERE {table} MATCH ? {where} ORDER BY rank LIMIT ?", (query, *params, limit)).fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"Error saat mencari indeks {table}: {e}")  # Mis. indeks dibuat sebelum tabel ini ada
+        return []
+
+def search_quran(text: str, limit: int = DEFAULT_LIMIT) -> list:
+    """Ayat paling relevan untuk teks/pertanyaan: list dict {surah, ayah, arabic, text}."""
+    rows = _search("quran", "surah, ayah, arabic, text", text, limit)
+    return [{"surah": row[0], "ayah": row[1], "arabic": row[2], "text": row[3]} for row in rows]
+
+def search_hadith(text: str, narrator: str = None, limit: int = DEFAULT_LIMIT) -> list:
+    """Hadis paling relevan (opsional hanya satu perawi): list dict {narrator, number, text}."""
+    where, params = ("AND narrator = ?", (narrator,)) if narrator else ("", ())
+    rows = _search("hadith", "narrator, number, text", text, limit, where, params)
+    return [{"narrator": row[0], "number": row[1], "text": row[2]} for row in rows]
+
+# --- IMPOR ---
+# Format yang diterima: list JSON (atau {"data": [...]}) berisi objek berbentuk respons API MyQuran
+# ({"surat": {"nama": {"id"}}, "nomor", "teks": {"arab"}, "terjemah": {"teks"}} / {"nomor", "terjemah"})
+# atau bentuk datar ({"surah", "ayah", "arabic", "text"} / {"number", "text"}).
+
+def _load_records(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict): data = data.get("data", data)
+    if isinstance(data, dict): data = data.get("hadits") or data.get("ayat") or []
+    return data
+
+def _quran_row(record: dict):
+    if "surat" in record:
+        surah, arabic, text = record["surat"]["nama"]["id"], record["teks"]["arab"], record["terjemah"]["teks"]
+    else:
+        surah, arabic, text = record["surah"], record.get("arabic", ""), record["text"]
+    return (_terms(text), surah, record.get("nomor", record.get("ayah")), arabic, text)
+
+def _hadith_row(narrator: str, record: dict):
+    text = record.get("terjemah", record.get("text"))
+    return (_terms(text), narrator, record.get("nomor", record.get("number")), text)
+
+def import_quran(path: str, db_path: str = None) -> int:
+    """Mengganti isi indeks Qur'an dengan isi file. Mengembalikan jumlah ayat."""
+    rows = [_quran_row(record) for record in _load_records(path)]
+    with sqlite3.connect(db_path or INDEX_DB) as conn:
+        create_schema(conn)
+        conn.execute("DELETE FROM quran_fts")
+        conn.executemany("INSERT INTO quran_fts (terms, surah, ayah, arabic, text) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO quran_fts (quran_fts) VALUES ('optimize')")
+        _refresh_stats(conn, "quran")
+    return len(rows)
+
+def import_hadith(narrator: str, path: str, db_path: str = None) -> int:
+    """Mengganti hadis satu perawi (mis. 'bukhari', sama dengan nama di API) dengan isi file. Mengembalikan jumlah hadis."""
+    rows = [_hadith_row(narrator, record) for record in _load_records(path)]
+    with sqlite3.connect(db_path or INDEX_DB) as conn:
+        create_schema(conn)
+        conn.execute("DELETE FROM hadith_fts WHERE narrator = ?", (narrator,))
+        conn.executemany("INSERT INTO hadith_fts (terms, narrator, number, text) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO hadith_fts (hadith_fts) VALUES ('optimize')")
+        _refresh_stats(conn, "hadith")
+    return len(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Impor terjemahan Qur'an / hadis ke indeks full-text lokal.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("quran").add_argument("path")
+    hadith_parser = commands.add_parser("hadith")
+    hadith_parser.add_argument("narrator"); hadith_parser.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "quran":
+        print(f"{import_quran(args.path)} ayat diimpor ke {INDEX_DB}")
+    else:
+        print(f"{import_hadith(args.narrator, args.path)} hadis {args.narrator} diimpor ke {INDEX_DB}")
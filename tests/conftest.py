@@ -0,0 +1,6 @@
+# File: tests/conftest.py
+import os
+import sys
+
+# Modul bot berada di root repo (tanpa paket)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
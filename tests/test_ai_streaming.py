@@ -0,0 +1,75 @@
+# File: tests/test_ai_streaming.py
+import time
+import asyncio
+import pytest
+import ai_client
+import db_handler as db
+import fake_anthropic
+import message_streamer
+
+ANSWER_CHUNKS = [f"kata{index} " for index in range(12)]
+
+class FakeMessage:
+    """Pengganti telegram.Message: mencatat setiap edit (detik sejak dibuat, teks, parse_mode)."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.edits, self.replies = [], []
+
+    async def edit_text(self, text, parse_mode=None):
+        self.edits.append((time.perf_counter() - self.started, text, parse_mode))
+
+    async def reply_text(self, text, parse_mode=None):
+        self.replies.append(text)
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server, base_url = fake_anthropic.start()
+    yield base_url
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def client(fake_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", fake_server)
+    monkeypatch.setattr(ai_client, "ANTHROPIC_API_KEY", "uji")
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "ai.db"))
+    db.init_db()
+    fake_anthropic.reset()
+    ai_client._client, ai_client._semaphore = None, None
+    yield
+    ai_client._client, ai_client._semaphore = None, None
+
+def _stream(message, deadline=5.0, edit_interval=0.2):
+    streamer = message_streamer.StreamingReply(message, edit_interval=edit_interval)
+    async def run():
+        answer, truncated = await ai_client.stream_complete([{"role": "user", "content": "apa itu sabar?"}], max_tokens=50,
+                                                            on_text=streamer.update, deadline=deadline, fallback="cadangan")
+        await streamer.finish(answer)
+        await ai_client.close()
+        return answer, truncated
+    return asyncio.run(run())
+
+def test_stream_edits_one_message_and_finishes_with_markdown():
+    fake_anthropic.configure(chunks=ANSWER_CHUNKS, chunk_delay=0.05)
+    message = FakeMessage()
+    answer, truncated = _stream(message)
+    assert (answer, truncated) == ("".join(ANSWER_CHUNKS).strip(), False)
+    assert message.edits[0][0] < 0.5  # Potongan pertama tampil jauh sebelum jawaban selesai
+    gaps = [later[0] - earlier[0] for earlier, later in zip(message.edits, message.edits[1:-1])]
+    assert all(gap >= 0.19 for gap in gaps)  # Edit sementara dibatasi edit_interval
+    assert message.edits[-1][1:] == (answer, "Markdown") and not message.replies
+
+def test_deadline_mid_stream_is_reported_as_truncated():
+    fake_anthropic.configure(chunks=ANSWER_CHUNKS, chunk_delay=0.3)
+    answer, truncated = _stream(FakeMessage(), deadline=1.0)
+    assert truncated
+    assert 0 < len(answer.split()) < len(ANSWER_CHUNKS)
+
+def test_retry_before_first_chunk_keeps_full_answer():
+    fake_anthropic.configure(chunks=ANSWER_CHUNKS, chunk_delay=0.01, fail=[503])
+    answer, truncated = _stream(FakeMessage())
+    assert (answer, truncated) == ("".join(ANSWER_CHUNKS).strip(), False)
+    assert fake_anthropic.get_stats()["requests"] == 2
+
+def test_fallback_when_nothing_was_received():
+    fake_anthropic.configure(fail=[400])
+    assert _stream(FakeMessage()) == ("cadangan", False)
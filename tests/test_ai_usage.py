@@ -0,0 +1,54 @@
+# File: tests/test_ai_usage.py
+import asyncio
+import pytest
+import ai_client
+import ai_handler
+import db_handler as db
+import fake_anthropic
+
+QUESTION = [{"role": "user", "content": "Bagaimana cara menjaga sholat tepat waktu?"}]
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server, base_url = fake_anthropic.start()
+    yield base_url
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def client(fake_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", fake_server)
+    monkeypatch.setattr(ai_client, "ANTHROPIC_API_KEY", "uji")
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "ai.db"))
+    db.init_db()
+    fake_anthropic.reset()
+    ai_client._client, ai_client._semaphore = None, None
+    yield
+    ai_client._client, ai_client._semaphore = None, None
+
+def _usage_after_two_calls(system: list) -> dict:
+    async def scenario():
+        for _ in range(2):
+            await ai_client.complete(QUESTION, max_tokens=100, system=system, purpose="uji")
+    asyncio.run(scenario())
+    return db.get_ai_usage_summary()[0]
+
+def test_short_discussion_prompt_is_not_marked_for_caching():
+    assert ai_client.MIN_CACHEABLE_TOKENS == 2048
+    assert "cache_control" not in ai_handler.DISCUSSION_SYSTEM[0]
+    usage = _usage_after_two_calls(ai_handler.DISCUSSION_SYSTEM)
+    assert usage["calls"] == 2
+    assert usage["cache_creation_input_tokens"] == 0 and usage["cache_read_input_tokens"] == 0
+
+def test_prompt_above_minimum_is_cached_from_second_call():
+    system = ai_client.system_blocks("Aturan diskusi. " * (ai_client.MIN_CACHEABLE_TOKENS * ai_client.CHARS_PER_TOKEN // 15))
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    usage = _usage_after_two_calls(system)
+    assert usage["cache_creation_input_tokens"] >= ai_client.MIN_CACHEABLE_TOKENS
+    assert usage["cache_read_input_tokens"] == usage["cache_creation_input_tokens"]
+
+def test_fake_server_ignores_cache_control_below_minimum():
+    body = {"model": ai_client.MODEL, "messages": QUESTION,
+            "system": [{"type": "text", "text": ai_handler.DISCUSSION_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]}
+    for _ in range(2):
+        usage = fake_anthropic.usage_for(body, 1)
+        assert usage["cache_creation_input_tokens"] == 0 and usage["cache_read_input_tokens"] == 0
@@ -0,0 +1,42 @@
+# File: tests/test_discussion_history.py
+import asyncio
+import pytest
+import db_async
+import db_handler as db
+import ai_handler
+import discussion_history
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "diskusi.db"))
+    db.init_db()
+
+async def _add_turns(user_id: int, count: int, prefix: str):
+    for index in range(count):
+        await db_async.add_discussion_message(user_id, "user" if index % 2 == 0 else "assistant", f"{prefix} {index}")
+
+def test_clear_during_compaction_is_not_undone(monkeypatch):
+    async def slow_summary(previous, messages):
+        await asyncio.sleep(0.2)
+        return "ringkasan percakapan lama"
+    monkeypatch.setattr(ai_handler, "summarize_discussion", slow_summary)
+
+    async def run():
+        await _add_turns(1, 12, "pesan")
+        compaction = asyncio.create_task(discussion_history.compact(1))
+        await asyncio.sleep(0.05)
+        await db_async.clear_discussion_history(1)  # Pengguna menghapus riwayat saat ringkasan masih dibuat
+        saved = await compaction
+        return saved, await db_async.get_discussion_summary(1), await db_async.get_discussion_history(1)
+    assert asyncio.run(run()) == (False, None, [])
+
+def test_compaction_folds_old_messages_into_summary(monkeypatch):
+    async def summary(previous, messages):
+        return f"ringkasan {len(messages)} pesan"
+    monkeypatch.setattr(ai_handler, "summarize_discussion", summary)
+
+    async def run():
+        await _add_turns(2, 12, "pesan")
+        saved = await discussion_history.compact(2)
+        return saved, await db_async.get_discussion_summary(2), len(await db_async.get_discussion_history(2))
+    assert asyncio.run(run()) == (True, "ringkasan 4 pesan", discussion_history.RECENT_MESSAGES)
@@ -0,0 +1,36 @@
+# File: tests/test_log_aggregator.py
+import random
+import asyncio
+import pytest
+from datetime import date, timedelta
+import db_handler as db
+import log_aggregator
+
+def _random_period(seed: int, days: int, gap_rate: float):
+    rng, day, rows = random.Random(seed), date(2026, 1, 1), []
+    while len(rows) < days:
+        if rng.random() >= gap_rate: rows.append((day.isoformat(), rng.getrandbits(len(db.CHECKLIST_ITEMS)) | (0x1f if rng.random() < 0.6 else 0)))
+        day += timedelta(days=1)
+    return rows
+
+@pytest.mark.parametrize("seed", range(40))
+def test_loop_and_numpy_paths_agree(seed):
+    rows = _random_period(seed, random.Random(seed).randint(1, 90), random.Random(seed).choice([0, 0.1, 0.5]))
+    ordinals, masks = [date.fromisoformat(row[0]).toordinal() for row in rows], [row[1] for row in rows]
+    assert log_aggregator._aggregate_loop(ordinals, masks) == log_aggregator._aggregate_numpy(ordinals, masks)
+
+def test_report_counts_match_prefix_sums(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "logs.db"))
+    db.init_db()
+    rows = _random_period(7, 45, 0.2)
+    for log_date, _ in rows: db.get_or_create_daily_log(1, log_date)
+    db.save_daily_log_masks([(1, log_date, mask) for log_date, mask in rows])
+    start_date, end_date = rows[5][0], rows[-3][0]
+    async def both():
+        return (await log_aggregator.for_period(1, start_date, end_date), await log_aggregator.counts_for_period(1, start_date, end_date))
+    try:
+        full, counts = asyncio.run(both())
+    finally:
+        db.close_connection()
+    assert full.has_daily_data and full.total_days == counts.total_days
+    assert full.item_counts == counts.item_counts
@@ -0,0 +1,120 @@
+# File: tests/test_myquran_resilience.py
+import time
+import asyncio
+from datetime import date, datetime
+import httpx
+import pytest
+import db_handler as db
+import fake_myquran
+import http_client
+import prayer_handler
+
+CITY, CITY_ID = "Garut", "1204"  # Tidak ada di KOORDINAT_KOTA, jadi jadwalnya diambil lewat API
+TODAY = date(2026, 10, 18)
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server, base_url = fake_myquran.start()
+    yield base_url
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def myquran(fake_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "myquran.db"))
+    db.init_db()
+    monkeypatch.setattr(prayer_handler, "BASE_URL", fake_server)
+    monkeypatch.setattr(http_client, "BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(http_client, "_breakers", {})
+    prayer_handler._city_id_cache.clear()
+    fake_myquran.set_faults()
+    http_client._client, http_client._semaphore = None, None
+    yield fake_server
+    fake_myquran.set_faults()
+    http_client._client, http_client._semaphore = None, None
+
+def _jadwal_url(base_url: str) -> str:
+    return f"{base_url}/sholat/jadwal/{CITY_ID}/{TODAY.year}/{TODAY.month}"
+
+def _jadwal_requests() -> int:
+    return fake_myquran.get_stats().get("jadwal", 0)
+
+def _advance_cooldown(breaker: http_client.CircuitBreaker):
+    breaker.opened_at -= breaker.open_seconds
+
+async def _get_jadwal(base_url: str):
+    return await http_client.get_json(_jadwal_url(base_url), endpoint="myquran/jadwal")
+
+def test_breaker_opens_then_single_probe_closes_it(myquran):
+    fake_myquran.set_faults(error_rate=1.0)
+    breaker = http_client.get_breaker("myquran/jadwal")
+
+    async def run():
+        for _ in range(http_client.BREAKER_FAILURE_THRESHOLD):
+            with pytest.raises(httpx.HTTPStatusError):
+                await _get_jadwal(myquran)
+        assert breaker.state == "open"
+        sent = _jadwal_requests()
+        with pytest.raises(http_client.CircuitOpenError):
+            await _get_jadwal(myquran)
+        assert _jadwal_requests() == sent  # Ditolak tanpa menyentuh server
+
+        # Breaker per endpoint: pencarian kota tetap dikirim walau endpoint jadwal terbuka
+        with pytest.raises(httpx.HTTPStatusError):
+            await http_client.get_json(f"{myquran}/sholat/kota/cari/garut", endpoint="myquran/kota")
+        assert http_client.get_breaker_states() == {"myquran/jadwal": "open", "myquran/kota": "closed"}
+
+        fake_myquran.set_faults(latency=0.2)
+        _advance_cooldown(breaker)
+        assert breaker.state == "half_open"
+        probe = asyncio.create_task(_get_jadwal(myquran))
+        await asyncio.sleep(0.05)
+        with pytest.raises(http_client.CircuitOpenError):
+            await _get_jadwal(myquran)  # Selama percobaan berjalan, request lain tetap ditolak
+        data = await probe
+        await http_client.close()
+        return data, sent
+
+    data, sent = asyncio.run(run())
+    assert data["status"] and breaker.state == "closed" and breaker.failures == 0
+    assert _jadwal_requests() == sent + 1
+
+def test_failed_probe_reopens_breaker(myquran):
+    fake_myquran.set_faults(error_rate=1.0)
+    breaker = http_client.get_breaker("myquran/jadwal")
+
+    async def run():
+        for _ in range(http_client.BREAKER_FAILURE_THRESHOLD):
+            with pytest.raises(httpx.HTTPStatusError):
+                await _get_jadwal(myquran)
+        _advance_cooldown(breaker)
+        with pytest.raises(httpx.HTTPStatusError):
+            await _get_jadwal(myquran)
+        await http_client.close()
+
+    asyncio.run(run())
+    assert breaker.state == "open" and not breaker.probing
+
+def _stored_day(day: int) -> dict:
+    return {"date": f"2026-10-{day:02d}", "tanggal": f"{day:02d}/10/2026", "lokasi": "KAB. GARUT", "daerah": "JAWA BARAT",
+            "imsak": "04:01", "subuh": "04:11", "terbit": "05:25", "dhuha": "05:53", "dzuhur": "11:40", "ashar": "14:50", "maghrib": "17:50", "isya": "19:00"}
+
+def test_slow_api_serves_stored_schedule_with_stale_note(myquran, monkeypatch):
+    monkeypatch.setattr(prayer_handler, "STALE_WAIT_SECONDS", 0.2)
+    db.save_cached_city_id(prayer_handler.normalize_city_name(CITY), CITY_ID, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    db.save_prayer_schedules(CITY_ID, [_stored_day(16), _stored_day(17)])
+    fake_myquran.set_faults(latency=1.0)
+
+    async def run():
+        started = time.perf_counter()
+        stale = await prayer_handler.get_prayer_times_raw(CITY, TODAY)
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*prayer_handler._background_fetches)  # Pengambilan bulanan tetap selesai di latar belakang
+        fresh = await prayer_handler.get_prayer_times_raw(CITY, TODAY)
+        await http_client.close()
+        return stale, elapsed, fresh
+
+    stale, elapsed, fresh = asyncio.run(run())
+    assert elapsed < 1.0
+    assert stale["stale"] and stale["jadwal"]["date"] == "2026-10-17"
+    assert "menampilkan jadwal tersimpan tanggal 2026\\-10\\-17_" in prayer_handler.format_prayer_times(CITY, stale)
+    assert not fresh.get("stale") and fresh["jadwal"]["date"] == "2026-10-18"
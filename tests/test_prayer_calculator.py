@@ -0,0 +1,59 @@
+# File: tests/test_prayer_calculator.py
+"""
+Yang selalu berjalan: perbandingan lintas implementasi dengan pustaka praytimes (reference_praytimes.json) memakai
+parameter Kemenag dan koordinat KOORDINAT_KOTA yang sama. Ini menguji rumus mesin hitung, bukan kecocokan dengan jadwal
+resmi Kemenag/MyQuran maupun kebenaran tabel koordinat. Kecocokan dengan MyQuran baru diuji bila rekamannya sudah ada di
+fixtures/myquran/ (python tests/record_fixtures.py myquran <tahun> <bulan>); tanpa rekaman, kasus itu di-skip.
+"""
+import os
+import glob
+import json
+from datetime import date
+import pytest
+import prayer_calculator
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+TOLERANCE_MINUTES = 2
+COMPARED_KEYS = ["imsak", "subuh", "terbit", "dhuha", "dzuhur", "ashar", "maghrib", "isya"]
+
+def _minutes(value: str) -> int:
+    hour, minute = map(int, value.split(":"))
+    return hour * 60 + minute
+
+def _assert_close(city: str, day: date, expected: dict):
+    jadwal = prayer_calculator.get_jadwal(city, day)["jadwal"]
+    for key in COMPARED_KEYS:
+        if key not in expected: continue
+        difference = _minutes(jadwal[key]) - _minutes(expected[key])
+        assert abs(difference) <= TOLERANCE_MINUTES, f"{city} {day} {key}: dihitung {jadwal[key]}, rujukan {expected[key]}"
+
+def _myquran_fixtures():
+    return sorted(glob.glob(os.path.join(FIXTURE_DIR, "myquran", "*.json")))
+
+@pytest.mark.parametrize("path", _myquran_fixtures() or [None], ids=lambda path: os.path.basename(path) if path else "belum-direkam")
+def test_optional_myquran_recordings(path):
+    if path is None:
+        pytest.skip("Belum ada rekaman MyQuran; jalankan: python tests/record_fixtures.py myquran <tahun> <bulan>")
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    for jadwal in fixture["response"]["data"]["jadwal"]:
+        _assert_close(fixture["city"], date.fromisoformat(jadwal["date"]), jadwal)
+
+def _reference_cases():
+    with open(os.path.join(FIXTURE_DIR, "reference_praytimes.json"), encoding="utf-8") as f:
+        cities = json.load(f)["cities"]
+    return [(city, day, times) for city, days in cities.items() for day, times in days.items()]
+
+@pytest.mark.parametrize("city,day,expected", _reference_cases())
+def test_agrees_with_praytimes_engine_in_every_timezone(city, day, expected):
+    _assert_close(city, date.fromisoformat(day), expected)
+
+def test_reference_covers_every_timezone():
+    zones = {prayer_calculator.KOORDINAT_KOTA[city][2] for city, _, _ in _reference_cases()}
+    assert zones == {7, 8, 9}
+
+def test_utc_offset_follows_city_and_province():
+    assert prayer_calculator.get_jadwal("Makassar", date(2026, 10, 18))["utc_offset"] == 8
+    assert prayer_calculator.get_utc_offset("Papua ") == 9
+    assert prayer_calculator.get_utc_offset("KALIMANTAN SELATAN") == 8
+    assert prayer_calculator.get_utc_offset(None) == prayer_calculator.DEFAULT_UTC_OFFSET
@@ -0,0 +1,14 @@
+# File: tests/test_prayer_handler.py
+import prayer_handler
+
+STALE_ROW = {"city_id": "1301", "lokasi": "KOTA JAKARTA", "daerah": "DKI JAKARTA", "date": "2025-10-13", "tanggal": "Senin, 13/10/2025",
+             "imsak": "04:06", "subuh": "04:16", "terbit": "05:28", "dhuha": "05:56", "dzuhur": "11:39", "ashar": "14:45", "maghrib": "17:46", "isya": "18:55"}
+
+def test_stale_note_names_the_stored_date():
+    data = dict(prayer_handler._schedule_row_to_data(STALE_ROW), stale=True)
+    text = prayer_handler.format_prayer_times("Kota Jakarta", data)
+    assert "menampilkan jadwal tersimpan tanggal 2025\\-10\\-13_" in text
+
+def test_fresh_schedule_has_no_stale_note():
+    text = prayer_handler.format_prayer_times("Kota Jakarta", prayer_handler._schedule_row_to_data(STALE_ROW))
+    assert "tersimpan" not in text
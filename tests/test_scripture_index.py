@@ -0,0 +1,44 @@
+# File: tests/test_scripture_index.py
+import json
+import asyncio
+import threading
+import pytest
+import db_async
+import scripture_index
+import scripture_handler
+
+AYAT = [{"surah": "Al-Baqarah", "ayah": 153, "arabic": "...", "text": "Mohonlah pertolongan dengan sabar dan sholat."},
+        {"surah": "Al-Insyirah", "ayah": 6, "arabic": "...", "text": "Sesungguhnya bersama kesulitan ada kemudahan."},
+        {"surah": "Al-Ashr", "ayah": 3, "arabic": "...", "text": "Saling menasihati supaya menaati kebenaran dan kesabaran."}]
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    source, index_db = tmp_path / "quran.json", str(tmp_path / "index.db")
+    source.write_text(json.dumps(AYAT), encoding="utf-8")
+    scripture_index.import_quran(str(source), index_db)
+    monkeypatch.setattr(scripture_index, "INDEX_DB", index_db)
+    yield index_db
+
+def test_search_runs_on_db_thread_not_event_loop(index, monkeypatch):
+    threads = []
+    original = scripture_index._search
+    def recording_search(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original(*args, **kwargs)
+    monkeypatch.setattr(scripture_index, "_search", recording_search)
+
+    async def run():
+        ayat = await scripture_handler.search_quran("bagaimana cara bersabar")
+        await db_async.run(scripture_index.close)
+        return ayat, threading.current_thread().name
+    ayat, loop_thread = asyncio.run(run())
+    assert ayat["reference"] in ("QS. Al-Baqarah: 153", "QS. Al-Ashr: 3")
+    assert threads and all(name != loop_thread and name.startswith("db") for name in threads)
+
+def test_connection_is_per_thread(index):
+    main_conn = scripture_index.get_connection()
+    other = []
+    worker = threading.Thread(target=lambda: (other.append(scripture_index.get_connection()), scripture_index.close()))
+    worker.start(); worker.join()
+    assert other[0] is not None and other[0] is not main_conn
+    scripture_index.close()